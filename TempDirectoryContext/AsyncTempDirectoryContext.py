@@ -0,0 +1,83 @@
+#!/usr/bin/env python
+"""
+AsyncTempDirectoryContext : asyncio version of TempDirectoryContext
+
+Summary :
+    An asynchronous context manager with the same behaviour as TempDirectoryContext, which runs every
+    file system operation (the historic scan, creation and deletion) in an executor, so that the
+    event loop is never blocked.
+
+Use Case :
+    As an asyncio application I want to create and tear down temporary directories so that I can keep
+    the environment clean without blocking my event loop
+
+Testable Statements :
+    Can I create a temp file area with async with
+    Is the event loop kept running while historic directories are deleted
+    Is a directory created by a cancelled entry cleaned up
+    Is retention shared with TempDirectoryContext
+
+Example :
+    from TempDirectoryContext import AsyncTempDirectoryContext
+
+    async with AsyncTempDirectoryContext() as tmp_path:
+        # tmp_path is /tmp/tmp******TempDirCont - exactly as with TempDirectoryContext
+"""
+
+import asyncio
+
+from .TempDirectoryContext import TempDirectoryContext
+
+__author__ = 'Tony Flury : anthony.flury@btinternet.com'
+__created__ = '16 Oct 2026'
+
+__all__ = ['AsyncTempDirectoryContext']
+
+
+class AsyncTempDirectoryContext(object):
+    """Asynchronous Temporary Directory Context manager - create and manage Temporary directories"""
+
+    def __init__(self, *args, executor=None, **kwargs):
+        """Asynchronous Temporary Directory Context manager - create and manage Temporary directories
+
+        Accepts all of the TempDirectoryContext arguments; retention is shared with TempDirectoryContext
+        context managers with the same prefix, suffix and root.
+
+        :param executor: The concurrent.futures executor in which file system operations are run;
+                         defaults to the event loop's default executor.
+
+        :type executor: concurrent.futures.Executor
+        """
+        self._args = args
+        self._kwargs = kwargs
+        self._executor = executor
+        self._context = None
+
+    def _enter(self):
+        """Executor - create the synchronous context manager (and so scan for historic directories) and enter it"""
+        self._context = TempDirectoryContext(*self._args, **self._kwargs)
+        return self._context.__enter__()
+
+    async def __aenter__(self):
+        """Asynchronous Context Manager Entry point - not to be called directly"""
+        loop = asyncio.get_event_loop()
+        future = loop.run_in_executor(self._executor, self._enter)
+        try:
+            return await asyncio.shield(future)
+        except asyncio.CancelledError:
+            # The executor can't be interrupted, so the directory may still be created - discard it when it is
+            future.add_done_callback(lambda done: self._abandon(loop, done))
+            raise
+
+    def _abandon(self, loop, future):
+        """Discard the directory created by a cancelled entry - off the event loop"""
+        if future.cancelled() or future.exception() is not None:
+            return
+        loop.run_in_executor(self._executor, self._context._discard)
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        """Asynchronous Context Manager exit point - not to be called directly"""
+        loop = asyncio.get_event_loop()
+        # Even if the exit is cancelled, the retention work carries on to completion in the executor
+        return await asyncio.shield(loop.run_in_executor(self._executor, self._context.__exit__,
+                                                         exc_type, exc_val, exc_tb))
@@ -30,79 +30,874 @@ Example :
 
 """
 
+import copy
+import errno
+import functools
+import logging
 import tempfile
-import shutil
 import os
 import os.path
+import time
+from concurrent.futures import ThreadPoolExecutor
 
-__version__ = "1.0.1"
+from ._reclaim import reclaimer, remove_tree, report_failure, move_to_trash, purge_trash, trash_path, TRASH_NAME
+from ._scan import scan_historic
+from ._manifest import Manifest, fcntl
+from ._registry import Registry
+from ._recycle import normalise_skeleton, scrub, is_pristine
+from ._rmtree import parallel_rmtree
+from ._retention import RetentionPolicy, MaxCount, MaxTotalBytes, MaxAge, select_victims, tree_size
+from ._janitor import Janitor
+from ._template import seed, METHODS
+from ._metrics import metrics, Metrics, MetricsEvent, Histogram
+from ._archive import archive_path, archive_tree, extract_archive, is_archive
+from ._lazy import LazyDirectory, reserve_name
+from ._owner import stamp, unstamp, has_live_owner, reap as reap_orphans, OWNERS_NAME
+from ._layout import LAYOUTS, namespace_path, namespaces, bucket_paths, place, make_directory
+from ._storage import Storage, DiskStorage, MemoryStorage, storage_backend
+from ._quota import QuotaExceeded, QuotaWatcher, Usage, QUOTAS
+
+__version__ = "2.0.0"
 __author__ = 'Tony Flury : anthony.flury@btinternet.com'
 __created__ = '25 Aug 2015'
 
+# The public names - including those defined by the private modules which are part of the package's interface
+__all__ = ['TempDirectoryContext',
+           'RetentionPolicy', 'MaxCount', 'MaxTotalBytes', 'MaxAge',
+           'metrics', 'Metrics', 'MetricsEvent', 'Histogram',
+           'extract_archive', 'TRASH_NAME', 'OWNERS_NAME',
+           'Storage', 'DiskStorage', 'MemoryStorage', 'QuotaExceeded']
+
+logger = logging.getLogger('TempDirectoryContext')
+
 
 class TempDirectoryContext(object):
     """Temporary Directory Context manager - create and manage Temporary directories"""
-    _delete_queue = {}
+    _registry = Registry()
+    _reclaimer = reclaimer
+    _janitor = Janitor(_registry)
+    _metrics = metrics
+    _quota_watcher = QuotaWatcher()
+
+    # The maximum number of recycled directories held ready for each key
+    _recycle_max = 8
 
-    def __init__(self, suffix="TempDirCont", prefix="tmp", root=None, delete_historic=True, keep_max=3):
+    def __init__(self, suffix="TempDirCont", prefix="tmp", root=None, delete_historic=True, keep_max=3,
+                 async_delete=False, on_error=None, evict="delete", purge_batch=16, manifest=False,
+                 shared=False, recycle=False, skeleton=(), delete_engine="shutil", delete_workers=4,
+                 max_total_bytes=None, max_age=None, order="created", retention=(), template=None,
+                 template_method="auto", archive_historic=False, archive_live=1,
+                 lazy=False, owner_stamp=False, layout="flat", buckets=0,
+                 storage="disk", max_bytes=None, quota="soft", on_quota=None, quota_interval=1.0):
         """Temporary Directory Context manager - create and manage Temporary directories
         
         :param suffix: The initial part of the directory name
         :param prefix: The trailing part of the directory name
         :param root: The directory in which the Temp directory is created; defaults to tempfile.gettempdir() (normally /tmp)
         :param delete_historic: Whether this context manager deletes historic directories on exit.
+        :param async_delete: Whether historic directories are deleted by background threads rather than on exit.
+        :param on_error: Callable invoked as on_error(path, exc) when a historic directory cannot be deleted;
+                         by default failures are logged to the 'TempDirectoryContext' logger.
+        :param evict: How historic directories are evicted - "delete" removes the tree, "trash" renames it
+                      into a hidden trash directory in the root, which is purged in the background.
+        :param purge_batch: The number of trash entries purged before the background purge gives way to
+                            other deletes.
+        :param manifest: Whether created and deleted directories are recorded in a manifest file in the root,
+                         so that a new process can find the historic directories without scanning the root.
+        :param shared: Whether retention is shared by all processes using this prefix, suffix and root; the
+                       delete queue is kept in the (file locked) manifest, so keep_max applies across all the
+                       processes and each directory is deleted once. Implies manifest.
+        :param recycle: Whether the directory is emptied on exit and reused by the next context manager with this
+                        prefix, suffix and root (also with recycle set), rather than being retained.
+        :param skeleton: Relative paths of sub-directories which are kept (emptied) when a directory is recycled.
+        :param delete_engine: How historic trees are deleted - "shutil" uses shutil.rmtree, "parallel" deletes
+                              subtrees in parallel, relative to directory file descriptors.
+        :param delete_workers: The number of threads used by the "parallel" delete engine for each tree.
+        :param max_total_bytes: The maximum disk space (in bytes) used by the retained historic directories; the
+                                oldest (or least recently used) are evicted until the total is within the limit.
+        :param max_age: The maximum time (in seconds) an historic directory is retained after it is released.
+        :param order: Which historic directories are evicted first - "created" evicts the oldest, "lru" evicts the
+                      least recently used (by access or modification time).
+        :param retention: Additional RetentionPolicy instances - a directory is evicted if any policy evicts it.
+        :param template: A directory tree copied into the directory on entry; the mechanism used is available as
+                         the seed_method attribute once the context manager has been entered.
+        :param template_method: How the template is copied - "auto" clones files (copy on write) where the file
+                                system allows and copies the rest; "hardlink" hard links every file (so changes are
+                                seen in the template); "auto-hardlink" clones files where the file system allows, and
+                                otherwise hard links read only files and copies the rest; "copy" always copies.
+        :param archive_historic: Whether retained historic directories are packed (in the background) into compressed
+                                 tarballs in the root, and the trees removed. Archives count against the retention
+                                 limits as the directories did; extract_archive() restores one. Can't be used with a
+                                 manifest.
+        :param archive_live: The number of the most recent historic directories kept as trees when archive_historic is
+                             set.
+        :param lazy: Whether the directory is only created when it is first used - on entry a LazyDirectory (a path-like
+                     object) is returned instead of the path, and the directory is created the first time it is used
+                     as a path. If it is never used, nothing is created or retained.
+        :param owner_stamp: Whether directories in use are stamped with their owner (process id, start time and host
+                            name). Directories stamped by a live process are never evicted, and directories whose
+                            owner has died (a crash inside the context manager) are reclaimed - when the first context
+                            manager for the root is created, and by the janitor.
+        :param layout: Where the directories are created - "flat" creates them in the root; "sharded" creates them in a
+                       hidden namespace directory for this prefix and suffix within the root, so that historic
+                       directories are found without reading the whole root. The directory names are the same.
+        :param buckets: The number of bucket directories the namespace is divided into (by a hash of the directory
+                        name) with the sharded layout - 0 for none. Can't be used with a manifest.
+        :param storage: Where the directories are stored - "disk" uses the root; "memory" uses /dev/shm if it has enough
+                        free space (falling back to the root if it doesn't), with a hard quota of 64 MiB on each
+                        directory; or a Storage instance (e.g. MemoryStorage with other limits). The free space is
+                        checked again as the context manager is entered.
+        :param max_bytes: The disk space (in bytes) the directory may use while it is in use. Its usage is sampled in
+                          the background (and by usage() and check_quota()), and the measurement on exit is used
+                          for retention, so the tree isn't walked again.
+        :param quota: What happens when the directory exceeds max_bytes - "soft" reports it to on_quota (or logs a
+                      warning); "hard" also raises QuotaExceeded from check_quota() and on exit, where the directory is
+                      deleted rather than retained.
+        :param on_quota: Callable invoked as on_quota(path, usage, max_bytes) when the directory is first seen to exceed
+                         max_bytes - possibly from the background thread.
+        :param quota_interval: The minimum number of seconds between two measurements of the directory's usage.
         
         :type suffix: str
         :type prefix: str
         :type root: str
         :type delete_historic: bool
         :type keep_max: int
+        :type async_delete: bool
+        :type on_error: callable
+        :type evict: str
+        :type purge_batch: int
+        :type manifest: bool
+        :type shared: bool
+        :type recycle: bool
+        :type skeleton: list
+        :type delete_engine: str
+        :type delete_workers: int
+        :type max_total_bytes: int
+        :type max_age: float
+        :type order: str
+        :type retention: list
+        :type template: str
+        :type template_method: str
+        :type archive_historic: bool
+        :type archive_live: int
+        :type lazy: bool
+        :type owner_stamp: bool
+        :type layout: str
+        :type buckets: int
+        :type storage: str
+        :type max_bytes: int
+        :type quota: str
+        :type on_quota: callable
+        :type quota_interval: float
         """
+        storage = storage_backend(storage)
+        if evict not in ("delete", "trash"):
+            raise ValueError('evict must be "delete" or "trash" : {!r}'.format(evict))
+        if shared and fcntl is None:
+            raise RuntimeError('shared retention requires file locking (fcntl), which is not available')
+        if delete_engine not in ("shutil", "parallel"):
+            raise ValueError('delete_engine must be "shutil" or "parallel" : {!r}'.format(delete_engine))
+        if shared and recycle:
+            raise ValueError('recycled directories cannot be shared between processes')
+        if order not in ("created", "lru"):
+            raise ValueError('order must be "created" or "lru" : {!r}'.format(order))
+        if template_method not in METHODS:
+            raise ValueError('template_method must be one of {} : {!r}'.format(', '.join(METHODS), template_method))
+        if archive_historic and (manifest or shared):
+            raise ValueError('archive_historic can\'t be used with a manifest')
+        if template is not None and not os.path.isdir(template):
+            raise ValueError('template must be a directory : {!r}'.format(template))
+        if quota not in QUOTAS:
+            raise ValueError('quota must be "soft" or "hard" : {!r}'.format(quota))
+        if layout not in LAYOUTS:
+            raise ValueError('layout must be one of {} : {!r}'.format(', '.join(LAYOUTS), layout))
+        if buckets and layout != "sharded":
+            raise ValueError('buckets can only be used with the sharded layout')
+        if buckets and (manifest or shared):
+            raise ValueError('buckets can\'t be used with a manifest')
+
         self._suffix = suffix
         self._prefix = prefix
         self._keep_max = keep_max
-        self._root = tempfile.gettempdir() if not root else root
+        self._storage = storage
+        # The storage's size limit is a hard quota - enforced while the directory is in use, as well as on exit
+        limits = [limit for limit in (max_bytes, storage.max_bytes) if limit is not None]
+        self._max_bytes = min(limits) if limits else None
+        limits = [limit for limit in (max_bytes if quota == "hard" else None, storage.max_bytes) if limit is not None]
+        self._hard_limit = min(limits) if limits else None
+        self._on_quota = on_quota
+        self._quota_interval = quota_interval
+        self._usage = {}
+        self._root = self._storage_root = storage.select(tempfile.gettempdir() if not root else root)
+        # A sharded context manager behaves as if its namespace is the root - everything is kept there
+        self._sharded = layout == "sharded"
+        self._buckets = buckets if self._sharded else 0
+        if self._sharded:
+            self._root = namespace_path(self._root, prefix, suffix)
+        self._homes = bucket_paths(self._root, buckets) if self._buckets else [self._root]
         self._delete_historic = delete_historic
+        self._async_delete = async_delete
+        self._on_error = on_error
+        self._evict_mode = evict
+        self._purge_batch = purge_batch
+        self._shared = shared
+        self._recycle = recycle
+        self._skeleton = normalise_skeleton(skeleton)
+        self._delete_workers = delete_workers
+        self._rmtree = (functools.partial(parallel_rmtree, workers=delete_workers)
+                        if delete_engine == "parallel" else None)
+        self._manifest = Manifest(self._root, prefix, suffix) if (manifest or shared) else None
+        if self._manifest and self._sharded:
+            os.makedirs(self._root, 0o700, exist_ok=True)
+        self._template = template
+        self._template_method = template_method
+        self._archive_live = max(archive_live, 0) if archive_historic else None
+        self._lazy = lazy
+        self._owner_stamp = owner_stamp
+        self._lazy_dir = None
+        self._reserved = None
+        self._temp = None
+        self.seed_method = None
+
+        # keep_max alone (evicting the oldest) needs no bookkeeping - the queue is simply trimmed
+        self._order = order
+        self._max_age = max_age
+        self._policies = [MaxCount(keep_max)]
+        if max_total_bytes is not None:
+            self._policies.append(MaxTotalBytes(max_total_bytes))
+        if max_age is not None:
+            self._policies.append(MaxAge(max_age))
+        self._policies.extend(retention)
+        self._count_only = len(self._policies) == 1 and order == "created"
+
+        # Grab a reference to the appropriate delete queue - filling it with the historic directories if it is empty.
+        # A shared delete queue is read from the manifest on exit instead
+        self._key = (self._root, suffix, prefix)
+        loader = self._load_historic if (delete_historic and not shared) else None
+        self._delete_queue = self._registry.queue(self._key, loader=loader)
+        self._registry.register(self._key, self._settings())
 
-        # Initialise the delete queue if required and grab a reference to the appropriate queue
-        if not self.__class__._delete_queue.get((self._root, suffix, prefix), []):
-            self.__class__._delete_queue[(self._root, suffix, prefix)] = []
+        # Orphans are reclaimed at once - whether or not historic directories are being deleted
+        if owner_stamp and self._registry.once(('reap', self._root)):
+            self._reap()
 
-        self._delete_queue = self.__class__._delete_queue.get((self._root, suffix, prefix), [])
+    def _load_historic(self, released_only=False):
+        """Historic directories - oldest first, based on creation date"""
+        if not self._metrics.enabled:
+            return self._find_historic(released_only)
+        start = time.perf_counter()
+        historic = self._find_historic(released_only)
+        self._metrics.record('scan', self._key, path=self._root, duration=time.perf_counter() - start)
+        return historic
 
-        # Check if we have already initiated the to_be_deleted queue for entries for this (or similar instances)
-        # Only do this once - as when we exit we will add to the queue from now on
-        if delete_historic and (not self._delete_queue):
-            # Sort the queue based on creation date - oldest first
-            self._delete_queue += sorted([os.path.join(self._root, path) for path in os.listdir(self._root)
-                                          if (os.path.split(path)[1].startswith(self._prefix)) and
-                                          (os.path.split(path)[1].endswith(self._suffix))],
-                                         key=lambda x: os.stat(x).st_ctime,
-                                         reverse=False)
+    def _find_historic(self, released_only=False):
+        """Historic directories - oldest first, based on creation date
+
+        The root is only scanned if the manifest isn't in use, or can't be used.
+        """
+        if not self._manifest:
+            return scan_historic(self._homes if self._sharded else self._root, self._prefix, self._suffix)
+
+        with self._manifest.lock():
+            historic = self._manifest.load(released_only=released_only)
+            if historic is None:
+                # Directories the old manifest knows are still in use stay that way
+                in_use = self._manifest.in_use()
+                historic = scan_historic(self._root, self._prefix, self._suffix)
+                self._manifest.rewrite(historic, in_use=in_use)
+                if released_only:
+                    historic = [path for path in historic if os.path.basename(path) not in in_use]
+        return historic
 
     def __enter__(self):
         """Context Manager Entry point - not to be called directly"""
-        self._temp = tempfile.mkdtemp(suffix=self._suffix, prefix=self._prefix, dir=self._root)
+        if not self._lazy:
+            return self._enter_directory()
+
+        # Nothing is created until the directory is used - the name is reserved, but the directory needn't exist
+        self._reserved = place(reserve_name(self._root, self._prefix, self._suffix), self._buckets)
+        self._lazy_dir = LazyDirectory(self._reserved, self._enter_directory)
+        return self._lazy_dir
+
+    def _enter_directory(self):
+        """Create (or reuse) the directory for this context manager, and record it as in use"""
+        self._temp = self._enter_directories(1)[0]
         return self._temp
 
+    def _enter_directories(self, count):
+        """Create (or reuse) directories, record them as in use, and seed them from the template
+
+        If any directory can't be created (or seeded) those already created are discarded.
+        """
+        self._storage.check_space(self._storage_root, count)
+        paths = []
+        try:
+            if not self._manifest:
+                for i in range(count):
+                    paths.append(self._acquire())
+                    self._registry.activate(self._key, paths[-1])
+                    if self._owner_stamp:
+                        stamp(paths[-1])
+            else:
+                # Created with the manifest locked, so a concurrent rescan never mistakes them for historic directories
+                with self._manifest.lock():
+                    # The manifest has to exist first - it is only written in full, and a shared queue must know
+                    # about every directory in use
+                    if not os.path.lexists(self._manifest.path):
+                        self._load_historic()
+                    for i in range(count):
+                        paths.append(self._acquire())
+                        self._registry.activate(self._key, paths[-1])
+                        self._manifest.created(paths[-1])
+                        if self._owner_stamp:
+                            stamp(paths[-1])
+
+            if self._template is not None:
+                for path in paths:
+                    self._seed(path)
+
+            if self._max_bytes is not None:
+                for path in paths:
+                    self._usage[path] = Usage(path, self._quota_interval)
+                    self._quota_watcher.watch(self._usage[path], self._check_usage)
+        except BaseException:
+            for path in paths:
+                self._discard_directory(path)
+            raise
+        return paths
+
+    def _seed(self, path):
+        """Populate a new directory from the template"""
+        start = time.perf_counter() if self._metrics.enabled else None
+        self.seed_method = seed(self._template, path, method=self._template_method)
+        if start is not None:
+            self._metrics.record('seed', self._key, path=path, duration=time.perf_counter() - start)
+
+    def _acquire(self):
+        """A directory for this context manager - recycled if possible, otherwise newly created"""
+        start = time.perf_counter() if self._metrics.enabled else None
+        path = self._reuse() if self._recycle else None
+        path = path if path is not None else self._make_directory()
+        if start is not None:
+            self._metrics.record('create', self._key, path=path, duration=time.perf_counter() - start)
+        return path
+
+    def _make_directory(self):
+        """Create the temporary directory for this context manager"""
+        reserved, self._reserved = self._reserved, None
+        if reserved is not None:
+            try:
+                if self._sharded:
+                    make_directory(reserved)
+                else:
+                    os.mkdir(reserved, 0o700)
+                return reserved
+            except (IOError, OSError) as e:
+                # Taken in the meantime - the name was never handed out, so any other name will do
+                if e.errno != errno.EEXIST:
+                    raise
+        if not self._sharded:
+            return tempfile.mkdtemp(suffix=self._suffix, prefix=self._prefix, dir=self._root)
+
+        # The bucket depends on the name, so the name is chosen first - and the namespace may not exist yet
+        while True:
+            path = place(reserve_name(self._root, self._prefix, self._suffix), self._buckets)
+            try:
+                make_directory(path)
+                return path
+            except (IOError, OSError) as e:
+                if e.errno != errno.EEXIST:
+                    raise
+
+    def _discard(self):
+        """Give up the entered directory without retaining it - for a directory which was never handed out"""
+        if self._temp is None:
+            # A lazy directory which hasn't been created - just make sure it never is
+            if self._lazy_dir is not None:
+                self._lazy_dir.close()
+            return
+        path, self._temp = self._temp, None
+        self._discard_directory(path)
+
+    def _detach(self, path):
+        """Stop treating a directory as in use, without retaining it - it now belongs to the caller"""
+        self._unwatch(path)
+        self._registry.deactivate(self._key, path)
+        if self._owner_stamp:
+            unstamp(path)
+
+    def _discard_directory(self, path):
+        """Give up a directory without retaining it"""
+        self._detach(path)
+        if self._manifest:
+            with self._manifest.lock():
+                self._manifest.deleted(path)
+        self._evict(path)
+
+    def _reuse(self):
+        """Take a recycled directory for this key - None if there isn't one"""
+        recycle_bin = self._registry.recycle_bin(self._key)
+        while True:
+            with self._registry.lock(self._key):
+                if not recycle_bin:
+                    return None
+                path = recycle_bin.popleft()
+
+            # Only reuse a directory which is exactly as it was left - otherwise it can't be trusted
+            if is_pristine(path, self._skeleton):
+                return path
+            self._evict(path)
+
+    def _scrub(self, path):
+        """Empty a directory ready for reuse - False if it can't be emptied"""
+        try:
+            scrub(path, self._skeleton)
+        except (IOError, OSError) as e:
+            report_failure(path, e, self._on_error)
+            return False
+        return True
+
     # noinspection PyUnusedLocal
     def __exit__(self, exc_type, exc_val, exc_tb):
         """Context Manager exit point - not to be called directly"""
+        if self._lazy_dir is not None:
+            lazy, self._lazy_dir = self._lazy_dir, None
+            # Never used - so there is nothing to retain
+            if lazy.close() is None:
+                return False
 
-        # Add the file to the to_be_deleted list - don't delete immediately
-        self._delete_queue.append(self._temp)
-        self._temp = None
+        path, self._temp = self._temp, None
+        exceeded = self._release([path])
+        if exceeded and exc_type is None:
+            raise exceeded[0]
+        return False
 
-        if not self._delete_historic:
-            return False
+    def _release(self, paths):
+        """Retain (or recycle) directories which are no longer in use - retention is applied once, for all of them"""
+        for path in paths:
+            self._registry.deactivate(self._key, path)
+            if self._owner_stamp:
+                unstamp(path)
+
+        # Measured one last time - over a hard quota is an error, and the size is kept for retention
+        sizes, exceeded = {}, []
+        for path in paths:
+            usage = self._unwatch(path)
+            if usage is not None:
+                sizes[path] = self._check_usage(usage, force=True)
+                if self._hard_limit is not None and sizes[path] > self._hard_limit:
+                    exceeded.append(QuotaExceeded(path, sizes[path], self._hard_limit))
+
+        # Too large to keep - it broke a hard quota (its own, or the storage's size limit)
+        oversized = set(error.filename for error in exceeded)
+        for path in oversized:
+            self._discard_directory(path)
+        paths = [path for path in paths if path not in oversized]
+
+        if self._shared:
+            self._shared_release(paths, sizes)
+            return exceeded
+
+        if self._manifest:
+            with self._manifest.lock():
+                for path in paths:
+                    self._manifest.released(path)
+
+        recycled = set(path for path in paths if self._recycle and self._scrub(path))
+        for path in paths:
+            if path not in recycled:
+                self._retain(path, sizes.get(path))
+
+        # Add the directories to the to_be_deleted list - don't delete immediately. Victims are taken off the queue
+        # with the lock held, but deleted after it is released, so other threads are never held up by a delete.
+        # Recycled directories go into the recycle bin instead (if it has room)
+        with self._registry.lock(self._key):
+            recycle_bin = self._registry.recycle_bin(self._key)
+            for path in paths:
+                if path in recycled and len(recycle_bin) < self._recycle_max:
+                    recycle_bin.append(path)
+                else:
+                    self._delete_queue.append(path)
+
+            victims = []
+            if not self._delete_historic:
+                pass
+            elif self._count_only:
+                while len(self._delete_queue) > self._keep_max:
+                    victims.append(self._delete_queue.popleft())
+            else:
+                victims = self._select_victims(self._delete_queue)
+                for name in victims:
+                    self._delete_queue.remove(name)
+
+            # Directories which have left the live window are replaced in the queue by their (future) archives
+            archives = []
+            if self._archive_live is not None:
+                for name in list(self._delete_queue)[:max(len(self._delete_queue) - self._archive_live, 0)]:
+                    if not is_archive(name):
+                        self._registry.rename(self._key, name, archive_path(name))
+                        archives.append(name)
+
+        for name in archives:
+            self._reclaimer.schedule(self._archive, name, archive_path(name))
+
+        if self._manifest and victims:
+            with self._manifest.lock():
+                for name in victims:
+                    self._manifest.deleted(name)
+        self._evict_all(victims)
+        return exceeded
+
+    def _shared_release(self, paths, sizes):
+        """Release for shared retention - the delete queue is the manifest
+
+        Victims are claimed (recorded as deleted) while the manifest is locked, so no other process will pick
+        them, and are then deleted once the lock is released.
+        """
+        for path in paths:
+            self._retain(path, sizes.get(path))
+
+        with self._manifest.lock():
+            for path in paths:
+                self._manifest.released(path)
+
+            if not self._delete_historic:
+                return
+
+            historic = self._load_historic(released_only=True)
+            if self._count_only:
+                victims = historic[:max(len(historic) - self._keep_max, 0)]
+            else:
+                victims = self._select_victims(historic)
+            for name in victims:
+                self._manifest.deleted(name)
+
+        self._evict_all(victims)
+
+    def _evict_all(self, victims):
+        """Evict historic directories - several trees deleted in place are deleted in parallel
+
+        A failure is reported and doesn't stop the others.
+        """
+        if len(victims) > 1 and self._delete_workers > 1 and self._evict_mode == "delete" and not self._async_delete:
+            with ThreadPoolExecutor(max_workers=min(len(victims), self._delete_workers)) as pool:
+                list(pool.map(self._evict, victims))
+            return
+        for name in victims:
+            self._evict(name)
+
+    def _archive(self, path, archive):
+        """Background task - pack an historic directory into its archive, and then remove the tree"""
+        try:
+            size = archive_tree(path, archive)
+        except Exception as e:
+            # Keep the tree instead - unless it was evicted (as its archive) in the meantime
+            if not self._registry.rename(self._key, archive, path):
+                self._delete_now(path)
+            elif getattr(e, 'errno', None) != errno.ENOENT:
+                report_failure(path, e, self._on_error)
+            return
+
+        with self._registry.lock(self._key):
+            queued = archive in self._delete_queue
+            if queued:
+                self._registry.entry(self._key, archive).size = size
+
+        # Evicted while it was being packed - so the archive isn't wanted either
+        if not queued:
+            self._delete_now(archive)
+        self._delete_now(path)
+
+    def _delete_now(self, name):
+        """Delete a tree (or archive) on this thread - for background tasks, which are already off the exit path"""
+        try:
+            remove_tree(name, rmtree=self._rmtree)
+        except (IOError, OSError) as e:
+            report_failure(name, e, self._on_error)
+
+    def _retain(self, path, size=None):
+        """Record when a directory was released - and its size, measured now if any retention policy needs it
 
-        # Delete historic directories one at a time.
-        while len(self._delete_queue) > self._keep_max:
-            name = self._delete_queue[0]
+        :param size: The size of the tree, if it has just been measured
+        """
+        entry = self._registry.entry(self._key, path)
+        entry.released = time.time()
+        if size is not None:
+            entry.size = size
+        elif any(policy.needs_size for policy in self._policies):
+            entry.measure()
+
+    def _unwatch(self, path):
+        """Stop sampling a directory's usage - returns its Usage, or None if it has no quota"""
+        usage = self._usage.pop(path, None)
+        if usage is not None:
+            self._quota_watcher.unwatch(usage)
+        return usage
+
+    def _check_usage(self, usage, force=False):
+        """Sample a directory's usage (rate limited), reporting it the first time it is seen over max_bytes"""
+        with usage.lock:
+            size = usage.sample(force=force)
+            report = size > self._max_bytes and not usage.breached
+            usage.breached = size > self._max_bytes
+        if report:
+            if self._on_quota is not None:
+                try:
+                    self._on_quota(usage.path, size, self._max_bytes)
+                except Exception:
+                    logger.exception('on_quota callback failed for %s', usage.path)
+            else:
+                logger.warning('%s uses %s bytes - over its quota of %s bytes', usage.path, size, self._max_bytes)
+        return size
+
+    def usage(self, path=None):
+        """The disk space (in bytes) used by a directory in use - measured at most once every quota_interval if the
+        context manager has max_bytes, otherwise measured now
+
+        :param path: The directory - defaults to this context manager's directory (needed for a batch)
+        """
+        path = self._temp if path is None else path
+        if path is None:
+            return 0
+        usage = self._usage.get(path)
+        return usage.sample() if usage is not None else tree_size(path)
+
+    def check_quota(self, path=None):
+        """Measure a directory in use (at most once every quota_interval) and enforce max_bytes - a hard quota
+        raises QuotaExceeded, a soft quota is reported to on_quota
+
+        :param path: The directory - defaults to this context manager's directory (needed for a batch)
+        :return: The disk space (in bytes) used by the directory
+        """
+        path = self._temp if path is None else path
+        usage = self._usage.get(path) if path is not None else None
+        if usage is None:
+            return self.usage(path)
+        size = self._check_usage(usage)
+        if self._hard_limit is not None and size > self._hard_limit:
+            raise QuotaExceeded(path, size, self._hard_limit)
+        return size
+
+    def _select_victims(self, historic, policies=None, now=None):
+        """Apply the retention policies to the historic directories (oldest first) - returns those to evict"""
+        entries = [self._registry.entry(self._key, path) for path in historic]
+        policies = self._policies if policies is None else policies
+        return [entry.path for entry in select_victims(entries, policies, order=self._order, now=now)]
+
+    def _settings(self):
+        """A copy of this context manager with its settings alone - registered for the janitor, which keeps it for the
+        life of the process, so the directories in use, their quotas and the template are left out"""
+        settings = copy.copy(self)
+        settings._usage = {}
+        settings._template = None
+        settings._temp = settings._lazy_dir = settings._reserved = None
+        return settings
+
+    def _expire(self, ttl=None, limit=None, now=None):
+        """Evict the historic directories released more than ttl seconds ago - used by the janitor
+
+        :param ttl: The time to live in seconds - defaults to max_age
+        :param limit: The maximum number of directories to evict
+        :param now: The current time - defaults to time.time()
+        :return: The number of directories evicted
+        """
+        reaped = len(self._reap()) if self._owner_stamp else 0
+        ttl = self._max_age if ttl is None else ttl
+        if ttl is None or not self._delete_historic:
+            return reaped
+        policies = [MaxAge(ttl)]
+
+        if self._shared:
+            with self._manifest.lock():
+                victims = self._select_victims(self._load_historic(released_only=True), policies, now)[:limit]
+                for name in victims:
+                    self._manifest.deleted(name)
+        else:
+            with self._registry.lock(self._key):
+                victims = self._select_victims(self._delete_queue, policies, now)[:limit]
+                for name in victims:
+                    self._delete_queue.remove(name)
+            if self._manifest:
+                with self._manifest.lock():
+                    for name in victims:
+                        self._manifest.deleted(name)
+
+        for name in victims:
+            self._evict(name)
+        return reaped + len(victims)
+
+    def _reap(self):
+        """Reclaim the directories in the root (or its buckets) whose owners have died - returns their paths"""
+        reaped = []
+        for home in self._homes:
+            reaped.extend(reap_orphans(home, self._prefix, self._suffix, on_error=self._on_error))
+        if self._manifest and reaped:
+            with self._manifest.lock():
+                for path in reaped:
+                    self._manifest.deleted(path)
+        return reaped
+
+    def _evict(self, name):
+        """Delete an historic directory - either immediately or by handing it to the background threads"""
+        entry = self._registry.forget(self._key, name)
+        # In use by another (live) process - found by a scan, but not historic
+        if self._owner_stamp and has_live_owner(name):
+            return
+        if not self._metrics.enabled:
+            return self._remove(name, self._on_error)
+
+        size = entry.known_size if entry is not None else None
+        if size is None and self._metrics.measure:
+            size = tree_size(name)
+        start = time.perf_counter()
+
+        def evicted():
+            # Only counted once the tree has actually gone - by a background thread for async and trash eviction
+            self._metrics.record('evict', self._key, path=name, duration=time.perf_counter() - start, size=size)
+
+        self._remove(name, self._record_failure, on_done=evicted)
+
+    def _record_failure(self, path, exc):
+        """Delete failure handler while metrics are enabled - counted, then reported as normal"""
+        self._metrics.record('delete_failed', self._key, path=path, error=exc)
+        report_failure(path, exc, self._on_error)
+
+    def _remove(self, name, on_error, on_done=None):
+        """Delete (or trash) an historic directory, reporting failures to on_error
+
+        :param on_done: Callable invoked (with no arguments) once the directory has been deleted - possibly later, by
+                        a background thread
+        """
+        if self._evict_mode == "trash":
+            # A single rename takes the directory out of use; the trash is purged in the background
             try:
-                shutil.rmtree(os.path.join(tempfile.gettempdir(), name))
-                del self._delete_queue[0]
+                entry = move_to_trash(name, self._root)
             except (IOError, OSError) as e:
-                del self._delete_queue[0]
-                return False
+                # Already gone - otherwise fall back to deleting it in place
+                if e.errno == errno.ENOENT:
+                    return
+            else:
+                self._reclaimer.schedule_purge(os.path.dirname(entry), batch=self._purge_batch, on_error=on_error,
+                                               entry=entry, on_done=on_done)
+                return
+
+        if self._async_delete:
+            self._reclaimer.submit(name, on_error=on_error, rmtree=self._rmtree, on_done=on_done)
+            return
+
+        try:
+            remove_tree(name, rmtree=self._rmtree)
+        except (IOError, OSError) as e:
+            report_failure(name, e, on_error)
+            return
+        if on_done is not None:
+            on_done()
+
+    @classmethod
+    def flush(cls, timeout=None):
+        """Wait for all background deletes (from async_delete context managers) to complete
+
+        :param timeout: The maximum number of seconds to wait - None waits until all deletes are done
+        :return: A list of (path, exception) tuples for each delete which failed since the last flush
+        """
+        return cls._reclaimer.flush(timeout=timeout)
+
+    wait = flush
+
+    @classmethod
+    def many(cls, count, **kwargs):
+        """A context manager which creates a batch of directories at once - entering it returns a list of paths
+
+        The directories are created together, and released together : retention is applied once for the whole
+        batch on exit, and the historic directories it evicts are deleted in parallel.
+
+        :param count: The number of directories to create
+        :param kwargs: Any TempDirectoryContext arguments (apart from lazy) - applied to every directory
+        :return: A context manager
+        """
+        if kwargs.get('lazy'):
+            raise ValueError('a batch of directories can\'t be lazy')
+        return _BatchContext(cls(**kwargs), count)
+
+    @classmethod
+    def reap(cls, root=None, on_error=None, prefix="tmp", suffix="TempDirCont"):
+        """Reclaim the directories (stamped by owner_stamp context managers) whose owning process has died
+
+        :param root: The root directory to reap; defaults to tempfile.gettempdir()
+        :param on_error: Callable invoked as on_error(path, exc) for each directory which can't be deleted
+        :param prefix: Only directories with this prefix are reclaimed
+        :param suffix: Only directories with this suffix are reclaimed
+        :return: The paths of the directories reclaimed
+        """
+        root = tempfile.gettempdir() if not root else root
+        return reap_orphans(root, prefix, suffix, on_error=on_error)
+
+    @classmethod
+    def start_janitor(cls, interval=60.0, ttl=None, batch=64):
+        """Start a background thread which evicts expired historic directories, for every prefix, suffix and root
+
+        Directories are expired even if no more context managers are created for their prefix, suffix and root.
+        The thread doesn't survive a fork - call start_janitor again in the child if it is needed there.
+
+        :param interval: The number of seconds between sweeps
+        :param ttl: The number of seconds a directory is retained after it is released; None uses the max_age of
+                    the last context manager created for each prefix, suffix and root (without one, nothing expires)
+        :param batch: The maximum number of directories evicted by each sweep - the rest wait for the next sweep
+        """
+        cls._janitor.start(interval=interval, ttl=ttl, batch=batch)
+
+    @classmethod
+    def stop_janitor(cls, timeout=None):
+        """Stop the background janitor thread started by start_janitor
+
+        :param timeout: The maximum number of seconds to wait for a sweep in progress to finish
+        """
+        cls._janitor.stop(timeout=timeout)
+
+    @classmethod
+    def purge(cls, root=None, batch=None):
+        """Delete the contents of the trash directories (used by evict="trash" context managers) for a root
+
+        The trash of every sharded namespace in the root is purged too - a sharded context manager keeps its trash in
+        its namespace.
+
+        :param root: The root directory whose trash is purged; defaults to tempfile.gettempdir()
+        :param batch: The maximum number of trash entries to delete - None empties the trash
+        :return: The number of trash entries processed
+        """
+        root = tempfile.gettempdir() if not root else root
+        processed = 0
+        for home in [root] + namespaces(root):
+            if batch is not None and processed >= batch:
+                break
+            processed += purge_trash(trash_path(home), batch=None if batch is None else batch - processed)
+        return processed
+
+
+class _BatchContext(object):
+    """Context manager for a batch of directories - see TempDirectoryContext.many"""
+
+    def __init__(self, context, count):
+        self._context = context
+        self._count = count
+        self._paths = None
+
+    def __enter__(self):
+        """Context Manager Entry point - not to be called directly"""
+        self._paths = self._context._enter_directories(self._count)
+        return list(self._paths)
+
+    # noinspection PyUnusedLocal
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        """Context Manager exit point - not to be called directly"""
+        paths, self._paths = self._paths, None
+        exceeded = self._context._release(paths)
+        if exceeded and exc_type is None:
+            raise exceeded[0]
         return False
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=TempDirectoryContext._registry._after_fork)
+    os.register_at_fork(after_in_child=TempDirectoryContext._janitor._after_fork)
+    os.register_at_fork(after_in_child=TempDirectoryContext._quota_watcher._after_fork)
@@ -0,0 +1,181 @@
+#!/usr/bin/env python
+"""
+TempDirectoryPool : A warm pool of pre-created temporary directories
+
+Summary :
+    Keeps a number of empty directories ready, so that entering a context manager takes a directory
+    from the pool rather than creating one. The pool is refilled by a background thread.
+
+Use Case :
+    As an application which runs thousands of short tasks I want each temporary directory to be ready
+    immediately so that directory creation isn't on my critical path
+
+Testable Statements :
+    Can I create a pool of directories
+    Does a context manager from the pool use a pre-created directory
+    Are pooled directories named, and retained, as TempDirectoryContext directories are
+    Does the pool refill itself in the background
+    Are unused directories removed when the pool is closed
+
+Example :
+    from TempDirectoryContext import TempDirectoryPool
+
+    with TempDirectoryPool(size=8) as pool:
+        for task in tasks:
+            with pool.context() as tmp_path:
+                # tmp_path is /tmp/tmp******TempDirCont - exactly as with TempDirectoryContext
+"""
+
+import errno
+import os
+import os.path
+import shutil
+import tempfile
+import threading
+import weakref
+from collections import deque
+
+from .TempDirectoryContext import TempDirectoryContext
+from ._reclaim import HIDDEN_PREFIX
+from ._storage import storage_backend, DiskStorage
+
+__author__ = 'Tony Flury : anthony.flury@btinternet.com'
+__created__ = '16 Oct 2026'
+
+__all__ = ['TempDirectoryPool']
+
+
+class TempDirectoryPool(object):
+    """Warm pool of pre-created temporary directories"""
+
+    def __init__(self, size=4, suffix="TempDirCont", prefix="tmp", root=None, **options):
+        """Warm pool of pre-created temporary directories
+
+        Spare directories are created in a hidden staging directory in the root (so they are never mistaken
+        for historic directories) and are renamed into the root when they are taken from the pool.
+
+        :param size: The number of directories to keep ready
+        :param suffix: The end of the directory names
+        :param prefix: The start of the directory names
+        :param root: The directory in which the Temp directories are created; defaults to tempfile.gettempdir()
+        :param options: Any other TempDirectoryContext arguments - applied to every context manager from the pool
+
+        :type size: int
+        :type suffix: str
+        :type prefix: str
+        :type root: str
+        """
+        self._size = size
+        self._suffix = suffix
+        self._prefix = prefix
+        self._root = tempfile.gettempdir() if not root else root
+        self._options = options
+
+        self._staging = tempfile.mkdtemp(prefix=HIDDEN_PREFIX + '-pool-', dir=self._root)
+        self._spare = deque()
+        self._condition = threading.Condition()
+        self._closed = False
+
+        # Spare directories are removed even if the pool is never closed
+        self._finalizer = weakref.finalize(self, shutil.rmtree, self._staging, True)
+
+        self._thread = threading.Thread(target=self._refill, name='TempDirectoryPool-refill')
+        self._thread.daemon = True
+        self._thread.start()
+
+    @property
+    def available(self):
+        """The number of directories ready to be used"""
+        with self._condition:
+            return len(self._spare)
+
+    def acquire(self):
+        """Take a directory from the pool - a directory is created directly if the pool is empty
+
+        :return: The path of an empty directory in the root
+        """
+        with self._condition:
+            if self._closed:
+                raise ValueError('TempDirectoryPool is closed')
+            spare = self._spare.popleft() if self._spare else None
+            self._condition.notify()
+
+        if spare is not None:
+            path = os.path.join(self._root, os.path.basename(spare))
+            # A rename onto an existing (empty) directory would succeed - so never allow it
+            if not os.path.lexists(path):
+                try:
+                    os.rename(spare, path)
+                    return path
+                except (IOError, OSError) as e:
+                    if e.errno != errno.ENOENT:
+                        raise
+        return tempfile.mkdtemp(suffix=self._suffix, prefix=self._prefix, dir=self._root)
+
+    def context(self, **options):
+        """A context manager which uses a directory from the pool
+
+        :param options: TempDirectoryContext arguments - overriding those given to the pool
+        :return: A TempDirectoryContext for the pool's prefix, suffix and root
+        """
+        kwargs = dict(self._options, **options)
+        return _PooledContext(self, suffix=self._suffix, prefix=self._prefix, root=self._root, **kwargs)
+
+    def _refill(self):
+        """Background thread - keep the pool topped up"""
+        while True:
+            with self._condition:
+                while not self._closed and len(self._spare) >= self._size:
+                    self._condition.wait()
+                if self._closed:
+                    return
+
+            try:
+                spare = tempfile.mkdtemp(suffix=self._suffix, prefix=self._prefix, dir=self._staging)
+            except (IOError, OSError):
+                # The staging directory has gone (closed or removed) - stop refilling
+                return
+
+            with self._condition:
+                self._spare.append(spare)
+
+    def close(self):
+        """Stop refilling the pool and remove any unused directories"""
+        with self._condition:
+            self._closed = True
+            self._spare.clear()
+            self._condition.notify_all()
+        self._thread.join()
+        self._finalizer()
+
+    def __enter__(self):
+        """Context Manager Entry point - not to be called directly"""
+        return self
+
+    # noinspection PyUnusedLocal
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        """Context Manager exit point - not to be called directly"""
+        self.close()
+        return False
+
+
+class _PooledContext(TempDirectoryContext):
+    """TempDirectoryContext which takes its directory from a TempDirectoryPool"""
+
+    def __init__(self, pool, **kwargs):
+        if kwargs.get('layout', 'flat') != 'flat':
+            raise ValueError('pooled directories are always created in the root - layout must be "flat"')
+        if not isinstance(storage_backend(kwargs.get('storage', 'disk')), DiskStorage):
+            raise ValueError('pooled directories are always created in the root - storage must be "disk"')
+        self._pool = pool
+        super(_PooledContext, self).__init__(**kwargs)
+
+    def _make_directory(self):
+        """Take the temporary directory from the pool"""
+        return self._pool.acquire()
+
+    def _settings(self):
+        # The janitor never takes directories - so it mustn't keep the pool alive either
+        settings = super(_PooledContext, self)._settings()
+        settings._pool = None
+        return settings
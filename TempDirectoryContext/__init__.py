@@ -1 +1,3 @@
-from .TempDirectoryContext import *
\ No newline at end of file
+from .TempDirectoryContext import *
+from .TempDirectoryPool import *
+from .AsyncTempDirectoryContext import *
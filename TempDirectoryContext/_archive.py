@@ -0,0 +1,92 @@
+#!/usr/bin/env python
+"""
+TempDirectoryContext._archive : Compressed archives of historic directories
+
+Summary :
+    Packs an historic directory into a compressed tarball in the root (streaming the tree into the
+    archive a file at a time), so that it can be kept for post-mortem debugging at a fraction of the
+    disk space and inodes - and extracts an archive again when it is needed.
+
+Use Case :
+    As an application which keeps historic directories only for debugging I want them kept compressed
+    so that retention doesn't fill my temporary disk
+"""
+
+import os
+import os.path
+import tarfile
+
+from ._reclaim import HIDDEN_PREFIX
+
+__author__ = 'Tony Flury : anthony.flury@btinternet.com'
+__created__ = '16 Oct 2026'
+
+ARCHIVE_SUFFIX = '.tar.gz'
+
+
+def archive_path(path):
+    """The archive for a directory - alongside it, in the root"""
+    return path + ARCHIVE_SUFFIX
+
+
+def is_archive(path):
+    """Whether a path in a delete queue is an archive, rather than a directory"""
+    return path.endswith(ARCHIVE_SUFFIX)
+
+
+def archive_tree(path, archive, compresslevel=6):
+    """Pack a directory tree into a compressed tarball
+
+    The archive is written under a hidden name and renamed into place once it is complete, so a partial
+    archive is never mistaken for an historic one. Its modification time is set to the directory's creation
+    time, so it keeps the directory's place in the historic order. The directory itself is not removed.
+
+    :param path: The directory to pack
+    :param archive: The archive to create
+    :param compresslevel: The gzip compression level
+    :return: The size of the archive in bytes
+    """
+    ctime = os.lstat(path).st_ctime
+    partial = os.path.join(os.path.dirname(archive), '{}-partial-{}-{}'.format(
+        HIDDEN_PREFIX, os.getpid(), os.path.basename(archive)))
+    try:
+        with tarfile.open(partial, 'w:gz', compresslevel=compresslevel) as tar:
+            tar.add(path, arcname=os.path.basename(path))
+        os.utime(partial, (ctime, ctime))
+        os.rename(partial, archive)
+    except BaseException:
+        try:
+            os.unlink(partial)
+        except OSError:
+            pass
+        raise
+    return os.lstat(archive).st_size
+
+
+def extract_archive(archive, destination=None):
+    """Extract an archived historic directory
+
+    :param archive: The archive (a path ending in .tar.gz) to extract
+    :param destination: The directory to extract into - defaults to the directory holding the archive, so the
+                        historic directory is restored under its original name (the archive is left in place)
+    :return: The path of the extracted directory
+    """
+    if not is_archive(archive):
+        raise ValueError('archives end with {} : {!r}'.format(ARCHIVE_SUFFIX, archive))
+    destination = os.path.dirname(os.path.abspath(archive)) if destination is None else destination
+    name = os.path.basename(archive)[:-len(ARCHIVE_SUFFIX)]
+
+    with tarfile.open(archive, 'r:gz') as tar:
+        members = tar.getmembers()
+        for member in members:
+            # Only ever extract the one directory - nothing outside it
+            parts = os.path.normpath(member.name).split(os.sep)
+            if os.path.isabs(member.name) or os.pardir in parts or parts[0] != name:
+                raise ValueError('{} is not a TempDirectoryContext archive : {!r}'.format(archive, member.name))
+        if hasattr(tarfile, 'data_filter'):
+            tar.extractall(destination, members=members, filter='data')
+        else:
+            # Without extraction filters links can't be checked - so they aren't extracted
+            tar.extractall(destination, members=[member for member in members
+                                                 if not (member.issym() or member.islnk())])
+    return os.path.join(destination, name)
@@ -0,0 +1,114 @@
+#!/usr/bin/env python
+"""
+TempDirectoryContext._janitor : Background expiry of retained directories
+
+Summary :
+    An optional thread which wakes on a schedule and evicts retained directories which have been
+    kept for longer than a time to live - for every key in the process, not just the keys which
+    are still creating directories.
+
+Use Case :
+    As a long running service I want stale directories to be removed even when I stop creating
+    directories with that prefix, so that old trees don't stay on disk forever
+"""
+
+import logging
+import threading
+
+__author__ = 'Tony Flury : anthony.flury@btinternet.com'
+__created__ = '16 Oct 2026'
+
+logger = logging.getLogger('TempDirectoryContext')
+
+
+class Janitor(object):
+    """Background thread which expires retained directories, across all the keys in a registry"""
+
+    def __init__(self, registry):
+        """Background thread which expires retained directories, across all the keys in a registry
+
+        :param registry: The Registry whose keys are swept - each key's owner (the last context manager
+                         created for it) evicts the expired directories, using its own eviction settings.
+        """
+        self._registry = registry
+        self._lock = threading.Lock()
+        self._thread = None
+        self._stop = None
+        self._interval = 60.0
+        self._ttl = None
+        self._batch = 64
+        self._next_key = 0
+
+    @property
+    def running(self):
+        """Whether the janitor thread is running in this process"""
+        with self._lock:
+            return self._thread is not None and self._thread.is_alive()
+
+    def start(self, interval=60.0, ttl=None, batch=64):
+        """Start the janitor thread - if it is already running its settings are changed
+
+        :param interval: The number of seconds between sweeps
+        :param ttl: The number of seconds a directory is retained after it is released - None uses each
+                    key's max_age (keys without one are left alone)
+        :param batch: The maximum number of directories evicted by each sweep - the rest wait for the next
+        """
+        with self._lock:
+            self._interval, self._ttl, self._batch = interval, ttl, batch
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stop = threading.Event()
+            self._thread = threading.Thread(target=self._run, args=(self._stop,), name='TempDirectoryContext-janitor')
+            self._thread.daemon = True
+            self._thread.start()
+
+    def stop(self, timeout=None):
+        """Stop the janitor thread - waiting (up to timeout seconds) for a sweep in progress to finish"""
+        with self._lock:
+            thread, self._thread = self._thread, None
+            if self._stop is not None:
+                self._stop.set()
+        if thread is not None and thread is not threading.current_thread():
+            thread.join(timeout)
+
+    def _run(self, stop):
+        """Janitor thread - sleep until the next sweep is due, or until stopped"""
+        while not stop.wait(self._interval):
+            try:
+                self.sweep()
+            except Exception:
+                logger.exception('TempDirectoryContext janitor sweep failed')
+
+    def sweep(self, ttl=None, batch=None, now=None):
+        """Evict the expired directories now
+
+        Keys are visited in turn, starting after the last key visited by the previous sweep, so that a sweep
+        which reaches its batch limit doesn't always favour the same keys.
+
+        :param ttl: Overrides the janitor's ttl
+        :param batch: Overrides the janitor's batch
+        :param now: The current time - defaults to time.time()
+        :return: The number of directories evicted
+        """
+        ttl = self._ttl if ttl is None else ttl
+        batch = self._batch if batch is None else batch
+
+        keys = self._registry.keys()
+        start = self._next_key % len(keys) if keys else 0
+        evicted = 0
+        for index in range(len(keys)):
+            if evicted >= batch:
+                break
+            key = keys[(start + index) % len(keys)]
+            self._next_key = start + index + 1
+            owner = self._registry.owner(key)
+            if owner is None:
+                continue
+            evicted += owner._expire(ttl, limit=batch - evicted, now=now)
+        return evicted
+
+    def _after_fork(self):
+        """In a forked child - the janitor thread didn't survive the fork, so start() must be called again"""
+        self._lock = threading.Lock()
+        self._thread = None
+        self._stop = None
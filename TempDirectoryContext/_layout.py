@@ -0,0 +1,95 @@
+#!/usr/bin/env python
+"""
+TempDirectoryContext._layout : Sharded directory layout
+
+Summary :
+    With the sharded layout the directories for a prefix, suffix and root are created in a namespace
+    directory of their own in the root, rather than in the root itself - and optionally spread over
+    a fixed number of bucket directories within the namespace, chosen by a hash of the directory name.
+    Historic directories are then found by reading the namespace (or its buckets) alone, however many
+    other entries the root has.
+
+Use Case :
+    As an application sharing a large /tmp I want the cost of creating and discovering my directories
+    to depend only on the number of my directories, so that they stay fast as /tmp grows
+
+Layout :
+    flat    : <root>/<prefix>******<suffix>
+    sharded : <root>/.TempDirCont-ns-<prefix>-<suffix>-<hash>/<prefix>******<suffix>
+              <root>/.TempDirCont-ns-<prefix>-<suffix>-<hash>/<bucket>/<prefix>******<suffix>  (with buckets)
+
+    The directory names are the same in both layouts. The namespace is hidden, so a flat scan of the
+    root never mistakes it for an historic directory.
+"""
+
+import errno
+import hashlib
+import os
+import os.path
+import zlib
+
+from ._reclaim import HIDDEN_PREFIX
+
+__author__ = 'Tony Flury : anthony.flury@btinternet.com'
+__created__ = '16 Oct 2026'
+
+LAYOUTS = ("flat", "sharded")
+
+NAMESPACE_PREFIX = HIDDEN_PREFIX + '-ns-'
+
+
+def namespace_path(root, prefix, suffix):
+    """The namespace directory for a prefix and suffix in a root
+
+    The hash keeps namespaces distinct where the prefix and suffix alone are ambiguous ("a-" and "b" against "a" and
+    "-b").
+    """
+    digest = hashlib.sha1('{}\0{}'.format(prefix, suffix).encode('utf-8')).hexdigest()[:8]
+    return os.path.join(root, '{}{}-{}-{}'.format(NAMESPACE_PREFIX, prefix, suffix, digest))
+
+
+def namespaces(root):
+    """Every namespace directory in a root - symbolic links are ignored"""
+    try:
+        with os.scandir(root) as entries:
+            return sorted(entry.path for entry in entries
+                          if entry.name.startswith(NAMESPACE_PREFIX) and entry.is_dir(follow_symlinks=False))
+    except (IOError, OSError) as e:
+        if e.errno != errno.ENOENT:
+            raise
+        return []
+
+
+def bucket_name(name, buckets):
+    """The bucket for a directory name - a fixed width hex number"""
+    width = len('{:x}'.format(buckets - 1))
+    return '{:0{}x}'.format(zlib.crc32(name.encode('utf-8')) % buckets, width)
+
+
+def bucket_paths(namespace, buckets):
+    """Every bucket directory in a namespace"""
+    width = len('{:x}'.format(buckets - 1))
+    return [os.path.join(namespace, '{:0{}x}'.format(bucket, width)) for bucket in range(buckets)]
+
+
+def place(path, buckets):
+    """The path for a new directory in a namespace - moved into its bucket if there are buckets
+
+    :param path: The directory's path directly in the namespace
+    :param buckets: The number of buckets - 0 for none
+    """
+    if not buckets:
+        return path
+    namespace, name = os.path.split(path)
+    return os.path.join(namespace, bucket_name(name, buckets), name)
+
+
+def make_directory(path):
+    """Create a directory (mode 0700) - creating its namespace and bucket first if they don't exist yet"""
+    try:
+        os.mkdir(path, 0o700)
+    except (IOError, OSError) as e:
+        if e.errno != errno.ENOENT:
+            raise
+        os.makedirs(os.path.dirname(path), 0o700, exist_ok=True)
+        os.mkdir(path, 0o700)
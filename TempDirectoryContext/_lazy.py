@@ -0,0 +1,90 @@
+#!/usr/bin/env python
+"""
+TempDirectoryContext._lazy : Directories which are only created when they are used
+
+Summary :
+    A path-like object returned by a lazy context manager in place of the directory path. The
+    directory is only created the first time the object is used as a path (os.fspath, str, open,
+    mkdir or the / operator); if it is never used, nothing is created and nothing is retained.
+
+Use Case :
+    As an application which enters context managers defensively I want directories which are never
+    written to to cost nothing, so that I only pay for the directories I use
+"""
+
+import base64
+import os
+import os.path
+import pathlib
+import threading
+
+__author__ = 'Tony Flury : anthony.flury@btinternet.com'
+__created__ = '16 Oct 2026'
+
+
+def reserve_name(root, prefix, suffix):
+    """A name for a directory which doesn't exist yet - random, as tempfile.mkdtemp's names are"""
+    return os.path.join(root, prefix + base64.b32encode(os.urandom(5)).decode('ascii').lower() + suffix)
+
+
+class LazyDirectory(os.PathLike):
+    """A temporary directory which is created the first time it is used as a path"""
+
+    def __init__(self, reserved, materialise):
+        """A temporary directory which is created the first time it is used as a path
+
+        :param reserved: The path the directory will (normally) be created with
+        :param materialise: Callable which creates the directory and returns its path
+        """
+        self._reserved = reserved
+        self._materialise = materialise
+        self._lock = threading.Lock()
+        self._path = None
+        self._closed = False
+
+    @property
+    def materialised(self):
+        """Whether the directory has been created"""
+        return self._path is not None
+
+    def materialise(self):
+        """Create the directory (if it hasn't been created already) - returns its path"""
+        with self._lock:
+            if self._path is None:
+                if self._closed:
+                    raise ValueError('The context manager for {} has exited'.format(self._reserved))
+                self._path = self._materialise()
+            return self._path
+
+    def __fspath__(self):
+        return self.materialise()
+
+    def __str__(self):
+        return self.materialise()
+
+    def __truediv__(self, other):
+        return pathlib.Path(self.materialise()) / other
+
+    def open(self, name, *args, **kwargs):
+        """Open a file in the directory - as the builtin open, with name relative to the directory"""
+        return open(os.path.join(self.materialise(), name), *args, **kwargs)
+
+    def mkdir(self, name, mode=0o777, exist_ok=False):
+        """Create a sub-directory (and any missing parents) in the directory - returns its path"""
+        path = os.path.join(self.materialise(), name)
+        os.makedirs(path, mode, exist_ok=exist_ok)
+        return path
+
+    def close(self):
+        """The context manager has exited - no directory can be created after this
+
+        :return: The path of the directory, or None if it was never created
+        """
+        with self._lock:
+            self._closed = True
+            return self._path
+
+    def __repr__(self):
+        if self._path is not None:
+            return '{}({!r})'.format(type(self).__name__, self._path)
+        return '{}({!r}, materialised=False)'.format(type(self).__name__, self._reserved)
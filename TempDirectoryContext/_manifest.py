@@ -0,0 +1,308 @@
+#!/usr/bin/env python
+"""
+TempDirectoryContext._manifest : On-disk index of managed directories
+
+Summary :
+    An append-only log, kept in the root directory, of the directories created, released and deleted
+    for a prefix and suffix - so a new process can rebuild its delete queue without scanning the root,
+    and so that several processes can share one retention queue.
+
+Use Case :
+    As a short lived application I want to find the historic directories quickly so that I don't
+    pay for a scan of the whole root directory every time I start
+
+    As a set of parallel processes we want keep_max to apply across all of us so that directories are
+    retained (and deleted) exactly once
+
+File format :
+    A header line, followed by one line per event :
+        TempDirCont-manifest 2
+        C <ctime> <directory name>      - directory created (and in use)
+        R <directory name>              - directory released by its context manager (now historic)
+        D <directory name>              - directory deleted (or claimed for deletion)
+
+    Directories are ordered by creation, and a directory moves to the end of the order when released.
+
+    A manifest naming anything other than a plain directory name with the prefix and suffix is stale, as
+    is one which isn't owned by this user or is writable by group or others. The manifest and its lock
+    file are never opened through a symbolic link.
+"""
+
+import errno
+import hashlib
+import os
+import os.path
+import stat
+import threading
+from collections import OrderedDict
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+__author__ = 'Tony Flury : anthony.flury@btinternet.com'
+__created__ = '16 Oct 2026'
+
+HEADER = 'TempDirCont-manifest 2\n'
+
+# The log is rewritten on load once it holds this many more records than live directories
+COMPACT_SLACK = 64
+
+O_NOFOLLOW = getattr(os, 'O_NOFOLLOW', 0)
+
+
+def manifest_path(root, prefix, suffix):
+    """The manifest file for a (root, prefix, suffix) key - hidden, and never a directory, so never historic"""
+    key = hashlib.sha1('{!r}'.format((prefix, suffix)).encode('utf-8')).hexdigest()[:16]
+    return os.path.join(root, '.TempDirCont-{}.manifest'.format(key))
+
+
+def is_private(fd):
+    """Whether an open file is owned by this user, and not writable by group or others"""
+    st = os.fstat(fd)
+    geteuid = getattr(os, 'geteuid', None)
+    if geteuid is not None and st.st_uid != geteuid():
+        return False
+    return stat.S_ISREG(st.st_mode) and not st.st_mode & 0o022
+
+
+def _refuse(path):
+    return OSError(errno.EPERM, 'not a private file owned by this user', path)
+
+
+class Manifest(object):
+    """Append-only log of the directories created, released and deleted for a (root, prefix, suffix) key"""
+
+    def __init__(self, root, prefix, suffix):
+        """Append-only log of the directories created, released and deleted for a (root, prefix, suffix) key
+
+        :param root: The directory containing the managed directories (and the manifest)
+        :param prefix: The start of the managed directory names
+        :param suffix: The end of the managed directory names
+        """
+        self._root = root
+        self._prefix = prefix
+        self._suffix = suffix
+        self.path = manifest_path(root, prefix, suffix)
+        # Held (by one thread) for as long as the file is locked - the flock alone doesn't exclude other threads, as
+        # it belongs to the file descriptor rather than the thread
+        self._thread_lock = threading.RLock()
+        self._lock_fd = None
+        self._lock_depth = 0
+        self._lock_pid = os.getpid()
+
+    def lock(self):
+        """Context manager which holds an exclusive lock on the manifest - across processes as well as threads
+
+        The lock is taken on a separate lock file, as the manifest itself is replaced when it is rewritten.
+        Where file locking isn't available the manifest is used unlocked.
+        """
+        return _ManifestLock(self)
+
+    def read(self, check=True):
+        """Read the manifest
+
+        :param check: Whether to check that the live directories still exist
+        :return: An OrderedDict of live directory name -> released (bool), in queue order, or None if the
+                 manifest is missing or stale (a live directory has disappeared, or the file is damaged)
+        """
+        try:
+            fd = os.open(self.path, os.O_RDONLY | O_NOFOLLOW)
+        except (IOError, OSError) as e:
+            # ELOOP - the manifest is a symbolic link
+            if e.errno in (errno.ENOENT, errno.ELOOP):
+                return None
+            raise
+        with os.fdopen(fd, 'r') as fd:
+            if not is_private(fd.fileno()):
+                return None
+            lines = fd.readlines()
+
+        if not lines or lines[0] != HEADER or not lines[-1].endswith('\n'):
+            return None
+
+        live = OrderedDict()
+        ctimes = {}
+        for line in lines[1:]:
+            fields = line.rstrip('\n').split(' ', 2)
+            if len(fields) > 1 and not self._valid(fields[-1]):
+                return None
+            if fields[0] == 'C' and len(fields) == 3:
+                try:
+                    ctimes[fields[2]] = float(fields[1])
+                except ValueError:
+                    return None
+                live.pop(fields[2], None)
+                live[fields[2]] = False
+            elif fields[0] == 'R' and len(fields) == 2:
+                if live.pop(fields[1], None) is not None:
+                    live[fields[1]] = True
+            elif fields[0] == 'D' and len(fields) == 2:
+                live.pop(fields[1], None)
+            else:
+                return None
+
+        if not check:
+            return live
+
+        # Only the managed directories are checked - not the whole root
+        if not all(os.path.isdir(os.path.join(self._root, name)) for name in live):
+            return None
+
+        if len(lines) - 1 > len(live) + COMPACT_SLACK:
+            self._write(live, ctimes)
+
+        return live
+
+    def _valid(self, name):
+        """Whether a name could be a managed directory in the root - never a path, or a name for another key"""
+        return (os.sep not in name and (os.altsep is None or os.altsep not in name) and '..' not in name
+                and len(name) > len(self._prefix) + len(self._suffix)
+                and name.startswith(self._prefix) and name.endswith(self._suffix))
+
+    def load(self, released_only=False):
+        """Read the live directories from the manifest
+
+        :param released_only: Whether directories which are still in use by their context manager are left out
+        :return: A list of directory paths, in queue order (oldest first), or None if the manifest is missing
+                 or stale
+        """
+        live = self.read()
+        if live is None:
+            return None
+        return [os.path.join(self._root, name) for name, released in live.items()
+                if released or not released_only]
+
+    def in_use(self):
+        """The names of the directories recorded as created but not yet released - even if the manifest is stale"""
+        live = self.read(check=False)
+        return set() if live is None else set(name for name, released in live.items() if not released)
+
+    def rewrite(self, paths, in_use=()):
+        """Replace the manifest with the given directories
+
+        :param paths: The directory paths, oldest first - directories which no longer exist are left out
+        :param in_use: The names of directories which are still in use - all the others are recorded as released
+        """
+        self._write(OrderedDict((os.path.basename(path), os.path.basename(path) not in in_use)
+                                for path in paths), {})
+
+    def _write(self, live, ctimes):
+        """Write a complete manifest, atomically replacing the existing one"""
+        records = [HEADER]
+        for name, released in live.items():
+            ctime = ctimes.get(name)
+            if ctime is None:
+                try:
+                    ctime = os.stat(os.path.join(self._root, name)).st_ctime
+                except OSError:
+                    continue
+            records.append('C {!r} {}\n'.format(ctime, name))
+            if released:
+                records.append('R {}\n'.format(name))
+
+        temp = '{}.{}.{}'.format(self.path, os.getpid(), threading.current_thread().ident)
+        flags = os.O_WRONLY | os.O_CREAT | os.O_EXCL | O_NOFOLLOW
+        try:
+            fd = os.open(temp, flags, 0o600)
+        except (IOError, OSError) as e:
+            if e.errno != errno.EEXIST:
+                raise
+            # Left behind by a process which died while writing - if it is someone else's this fails too
+            os.unlink(temp)
+            fd = os.open(temp, flags, 0o600)
+        with os.fdopen(fd, 'w') as fd:
+            fd.writelines(records)
+        os.replace(temp, self.path)
+
+    def created(self, path):
+        """Record the creation of a managed directory"""
+        self._append('C {!r} {}\n'.format(os.stat(path).st_ctime, os.path.basename(path)))
+
+    def released(self, path):
+        """Record that a managed directory has been released by its context manager"""
+        self._append('R {}\n'.format(os.path.basename(path)))
+
+    def deleted(self, path):
+        """Record the deletion (or eviction) of a managed directory"""
+        self._append('D {}\n'.format(os.path.basename(path)))
+
+    def _append(self, record):
+        """Append a single record - a single O_APPEND write, so records from several processes don't interleave
+
+        A missing manifest is not created here - it is only ever written in full, after a scan of the root,
+        so that it never omits directories created before it existed; context managers write it before the
+        first directory is created.
+        """
+        try:
+            fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | O_NOFOLLOW)
+        except (IOError, OSError) as e:
+            if e.errno == errno.ENOENT:
+                return
+            if e.errno == errno.ELOOP:
+                raise _refuse(self.path)
+            raise
+        try:
+            if not is_private(fd):
+                raise _refuse(self.path)
+            os.write(fd, record.encode('utf-8'))
+        finally:
+            os.close(fd)
+
+
+class _ManifestLock(object):
+    """Exclusive flock on a manifest's lock file - re-entrant for the thread holding it
+
+    The Manifest's thread lock is taken first and held until the flock is released, so the lock depth and file
+    descriptor are only ever used by the thread holding the lock - other threads wait, as other processes do.
+    """
+
+    def __init__(self, manifest):
+        self._manifest = manifest
+
+    def __enter__(self):
+        manifest = self._manifest
+        if manifest._lock_pid != os.getpid():
+            # In a forked child - the lock belongs to whichever thread of the parent held it
+            manifest._thread_lock = threading.RLock()
+            manifest._lock_fd = None
+            manifest._lock_depth = 0
+            manifest._lock_pid = os.getpid()
+        manifest._thread_lock.acquire()
+        try:
+            if manifest._lock_depth == 0 and fcntl is not None:
+                path = manifest.path + '.lock'
+                try:
+                    fd = os.open(path, os.O_RDWR | os.O_CREAT | O_NOFOLLOW, 0o600)
+                except (IOError, OSError) as e:
+                    if e.errno == errno.ELOOP:
+                        raise _refuse(path)
+                    raise
+                try:
+                    if not is_private(fd):
+                        raise _refuse(path)
+                    fcntl.flock(fd, fcntl.LOCK_EX)
+                except BaseException:
+                    os.close(fd)
+                    raise
+                manifest._lock_fd = fd
+        except BaseException:
+            manifest._thread_lock.release()
+            raise
+        manifest._lock_depth += 1
+        return manifest
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        manifest = self._manifest
+        try:
+            manifest._lock_depth -= 1
+            if manifest._lock_depth == 0 and manifest._lock_fd is not None:
+                fd, manifest._lock_fd = manifest._lock_fd, None
+                try:
+                    fcntl.flock(fd, fcntl.LOCK_UN)
+                finally:
+                    os.close(fd)
+        finally:
+            manifest._thread_lock.release()
+        return False
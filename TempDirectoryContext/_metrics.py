@@ -0,0 +1,162 @@
+#!/usr/bin/env python
+"""
+TempDirectoryContext._metrics : Counters, latency histograms and events
+
+Summary :
+    Optional instrumentation of the context managers - counters for each (root, suffix, prefix) key,
+    a latency histogram for each phase (scan, create, seed and evict) and a stream of events which can
+    be forwarded to another metrics system. Disabled by default; when disabled, the only cost is a
+    single attribute check in each phase.
+
+Use Case :
+    As the operator of a service I want to see how much time is spent scanning, creating and deleting
+    directories, and how many deletes fail, so that I can tune retention and find problems
+"""
+
+import collections
+import logging
+import math
+import threading
+
+__author__ = 'Tony Flury : anthony.flury@btinternet.com'
+__created__ = '16 Oct 2026'
+
+logger = logging.getLogger('TempDirectoryContext')
+
+PHASES = ('scan', 'create', 'seed', 'evict')
+
+# An event for each phase, and for each failed delete (phase 'delete_failed')
+MetricsEvent = collections.namedtuple('MetricsEvent', 'phase key path duration size error')
+
+
+class Histogram(object):
+    """Latency histogram with power of two buckets, from one microsecond"""
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self._buckets = collections.Counter()
+
+    def add(self, duration):
+        """Record a duration (in seconds)"""
+        self.count += 1
+        self.total += duration
+        self.max = max(self.max, duration)
+        # Bucket n holds durations below 2**n microseconds
+        self._buckets[max(math.frexp(duration * 1e6)[1], 0)] += 1
+
+    def buckets(self):
+        """The non empty buckets - a list of (upper bound in seconds, count), shortest first"""
+        return [(2.0 ** exponent / 1e6, self._buckets[exponent]) for exponent in sorted(self._buckets)]
+
+    def percentile(self, percent):
+        """The upper bound (in seconds) of the bucket holding the given percentile - None if nothing is recorded"""
+        if not self.count:
+            return None
+        target = self.count * percent / 100.0
+        seen = 0
+        for bound, count in self.buckets():
+            seen += count
+            if seen >= target:
+                return bound
+        return self.max
+
+    def copy(self):
+        histogram = Histogram()
+        histogram.count, histogram.total, histogram.max = self.count, self.total, self.max
+        histogram._buckets = self._buckets.copy()
+        return histogram
+
+
+class Metrics(object):
+    """Instrumentation shared by all the context managers in the process"""
+
+    # Checked (without a lock) at the start of every phase
+    enabled = False
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._listeners = []
+        self.measure = False
+        self.reset()
+
+    def enable(self, measure=False):
+        """Start recording
+
+        :param measure: Whether historic trees are measured before they are evicted, so that bytes_reclaimed
+                        counts every tree - otherwise only trees already measured (e.g. for max_total_bytes)
+                        are counted. Measuring walks the whole tree.
+        """
+        self.measure = measure
+        self.enabled = True
+
+    def disable(self):
+        """Stop recording - the counters and histograms are kept"""
+        self.enabled = False
+
+    def reset(self):
+        """Clear the counters and histograms"""
+        with self._lock:
+            self._counters = {}
+            self._histograms = dict((phase, Histogram()) for phase in PHASES)
+
+    def subscribe(self, callback):
+        """Call callback(event) with a MetricsEvent for every phase and failed delete, while enabled
+
+        Callbacks are called on the thread doing the work - so they should return quickly.
+        """
+        with self._lock:
+            self._listeners = self._listeners + [callback]
+
+    def unsubscribe(self, callback):
+        """Stop calling a callback added by subscribe"""
+        with self._lock:
+            self._listeners = [listener for listener in self._listeners if listener != callback]
+
+    def counters(self, key=None):
+        """The counters - created, evicted, failed_deletes and bytes_reclaimed
+
+        :param key: The (root, suffix, prefix) key - None returns a dictionary of the counters for every key
+        """
+        with self._lock:
+            if key is not None:
+                return dict(self._counters.get(key, _new_counters()))
+            return dict((key, dict(counters)) for key, counters in self._counters.items())
+
+    def histogram(self, phase):
+        """A copy of the latency Histogram for a phase - 'scan', 'create', 'seed' or 'evict'"""
+        with self._lock:
+            return self._histograms[phase].copy()
+
+    def record(self, phase, key, path=None, duration=None, size=None, error=None):
+        """Record a phase (or a failed delete) - called by the context managers while enabled"""
+        with self._lock:
+            counters = self._counters.get(key)
+            if counters is None:
+                counters = self._counters[key] = _new_counters()
+            if phase == 'create':
+                counters['created'] += 1
+            elif phase == 'evict':
+                counters['evicted'] += 1
+                counters['bytes_reclaimed'] += size or 0
+            elif phase == 'delete_failed':
+                counters['failed_deletes'] += 1
+            if duration is not None:
+                self._histograms[phase].add(duration)
+            listeners = self._listeners
+
+        if listeners:
+            event = MetricsEvent(phase, key, path, duration, size, error)
+            for listener in listeners:
+                try:
+                    listener(event)
+                except Exception:
+                    logger.exception('TempDirectoryContext metrics callback failed')
+
+
+def _new_counters():
+    return {'created': 0, 'evicted': 0, 'failed_deletes': 0, 'bytes_reclaimed': 0}
+
+
+metrics = Metrics()
@@ -0,0 +1,195 @@
+#!/usr/bin/env python
+"""
+TempDirectoryContext._owner : Owner stamps for directories in use, and reaping of orphans
+
+Summary :
+    While a directory is in use it is stamped with its owner - process id, process start time and
+    host name - in a hidden owners directory in the root. A directory whose stamp names a process
+    which has died was orphaned (its process crashed inside the context manager) and can be reclaimed
+    at once; a directory whose owner is still alive is never evicted, by any process.
+
+Use Case :
+    As a set of processes sharing a root we want crashed processes' directories reclaimed promptly
+    and live processes' directories left alone so that keep_max is safe to share
+
+Stamp format :
+    One file per directory in use, named after the directory :
+        <pid> <start time> <host name>
+    The start time is the process start time from /proc/<pid>/stat (in clock ticks since boot) - or -
+    where it isn't available; it tells a live owner from an unrelated process which reused its pid.
+
+    The owners directory must be private - a real directory, owned by this user, with no access for
+    group or others; stamps in any other owners directory are never trusted.
+"""
+
+import errno
+import os
+import os.path
+import socket
+import stat
+
+from ._reclaim import HIDDEN_PREFIX, remove_tree, report_failure
+
+__author__ = 'Tony Flury : anthony.flury@btinternet.com'
+__created__ = '16 Oct 2026'
+
+# Hidden directory (one per root) holding a stamp for every directory in use
+OWNERS_NAME = HIDDEN_PREFIX + '-owners'
+
+_identity = {}
+
+
+def owners_path(root):
+    """The owners directory for a given root"""
+    return os.path.join(root, OWNERS_NAME)
+
+
+def stamp_path(path):
+    """The owner stamp for a directory"""
+    root, name = os.path.split(path)
+    return os.path.join(owners_path(root), name)
+
+
+def process_start_time(pid):
+    """The start time of a process (clock ticks since boot) - None if it can't be found"""
+    try:
+        with open('/proc/{}/stat'.format(pid), 'rb') as fd:
+            data = fd.read()
+    except (IOError, OSError):
+        return None
+    # The command name (field 2) is in parentheses, and may itself contain spaces or parentheses
+    fields = data[data.rindex(b')') + 2:].split()
+    try:
+        return int(fields[19])
+    except (IndexError, ValueError):
+        return None
+
+
+def identity():
+    """This process's (pid, start time, host name)"""
+    pid = os.getpid()
+    if pid not in _identity:
+        _identity.clear()
+        _identity[pid] = (pid, process_start_time(pid), socket.gethostname())
+    return _identity[pid]
+
+
+def is_private(owners):
+    """Whether an owners directory is a real directory, owned by this user, with no access for group or others"""
+    try:
+        st = os.lstat(owners)
+    except (IOError, OSError) as e:
+        if e.errno != errno.ENOENT:
+            raise
+        return False
+    geteuid = getattr(os, 'geteuid', None)
+    if geteuid is not None and st.st_uid != geteuid():
+        return False
+    return stat.S_ISDIR(st.st_mode) and not st.st_mode & 0o077
+
+
+def stamp(path):
+    """Record this process as the owner of a directory"""
+    owners = owners_path(os.path.dirname(path))
+    try:
+        os.mkdir(owners, 0o700)
+    except (IOError, OSError) as e:
+        if e.errno != errno.EEXIST:
+            raise
+        if not is_private(owners):
+            raise OSError(errno.EPERM, 'owners directory is not private to this user', owners)
+    pid, start, host = identity()
+    # Written under a hidden name and renamed into place, so a stamp is never read half written
+    target = stamp_path(path)
+    partial = os.path.join(owners, '{}-{}'.format(HIDDEN_PREFIX, os.path.basename(path)))
+    with open(partial, 'w') as fd:
+        fd.write('{} {} {}\n'.format(pid, '-' if start is None else start, host))
+    os.rename(partial, target)
+
+
+def unstamp(path):
+    """Remove the owner stamp from a directory which is no longer in use"""
+    try:
+        os.unlink(stamp_path(path))
+    except (IOError, OSError) as e:
+        if e.errno != errno.ENOENT:
+            raise
+
+
+def read_stamp(stamp_file):
+    """The (pid, start time, host name) in a stamp - None if there is no (readable) stamp"""
+    try:
+        with open(stamp_file) as fd:
+            pid, start, host = fd.read().split(None, 2)
+        return int(pid), None if start == '-' else int(start), host.strip()
+    except (IOError, OSError, ValueError):
+        return None
+
+
+def owner_alive(owner):
+    """Whether the owner in a stamp is still running
+
+    An owner on another host can't be checked, so it is always treated as alive.
+    """
+    pid, start, host = owner
+    if host != socket.gethostname():
+        return True
+    try:
+        os.kill(pid, 0)
+    except (IOError, OSError) as e:
+        if e.errno == errno.ESRCH:
+            return False
+        # EPERM - the process exists, but belongs to someone else
+    if start is not None:
+        current = process_start_time(pid)
+        if current is not None and current != start:
+            # The pid has been reused by another process
+            return False
+    return True
+
+
+def has_live_owner(path):
+    """Whether a directory is stamped as in use by a process which is still running"""
+    owner = read_stamp(stamp_path(path))
+    return owner is not None and owner_alive(owner)
+
+
+def reap(root, prefix, suffix, on_error=None):
+    """Reclaim the directories in a root whose owners have died - their stamps are removed too
+
+    Only the owners directory is read, so the cost depends on the number of directories in use, not the
+    size of the root. Only directories named with the prefix and suffix are reclaimed, and nothing is
+    reclaimed unless the owners directory is private.
+
+    :param root: The root directory
+    :param prefix: The prefix of the directories to reclaim
+    :param suffix: The suffix of the directories to reclaim
+    :param on_error: Callable invoked as on_error(path, exc) for each directory which can't be deleted
+    :return: The paths of the directories reclaimed
+    """
+    owners = owners_path(root)
+    if not is_private(owners):
+        return []
+    try:
+        names = os.listdir(owners)
+    except (IOError, OSError) as e:
+        if e.errno != errno.ENOENT:
+            raise
+        return []
+
+    reaped = []
+    for name in names:
+        if name.startswith(HIDDEN_PREFIX) or not (name.startswith(prefix) and name.endswith(suffix)):
+            continue
+        owner = read_stamp(os.path.join(owners, name))
+        if owner is None or owner_alive(owner):
+            continue
+        path = os.path.join(root, name)
+        try:
+            remove_tree(path)
+        except (IOError, OSError) as e:
+            report_failure(path, e, on_error)
+            continue
+        unstamp(path)
+        reaped.append(path)
+    return reaped
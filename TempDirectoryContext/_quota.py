@@ -0,0 +1,123 @@
+#!/usr/bin/env python
+"""
+TempDirectoryContext._quota : Disk quotas for directories in use
+
+Summary :
+    The disk space used by a directory with a quota is sampled - by a scandir walk, at most once per
+    interval however often it is asked for - both by its owner and by a single background thread which
+    watches every such directory in the process. A directory which grows beyond its quota is reported
+    to a callback (or logged) as soon as it is seen, and a hard quota raises QuotaExceeded in the owner.
+
+Use Case :
+    As one of many jobs sharing a temporary file system I want a misbehaving job stopped at its quota so
+    that it can't fill the file system and take the other jobs down with it
+"""
+
+import errno
+import logging
+import threading
+import time
+
+from ._retention import tree_size
+
+__author__ = 'Tony Flury : anthony.flury@btinternet.com'
+__created__ = '16 Oct 2026'
+
+logger = logging.getLogger('TempDirectoryContext')
+
+QUOTAS = ("soft", "hard")
+
+# The background thread never samples more often than this - however short the intervals asked for
+MIN_WATCH_INTERVAL = 0.01
+
+
+class QuotaExceeded(OSError):
+    """A directory has grown beyond its hard quota"""
+
+    def __init__(self, path, usage, limit):
+        super(QuotaExceeded, self).__init__(
+            errno.EDQUOT, 'Disk quota exceeded ({} bytes used, limit {} bytes)'.format(usage, limit), path)
+        self.usage = usage
+        self.limit = limit
+
+
+class Usage(object):
+    """Rate limited measurement of the disk space used by a directory"""
+
+    def __init__(self, path, interval):
+        """Rate limited measurement of the disk space used by a directory
+
+        :param path: The directory
+        :param interval: The minimum number of seconds between walks of the tree
+        """
+        self.path = path
+        self.interval = interval
+        self.bytes = 0
+        self.sampled = None
+        self.breached = False
+        self.active = True
+        # Held while sampling and updating breached - the owner and the watcher thread both check
+        self.lock = threading.Lock()
+
+    def sample(self, force=False):
+        """The disk space used by the directory - walked again only if the last walk is more than interval old"""
+        now = time.monotonic()
+        if force or self.sampled is None or now - self.sampled >= self.interval:
+            self.bytes = tree_size(self.path)
+            self.sampled = now
+        return self.bytes
+
+
+class QuotaWatcher(object):
+    """Background thread which samples every directory with a quota - running only while there are any"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._watched = {}
+        self._thread = None
+
+    def watch(self, usage, check):
+        """Sample a directory periodically
+
+        :param usage: The directory's Usage - sampled no more often than its interval
+        :param check: Callable invoked as check(usage) on each sample
+        """
+        with self._lock:
+            self._watched[usage.path] = (usage, check)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='TempDirectoryContext-quota')
+                self._thread.daemon = True
+                self._thread.start()
+
+    def unwatch(self, usage):
+        """Stop sampling a directory"""
+        with self._lock:
+            usage.active = False
+            if self._watched.get(usage.path, (None,))[0] is usage:
+                del self._watched[usage.path]
+
+    def _run(self):
+        """Watcher thread - sample every directory each interval, exiting once there are none left"""
+        while True:
+            with self._lock:
+                if not self._watched:
+                    self._thread = None
+                    return
+                interval = max(min(usage.interval for usage, check in self._watched.values()), MIN_WATCH_INTERVAL)
+            time.sleep(interval)
+
+            with self._lock:
+                watched = list(self._watched.values())
+            for usage, check in watched:
+                if not usage.active:
+                    continue
+                try:
+                    check(usage)
+                except Exception:
+                    logger.exception('TempDirectoryContext quota check failed for %s', usage.path)
+
+    def _after_fork(self):
+        """In a forked child - the directories belong to the parent, and the thread didn't survive the fork"""
+        self._lock = threading.Lock()
+        self._watched = {}
+        self._thread = None
@@ -0,0 +1,320 @@
+#!/usr/bin/env python
+"""
+TempDirectoryContext._reclaim : Deletion of evicted directories
+
+Summary :
+    Deletion helpers used by the context manager when historic directories are evicted, including a
+    bounded pool of background threads so that a context manager exit never has to wait for a
+    recursive delete of a large tree.
+
+Use Case :
+    As an application I want the context manager exit to return promptly so that large historic
+    trees do not slow down my own code
+"""
+
+import atexit
+import errno
+import itertools
+import logging
+import os
+import shutil
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+
+__author__ = 'Tony Flury : anthony.flury@btinternet.com'
+__created__ = '16 Oct 2026'
+
+logger = logging.getLogger('TempDirectoryContext')
+
+# Directories and files used internally in a root all start with this - they are never historic directories
+HIDDEN_PREFIX = '.TempDirCont'
+
+# Hidden directory (one per root) into which evicted directories are renamed before being purged
+TRASH_NAME = HIDDEN_PREFIX + '-trash'
+
+_trash_counter = itertools.count()
+
+
+def remove_tree(path, rmtree=None):
+    """Delete a directory tree - a tree which has already gone is not an error
+
+    A file (e.g. an archived historic directory) is simply removed.
+
+    :param path: The directory to delete
+    :param rmtree: The function which deletes the tree - defaults to shutil.rmtree
+    """
+    try:
+        (rmtree or shutil.rmtree)(path)
+    except (IOError, OSError) as e:
+        if e.errno == errno.ENOTDIR:
+            return remove_tree(path, rmtree=_unlink)
+        if e.errno != errno.ENOENT:
+            raise
+
+
+def _unlink(path):
+    os.unlink(path)
+
+
+def report_failure(path, exc, on_error=None):
+    """Report a failed delete - to the on_error callback if one is given, otherwise to the log
+
+    :param path: The directory which could not be deleted
+    :param exc: The exception raised by the delete
+    :param on_error: Callable which is invoked as on_error(path, exc)
+    """
+    if on_error is None:
+        logger.warning('Unable to delete %s : %s', path, exc)
+        return
+
+    # A broken callback must never break the deletion loop (or kill a worker thread)
+    try:
+        on_error(path, exc)
+    except Exception:
+        logger.exception('on_error callback failed for %s', path)
+
+
+def trash_path(root):
+    """The trash directory for a given root"""
+    return os.path.join(root, TRASH_NAME)
+
+
+def move_to_trash(path, root):
+    """Rename a directory into the trash area of its root - a single rename regardless of the tree size
+
+    :param path: The directory to move
+    :param root: The root directory which contains the path (and the trash area)
+    :return: The path the directory was moved to - an entry in the trash directory
+    """
+    trash = trash_path(root)
+    try:
+        os.mkdir(trash, 0o700)
+    except (IOError, OSError) as e:
+        if e.errno != errno.EEXIST:
+            raise
+
+    # The name of an evicted directory could be re-used by mkdtemp before the trash is purged
+    target = os.path.join(trash, '{}.{}.{}'.format(os.path.basename(path), os.getpid(), next(_trash_counter)))
+    os.rename(path, target)
+    return target
+
+
+def purge_trash(trash, batch=None, on_error=None, skip=None, on_deleted=None):
+    """Delete entries from a trash directory
+
+    :param trash: The trash directory to purge
+    :param batch: The maximum number of entries to delete - None deletes everything
+    :param on_error: Callable invoked as on_error(path, exc) for each entry which cannot be deleted
+    :param skip: A set of entries to be ignored - entries which fail are added to it
+    :param on_deleted: Callable invoked as on_deleted(path) for each entry which has been deleted
+    :return: The number of entries processed (including failures)
+    """
+    try:
+        names = os.listdir(trash)
+    except (IOError, OSError) as e:
+        if e.errno != errno.ENOENT:
+            report_failure(trash, e, on_error)
+        return 0
+
+    skip = set() if skip is None else skip
+    names = [name for name in names if name not in skip]
+    if batch is not None:
+        names = names[:batch]
+
+    for name in names:
+        try:
+            remove_tree(os.path.join(trash, name))
+        except (IOError, OSError) as e:
+            skip.add(name)
+            report_failure(os.path.join(trash, name), e, on_error)
+            continue
+        if on_deleted is not None:
+            on_deleted(os.path.join(trash, name))
+    return len(names)
+
+
+class Reclaimer(object):
+    """Bounded pool of background threads which deletes evicted directories"""
+
+    def __init__(self, max_workers=2, max_pending=64):
+        """Bounded pool of background threads which deletes evicted directories
+
+        :param max_workers: The number of threads deleting directories concurrently
+        :param max_pending: The maximum number of directories waiting to be deleted; once this is
+                            reached submit() blocks until a worker has caught up.
+
+        :type max_workers: int
+        :type max_pending: int
+        """
+        self._max_workers = max_workers
+        self._max_pending = max_pending
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._lock = threading.Lock()
+        self._executor = None
+        self._pending = set()
+        self._failures = []
+        self._purge_requests = {}
+        self._purge_waiters = {}
+
+    @property
+    def pending(self):
+        """The number of directories still waiting to be deleted"""
+        with self._lock:
+            return len(self._pending)
+
+    def submit(self, path, on_error=None, rmtree=None, on_done=None):
+        """Queue a directory for deletion - returns a Future which completes when the delete is done
+
+        :param path: The directory to delete
+        :param on_error: Callable invoked as on_error(path, exc) from the worker if the delete fails
+        :param rmtree: The function which deletes the tree - defaults to shutil.rmtree
+        :param on_done: Callable invoked (with no arguments) from the worker once the directory has been deleted
+        """
+        self._slots.acquire()
+        future = self._submit(self._delete, path, on_error, rmtree, on_done)
+        future.add_done_callback(self._release)
+        return future
+
+    def _submit(self, fn, *args):
+        """Hand a task to the worker threads, tracking it until it completes"""
+        with self._lock:
+            # Threads are only started once background deletion is actually used
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self._max_workers)
+            future = self._executor.submit(fn, *args)
+            self._pending.add(future)
+        future.add_done_callback(self._done)
+        return future
+
+    def _delete(self, path, on_error, rmtree, on_done):
+        """Worker - delete a single tree and record any failure"""
+        try:
+            remove_tree(path, rmtree=rmtree)
+        except Exception as e:
+            with self._lock:
+                self._failures.append((path, e))
+            report_failure(path, e, on_error)
+            return
+        if on_done is not None:
+            on_done()
+
+    def schedule(self, fn, *args):
+        """Run a task on the worker threads - flush() waits for it as it does for deletes
+
+        The task must handle (report) its own failures.
+        """
+        return self._submit(fn, *args)
+
+    def _done(self, future):
+        """Future callback - stop tracking a completed task"""
+        with self._lock:
+            self._pending.discard(future)
+
+    def _release(self, future):
+        """Future callback - release the slot used by a completed delete"""
+        self._slots.release()
+
+    def schedule_purge(self, trash, batch=16, on_error=None, entry=None, on_done=None):
+        """Request a background purge of a trash directory
+
+        Requests for a trash directory which is already being purged are merged into the running purge.
+
+        :param trash: The trash directory to purge
+        :param batch: The number of entries deleted before the purge gives way to other queued deletes
+        :param on_error: Callable invoked as on_error(path, exc) for each entry which cannot be deleted - for entry
+                         alone, if an entry is given
+        :param entry: The entry in the trash (as returned by move_to_trash) this request is for
+        :param on_done: Callable invoked (with no arguments) from the worker once entry has been deleted
+        """
+        with self._lock:
+            if entry is not None:
+                # The purge may already be running, for another request - so entry's callbacks are kept apart
+                self._purge_waiters[entry] = (on_error, on_done)
+            running = trash in self._purge_requests
+            self._purge_requests[trash] = True
+        if not running:
+            self._submit(self._purge, trash, batch, on_error, set())
+
+    def _purge(self, trash, batch, on_error, skip):
+        """Worker - purge a trash directory a batch at a time, only while there is nothing else to delete"""
+        def record(path, exc):
+            with self._lock:
+                self._failures.append((path, exc))
+                entry_error, on_done = self._purge_waiters.pop(path, (on_error, None))
+            report_failure(path, exc, entry_error)
+
+        def deleted(path):
+            with self._lock:
+                entry_error, on_done = self._purge_waiters.pop(path, (on_error, None))
+            if on_done is not None:
+                on_done()
+
+        while True:
+            with self._lock:
+                self._purge_requests[trash] = False
+
+            processed = purge_trash(trash, batch, record, skip, deleted)
+
+            with self._lock:
+                if processed < batch and not self._purge_requests[trash]:
+                    del self._purge_requests[trash]
+                    return
+                busy = len(self._pending) > 1
+
+            # Other deletes are waiting - go to the back of the queue
+            if busy:
+                try:
+                    self._submit(self._purge, trash, batch, on_error, skip)
+                    return
+                except RuntimeError:
+                    # The interpreter is shutting down - no new tasks, so finish the purge here
+                    pass
+
+    def flush(self, timeout=None):
+        """Wait for all queued deletes to complete
+
+        :param timeout: The maximum number of seconds to wait - None waits until the queue is empty
+        :return: A list of (path, exception) tuples for every delete that failed since the last flush
+        """
+        deadline = None if timeout is None else time.time() + timeout
+        while True:
+            with self._lock:
+                pending = list(self._pending)
+            if not pending:
+                break
+            remaining = None if deadline is None else deadline - time.time()
+            if remaining is not None and remaining <= 0:
+                break
+            wait(pending, timeout=remaining)
+
+        with self._lock:
+            failures, self._failures = self._failures, []
+        return failures
+
+    def shutdown(self):
+        """Drain the queue and stop the worker threads"""
+        self.flush()
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True)
+
+    def _after_fork(self):
+        """In a forked child - the worker threads didn't survive the fork, so start again with none"""
+        self._slots = threading.BoundedSemaphore(self._max_pending)
+        self._lock = threading.Lock()
+        self._executor = None
+        self._pending = set()
+        self._failures = []
+        self._purge_requests = {}
+        self._purge_waiters = {}
+
+
+reclaimer = Reclaimer()
+
+# Don't leave directories half deleted when the interpreter exits
+atexit.register(reclaimer.shutdown)
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=reclaimer._after_fork)
@@ -0,0 +1,95 @@
+#!/usr/bin/env python
+"""
+TempDirectoryContext._recycle : Scrubbing directories so that they can be reused
+
+Summary :
+    Empties a directory, keeping an optional skeleton of (empty) sub-directories, and checks that a
+    directory is in that state before it is reused.
+
+Use Case :
+    As an application which repeatedly creates similar trees I want to reuse my temporary directories
+    so that I don't pay for deleting and recreating them each time
+"""
+
+import os
+import os.path
+import stat
+
+from ._reclaim import remove_tree
+
+__author__ = 'Tony Flury : anthony.flury@btinternet.com'
+__created__ = '16 Oct 2026'
+
+
+def normalise_skeleton(skeleton):
+    """Normalise the skeleton sub-directories into a set of relative paths, including all of their parents
+
+    :param skeleton: An iterable of relative directory paths, e.g. ['src', 'build/obj']
+    :return: A frozenset of normalised relative paths, e.g. {'src', 'build', 'build/obj'}
+    """
+    paths = set()
+    for path in skeleton:
+        path = os.path.normpath(path)
+        if os.path.isabs(path) or path == os.curdir or path.split(os.sep)[0] == os.pardir:
+            raise ValueError('skeleton paths must be relative paths within the directory : {!r}'.format(path))
+        while path:
+            paths.add(path)
+            path = os.path.dirname(path)
+    return frozenset(paths)
+
+
+def scrub(path, skeleton):
+    """Empty a directory, leaving only its (empty) skeleton sub-directories
+
+    :param path: The directory to scrub
+    :param skeleton: The normalised skeleton - see normalise_skeleton
+    """
+    _scrub(path, '', skeleton)
+    for relative in sorted(skeleton):
+        target = os.path.join(path, relative)
+        if not os.path.isdir(target):
+            os.mkdir(target, 0o700)
+
+
+def _scrub(path, relative, skeleton):
+    """Remove everything in path which isn't part of the skeleton"""
+    with os.scandir(path) as entries:
+        for entry in entries:
+            name = os.path.join(relative, entry.name) if relative else entry.name
+            if entry.is_dir(follow_symlinks=False):
+                if name in skeleton:
+                    _scrub(entry.path, name, skeleton)
+                else:
+                    remove_tree(entry.path)
+            else:
+                os.unlink(entry.path)
+
+
+def is_pristine(path, skeleton):
+    """Check that a directory is empty apart from its skeleton sub-directories (which must all be empty too)
+
+    :param path: The directory to check
+    :param skeleton: The normalised skeleton - see normalise_skeleton
+    """
+    try:
+        if not stat.S_ISDIR(os.lstat(path).st_mode):
+            return False
+        found = set()
+        if not _collect(path, '', found):
+            return False
+    except OSError:
+        return False
+    return found == skeleton
+
+
+def _collect(path, relative, found):
+    """Collect the relative paths of the directories under path - False if there is anything else"""
+    with os.scandir(path) as entries:
+        for entry in entries:
+            if not entry.is_dir(follow_symlinks=False):
+                return False
+            name = os.path.join(relative, entry.name) if relative else entry.name
+            found.add(name)
+            if not _collect(entry.path, name, found):
+                return False
+    return True
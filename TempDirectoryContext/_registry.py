@@ -0,0 +1,179 @@
+#!/usr/bin/env python
+"""
+TempDirectoryContext._registry : Process wide registry of delete queues
+
+Summary :
+    The delete queues for every (root, suffix, prefix) key in this process, safe to use from many
+    threads at once. Keys are spread across a fixed set of locks (lock striping), so context managers
+    for unrelated keys never wait for each other.
+
+Use Case :
+    As a multi-threaded application I want to use many context managers concurrently so that my
+    threads never lose, double count or wrongly delete a directory
+"""
+
+import threading
+from collections import deque
+
+from ._retention import RetainedDirectory
+
+__author__ = 'Tony Flury : anthony.flury@btinternet.com'
+__created__ = '16 Oct 2026'
+
+
+class Registry(object):
+    """Thread safe registry of delete queues, one per (root, suffix, prefix) key"""
+
+    def __init__(self, stripes=16):
+        """Thread safe registry of delete queues, one per (root, suffix, prefix) key
+
+        :param stripes: The number of locks shared between the keys
+
+        :type stripes: int
+        """
+        self._locks = [threading.RLock() for i in range(stripes)]
+        self._queues = {}
+        self._bins = {}
+        self._active = {}
+        self._loaded = set()
+        self._loading = {}
+        self._entries = {}
+        self._owners = {}
+        self._once = set()
+
+    def lock(self, key):
+        """The lock which guards the delete queue for a key - hold it while reading or changing the queue"""
+        return self._locks[hash(key) % len(self._locks)]
+
+    def queue(self, key, loader=None):
+        """The delete queue for a key - a deque of directory paths, oldest first
+
+        :param key: The (root, suffix, prefix) key
+        :param loader: Callable returning the historic directories (oldest first) - called once for each key to fill
+                       the queue. Threads racing to fill the same queue wait for the first, rather than scanning
+                       again. Directories already queued, or currently in use in this process, are never added to
+                       the queue.
+
+        The loader is called without the key's lock held - it may take other locks (the manifest lock) which are held
+        by threads waiting for this key's lock, and a scan mustn't hold up the other keys sharing the lock.
+        """
+        while True:
+            with self.lock(key):
+                queue = self._queues.setdefault(key, deque())
+                if loader is None or key in self._loaded:
+                    return queue
+                loading = self._loading.get(key)
+                if loading is None:
+                    # This thread fills the queue
+                    loading = self._loading[key] = threading.Event()
+                    break
+            # Another thread is filling the queue - if its loader fails, try again
+            loading.wait()
+
+        try:
+            historic = loader()
+            with self.lock(key):
+                queue = self._queues.setdefault(key, deque())
+                known = set(queue) | self._active.get(key, set())
+                # Anything already queued was released by this process (by a context manager which doesn't delete
+                # historic directories) - newer than the historic directories, so they go in front of it
+                queue.extendleft(reversed([path for path in historic if path not in known]))
+                self._loaded.add(key)
+        finally:
+            with self.lock(key):
+                self._loading.pop(key, None)
+            loading.set()
+        return queue
+
+    def recycle_bin(self, key):
+        """The recycled directories for a key - a deque of scrubbed directory paths, ready for reuse
+
+        Hold the key's lock while reading or changing the bin.
+        """
+        with self.lock(key):
+            return self._bins.setdefault(key, deque())
+
+    def entry(self, key, path):
+        """The retention bookkeeping (a RetainedDirectory) for a directory - created when first needed"""
+        with self.lock(key):
+            entries = self._entries.setdefault(key, {})
+            entry = entries.get(path)
+            if entry is None:
+                entry = entries[path] = RetainedDirectory(path)
+            return entry
+
+    def forget(self, key, path):
+        """Drop (and return) the retention bookkeeping for an evicted directory - None if there isn't any"""
+        with self.lock(key):
+            return self._entries.get(key, {}).pop(path, None)
+
+    def register(self, key, owner):
+        """Record the context manager whose settings are used to expire the key's directories in the background
+
+        The owner is kept for the life of the process - a copy holding the settings alone (see
+        TempDirectoryContext._settings), not a context manager in use.
+        """
+        with self.lock(key):
+            self._owners[key] = owner
+
+    def owner(self, key):
+        """The context manager registered for a key - None if there isn't one"""
+        with self.lock(key):
+            return self._owners.get(key)
+
+    def rename(self, key, path, new_path):
+        """Replace a directory in the delete queue (e.g. by its archive), keeping its place and retention bookkeeping
+
+        :return: False if the directory is no longer in the queue
+        """
+        with self.lock(key):
+            queue = self._queues.get(key, ())
+            try:
+                index = queue.index(path)
+            except ValueError:
+                return False
+            queue[index] = new_path
+            entries = self._entries.get(key, {})
+            entry = entries.pop(path, None)
+            if entry is not None:
+                entry.path = new_path
+                entry.size = None
+                entries[new_path] = entry
+            return True
+
+    def once(self, token):
+        """True the first time it is called for a token (in this process), False after that"""
+        with self.lock(token):
+            if token in self._once:
+                return False
+            self._once.add(token)
+            return True
+
+    def activate(self, key, path):
+        """Record that a directory is in use by a context manager"""
+        with self.lock(key):
+            self._active.setdefault(key, set()).add(path)
+
+    def deactivate(self, key, path):
+        """Record that a directory is no longer in use by a context manager"""
+        with self.lock(key):
+            self._active.get(key, set()).discard(path)
+
+    def keys(self):
+        """The keys which currently have a delete queue"""
+        return list(self._queues)
+
+    def discard(self, key):
+        """Forget the delete queue for a key - the next context manager for the key rebuilds it"""
+        with self.lock(key):
+            self._queues.pop(key, None)
+            self._bins.pop(key, None)
+            self._entries.pop(key, None)
+            self._owners.pop(key, None)
+            self._loaded.discard(key)
+
+    def _after_fork(self):
+        """In a forked child - locks held by threads in the parent would never be released"""
+        self._locks = [threading.RLock() for lock in self._locks]
+        # A queue being filled by a thread in the parent never will be
+        self._loading = {}
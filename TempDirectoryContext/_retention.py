@@ -0,0 +1,182 @@
+#!/usr/bin/env python
+"""
+TempDirectoryContext._retention : Retention policies for historic directories
+
+Summary :
+    Policies which decide which historic directories are evicted - by count (keep_max), by the total
+    size of the retained trees, and by age - together with the bookkeeping for each retained
+    directory, so that the size of a tree is only measured once.
+
+Use Case :
+    As an application which leaves trees of very different sizes behind I want to limit the disk space
+    and the time my historic directories are kept for, so that a few large trees can't fill the disk
+"""
+
+import os
+import stat
+import time
+
+__author__ = 'Tony Flury : anthony.flury@btinternet.com'
+__created__ = '16 Oct 2026'
+
+
+def tree_size(path):
+    """The disk space used by a tree (or a single file), in bytes - symbolic links are not followed"""
+    try:
+        info = os.lstat(path)
+    except OSError:
+        return 0
+    if not stat.S_ISDIR(info.st_mode):
+        return getattr(info, 'st_blocks', 0) * 512 or info.st_size
+
+    total = 0
+    stack = [path]
+    while stack:
+        try:
+            with os.scandir(stack.pop()) as entries:
+                for entry in entries:
+                    try:
+                        info = entry.stat(follow_symlinks=False)
+                    except OSError:
+                        continue
+                    total += getattr(info, 'st_blocks', 0) * 512 or info.st_size
+                    if stat.S_ISDIR(info.st_mode):
+                        stack.append(entry.path)
+        except OSError:
+            continue
+    return total
+
+
+class RetainedDirectory(object):
+    """Bookkeeping for a directory in a delete queue"""
+
+    def __init__(self, path, released=None):
+        """Bookkeeping for a directory in a delete queue
+
+        :param path: The directory
+        :param released: When the directory was released by its context manager (time.time()), if known
+        """
+        self.path = path
+        self.released = released
+        self._size = None
+        self._created = None
+
+    @property
+    def size(self):
+        """The disk space used by the tree - measured the first time it is needed, and then remembered"""
+        if self._size is None:
+            self._size = tree_size(self.path)
+        return self._size
+
+    @size.setter
+    def size(self, value):
+        self._size = value
+
+    @property
+    def known_size(self):
+        """The disk space used by the tree if it has already been measured - otherwise None"""
+        return self._size
+
+    def measure(self):
+        """Measure the disk space used by the tree now"""
+        self._size = tree_size(self.path)
+        return self._size
+
+    @property
+    def retained_since(self):
+        """When the directory became historic - released time if known, otherwise its modification time"""
+        if self.released is not None:
+            return self.released
+        if self._created is None:
+            try:
+                self._created = os.lstat(self.path).st_mtime
+            except OSError:
+                self._created = 0.0
+        return self._created
+
+    @property
+    def last_access(self):
+        """When the directory was last used - its access or modification time, whichever is later"""
+        try:
+            info = os.lstat(self.path)
+        except OSError:
+            return 0.0
+        return max(info.st_atime, info.st_mtime)
+
+
+class RetentionPolicy(object):
+    """Base class for retention policies
+
+    A policy is given the retained directories (RetainedDirectory instances), least valuable first,
+    and returns those which must be evicted.
+    """
+
+    # Whether the policy needs the size of each retained tree
+    needs_size = False
+
+    def victims(self, entries, now):
+        """The entries to evict
+
+        :param entries: The retained directories, least valuable (first to be evicted) first
+        :param now: The current time (time.time())
+        :return: An iterable of the entries to evict
+        """
+        raise NotImplementedError
+
+
+class MaxCount(RetentionPolicy):
+    """Retain at most `count` directories - keep_max"""
+
+    def __init__(self, count):
+        self.count = count
+
+    def victims(self, entries, now):
+        return entries[:max(len(entries) - self.count, 0)]
+
+
+class MaxTotalBytes(RetentionPolicy):
+    """Retain directories only while their total disk space is at most `limit` bytes"""
+
+    needs_size = True
+
+    def __init__(self, limit):
+        self.limit = limit
+
+    def victims(self, entries, now):
+        total = sum(entry.size for entry in entries)
+        evicted = []
+        for entry in entries:
+            if total <= self.limit:
+                break
+            total -= entry.size
+            evicted.append(entry)
+        return evicted
+
+
+class MaxAge(RetentionPolicy):
+    """Retain directories for at most `seconds` after they were released"""
+
+    def __init__(self, seconds):
+        self.seconds = seconds
+
+    def victims(self, entries, now):
+        return [entry for entry in entries if now - entry.retained_since > self.seconds]
+
+
+def select_victims(entries, policies, order='created', now=None):
+    """Apply retention policies to the retained directories
+
+    :param entries: The retained directories, oldest first
+    :param policies: The RetentionPolicy instances - a directory is evicted if any policy evicts it
+    :param order: 'created' to evict the oldest first, 'lru' to evict the least recently used first
+    :param now: The current time - defaults to time.time()
+    :return: The entries to evict, in the order they should be evicted
+    """
+    now = time.time() if now is None else now
+    if order == 'lru':
+        entries = sorted(entries, key=lambda entry: entry.last_access)
+
+    evicted = set()
+    for policy in policies:
+        evicted.update(id(entry) for entry in policy.victims(entries, now))
+    return [entry for entry in entries if id(entry) in evicted]
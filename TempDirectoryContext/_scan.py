@@ -0,0 +1,81 @@
+#!/usr/bin/env python
+"""
+TempDirectoryContext._scan : Discovery of historic directories
+
+Summary :
+    A single streaming pass over the root directory which finds the historic directories for a
+    given prefix and suffix, oldest first.
+
+Use Case :
+    As an application I want the first context manager for a prefix and suffix to be created quickly
+    even when the root directory (normally /tmp) has a very large number of entries
+"""
+
+import errno
+import os
+
+from ._reclaim import HIDDEN_PREFIX
+from ._archive import ARCHIVE_SUFFIX
+
+__author__ = 'Tony Flury : anthony.flury@btinternet.com'
+__created__ = '16 Oct 2026'
+
+
+def iter_historic(root, prefix, suffix):
+    """Generate (ctime, path) for every directory in root whose name matches the prefix and suffix
+
+    Names are filtered before anything is stat'ed, and the stat cached on each os.DirEntry is used, so
+    non-matching entries cost nothing beyond the directory read itself. Symbolic links, and the hidden
+    directories used internally (trash, pools), are ignored.
+
+    Archived historic directories (the directory name followed by .tar.gz) are included - in the
+    directory's place, as the archive's modification time is the directory's creation time.
+    """
+    archive_suffix = suffix + ARCHIVE_SUFFIX
+    with os.scandir(root) as entries:
+        for entry in entries:
+            name = entry.name
+            if not name.startswith(prefix) or name.startswith(HIDDEN_PREFIX):
+                continue
+            try:
+                if name.endswith(suffix):
+                    if not entry.is_dir(follow_symlinks=False):
+                        continue
+                    ctime = entry.stat(follow_symlinks=False).st_ctime
+                elif name.endswith(archive_suffix):
+                    if not entry.is_file(follow_symlinks=False):
+                        continue
+                    ctime = entry.stat(follow_symlinks=False).st_mtime
+                else:
+                    continue
+            except OSError:
+                # Removed by someone else while we were scanning
+                continue
+            yield ctime, entry.path
+
+
+def scan_historic(root, prefix, suffix):
+    """Find the historic directories in root for a prefix and suffix - oldest first
+
+    Every directory is ordered - the delete queue holds them all, and evicts from the front - so this is a single
+    sort of the (ctime, path) tuples, which is cheap beside reading the directory.
+
+    :param root: The directory to scan - or a list of directories (the buckets of a sharded layout), any of which
+                 may not exist yet
+    :param prefix: The start of the directory names
+    :param suffix: The end of the directory names
+    :return: A list of directory paths, oldest first
+    """
+    if not isinstance(root, (list, tuple)):
+        entries = list(iter_historic(root, prefix, suffix))
+    else:
+        entries = []
+        for directory in root:
+            try:
+                entries.extend(iter_historic(directory, prefix, suffix))
+            except (IOError, OSError) as e:
+                if e.errno != errno.ENOENT:
+                    raise
+
+    entries.sort()
+    return [path for ctime, path in entries]
@@ -0,0 +1,120 @@
+#!/usr/bin/env python
+"""
+TempDirectoryContext._storage : Storage backends - where directories are created
+
+Summary :
+    A storage backend chooses the root a context manager's directories are created in. The disk backend
+    uses the root as given; the memory backend uses a memory backed file system (/dev/shm), as long as it
+    has enough free space, and falls back to the disk root when it doesn't. A backend may also cap the
+    size of each directory - the cap is a hard quota on the directories while they are in use.
+
+Use Case :
+    As a test suite which writes a few small files per test I want my sandboxes in memory so that I don't
+    pay for disk metadata I/O, without a runaway test being able to exhaust the machine's memory
+"""
+
+import errno
+import logging
+import os
+
+__author__ = 'Tony Flury : anthony.flury@btinternet.com'
+__created__ = '16 Oct 2026'
+
+logger = logging.getLogger('TempDirectoryContext')
+
+# Where memory backed directories are created by default
+MEMORY_ROOT = '/dev/shm'
+
+
+class Storage(object):
+    """Base class for storage backends"""
+
+    # The most disk space (in bytes) a single directory may use - None for no limit
+    max_bytes = None
+
+    def select(self, root):
+        """The root directories are created in
+
+        :param root: The context manager's own root - the root argument, or tempfile.gettempdir()
+        :return: The root to use
+        """
+        raise NotImplementedError
+
+    def check_space(self, root, count=1):
+        """Check that there is still room for more directories - called as a context manager is entered
+
+        :param root: The root returned by select()
+        :param count: The number of directories about to be created
+        :raises OSError: (ENOSPC) if there isn't room
+        """
+
+
+class DiskStorage(Storage):
+    """Directories are created in the context manager's own root"""
+
+    def select(self, root):
+        return root
+
+
+class MemoryStorage(Storage):
+    """Directories are created on a memory backed file system, if it has room - otherwise on disk"""
+
+    def __init__(self, path=MEMORY_ROOT, min_free=64 * 2 ** 20, max_bytes=64 * 2 ** 20):
+        """Directories are created on a memory backed file system, if it has room - otherwise on disk
+
+        :param path: The directory on the memory backed file system used as the root
+        :param min_free: The free space (in bytes) which must be left on the file system once a directory has
+                         grown to max_bytes - otherwise the context manager's own (disk) root is used
+        :param max_bytes: The most space (in bytes) a directory may use - a larger directory is deleted as soon as
+                          its context manager exits, rather than retained. None for no limit
+
+        :type path: str
+        :type min_free: int
+        :type max_bytes: int
+        """
+        self.path = path
+        self.min_free = min_free
+        self.max_bytes = max_bytes
+
+    def free_space(self):
+        """The space (in bytes) available on the memory backed file system - None if it can't be used"""
+        try:
+            info = os.statvfs(self.path)
+        except (AttributeError, IOError, OSError):
+            # No statvfs (Windows), or no such file system
+            return None
+        if not os.access(self.path, os.W_OK | os.X_OK):
+            return None
+        return info.f_bavail * info.f_frsize
+
+    def select(self, root):
+        free = self.free_space()
+        needed = self.min_free + (self.max_bytes or 0)
+        if free is None or free < needed:
+            logger.info('Not enough memory backed space in %s (%s bytes free, %s needed) - using %s',
+                        self.path, free, needed, root)
+            return root
+        return self.path
+
+    def check_space(self, root, count=1):
+        # The space seen by select() may have been used since - by this process's own directories, or anyone else's
+        if root != self.path:
+            return
+        free = self.free_space()
+        needed = self.min_free + count * (self.max_bytes or 0)
+        if free is None or free < needed:
+            raise OSError(errno.ENOSPC, 'Not enough memory backed space ({} bytes free, {} needed)'.format(
+                free, needed), self.path)
+
+
+STORAGES = {"disk": DiskStorage, "memory": MemoryStorage}
+
+
+def storage_backend(storage):
+    """The Storage instance for a storage argument - a name ("disk" or "memory") or a Storage instance"""
+    if isinstance(storage, Storage):
+        return storage
+    if storage not in STORAGES:
+        raise ValueError('storage must be one of {} (or a Storage instance) : {!r}'.format(
+            ', '.join(STORAGES), storage))
+    return STORAGES[storage]()
@@ -0,0 +1,176 @@
+#!/usr/bin/env python
+"""
+TempDirectoryContext.pytest_plugin : pytest plugin - a sandbox directory for each test
+
+Summary :
+    Provides the temp_directory fixture : an empty directory for each test. Each pytest process (each
+    xdist worker) uses a single context manager for the session, with a prefix of its own in a sharded
+    namespace, so the workers never scan or retain each other's directories and the historic scan is
+    done once per worker. Sandboxes of passing tests are deleted together, in parallel, when the
+    session finishes; the sandbox of a failing test is kept - one per test node, replacing the one kept
+    by the test's previous failure - until the test next passes.
+
+Use Case :
+    As a test suite run under pytest (and pytest-xdist) I want a cheap sandbox for every test, and the
+    sandboxes of failing tests kept for debugging, without the workers fighting over retention
+
+Usage :
+    Needs pytest 7.0 or later. Not loaded automatically - enabled with -p TempDirectoryContext.pytest_plugin, or with
+    pytest_plugins = ["TempDirectoryContext.pytest_plugin"] in the top level conftest.py
+
+        def test_build(temp_directory):
+            # temp_directory is an empty directory, for this test alone
+
+    Options :
+        --tdc-root : The root for the sandboxes; defaults to tempfile.gettempdir()
+        --tdc-prefix : The start of the sandbox names; the worker id is added to it (defaults to pytest-)
+        --tdc-discard-failed : Delete the sandboxes of failing tests too
+        --tdc-workers : The number of threads deleting sandboxes at the end of the session (defaults to 4)
+"""
+
+import hashlib
+import os
+import os.path
+import re
+import tempfile
+
+import pytest
+
+from .TempDirectoryContext import TempDirectoryContext
+from ._layout import namespace_path
+from ._reclaim import remove_tree
+
+__author__ = 'Tony Flury : anthony.flury@btinternet.com'
+__created__ = '16 Oct 2026'
+
+# pytest.StashKey and pytest.version_tuple
+MIN_PYTEST = (7, 0)
+
+if tuple(getattr(pytest, 'version_tuple', (0,))[:2]) < MIN_PYTEST:
+    raise ImportError('TempDirectoryContext.pytest_plugin requires pytest {} or later - pytest {} is installed'.format(
+        '.'.join(map(str, MIN_PYTEST)), pytest.__version__))
+
+_manager_key = pytest.StashKey()
+_reports_key = pytest.StashKey()
+
+
+def worker_id(config):
+    """The xdist worker id of this process - "main" without xdist"""
+    return getattr(config, 'workerinput', {}).get('workerid', 'main')
+
+
+def node_name(nodeid):
+    """A directory name for a test node - readable, but unique even once it has been shortened"""
+    readable = re.sub(r'[^A-Za-z0-9_.-]+', '_', nodeid)[:96]
+    return '{}-{}'.format(readable, hashlib.sha1(nodeid.encode('utf-8')).hexdigest()[:10])
+
+
+class SandboxManager(object):
+    """The sandboxes for one pytest process - created through a single context manager, and reclaimed together"""
+
+    def __init__(self, root, prefix, worker, keep_failed=True, workers=4):
+        """The sandboxes for one pytest process
+
+        :param root: The root directory
+        :param prefix: The start of the sandbox names - shared by every worker
+        :param worker: The worker id - added to the prefix, so each worker has a namespace of its own
+        :param keep_failed: Whether the sandboxes of failing tests are kept
+        :param workers: The number of threads deleting sandboxes at the end of the session
+        """
+        self._root = root
+        self._prefix = '{}{}-'.format(prefix, worker)
+        self._failed_root = namespace_path(root, prefix, 'failed')
+        self._keep_failed = keep_failed
+        self._workers = workers
+        self._context = None
+        self._passed = []
+        self._stale = []
+
+    @property
+    def failed_root(self):
+        """The directory holding the kept sandboxes of failing tests - shared by every worker"""
+        return self._failed_root
+
+    def create(self):
+        """A new sandbox - the context manager (and so the historic scan) is only created when it is first needed"""
+        if self._context is None:
+            # Nothing is evicted until the session finishes - then everything historic goes, apart from directories
+            # stamped by a live process (another session using the same prefix)
+            self._context = TempDirectoryContext(prefix=self._prefix, suffix="", root=self._root, layout="sharded",
+                                                 keep_max=0, owner_stamp=True, delete_workers=self._workers)
+        return self._context._enter_directories(1)[0]
+
+    def finish(self, nodeid, path, failed):
+        """A test has finished with its sandbox
+
+        :return: The path the sandbox is kept at - None if it will be deleted
+        """
+        kept = os.path.join(self.failed_root, node_name(nodeid))
+        if not (failed and self._keep_failed):
+            # Reclaimed with the rest at the end of the session - along with the sandbox kept by an earlier failure
+            self._passed.append(path)
+            self._stale.append(kept)
+            return None
+
+        self._context._detach(path)
+        os.makedirs(self.failed_root, 0o700, exist_ok=True)
+        if os.path.lexists(kept):
+            remove_tree(kept)
+        os.rename(path, kept)
+        return kept
+
+    def close(self):
+        """The session has finished - delete the sandboxes of passing tests, and historic sandboxes, in parallel"""
+        if self._context is None:
+            return
+        passed, self._passed = self._passed, []
+        stale, self._stale = [path for path in self._stale if os.path.lexists(path)], []
+        self._context._release(passed)
+        self._context._evict_all(stale)
+
+
+def pytest_addoption(parser):
+    group = parser.getgroup('TempDirectoryContext', 'TempDirectoryContext sandboxes (temp_directory fixture)')
+    group.addoption('--tdc-root', default=None,
+                    help='Root directory for the sandboxes; defaults to tempfile.gettempdir()')
+    group.addoption('--tdc-prefix', default='pytest-',
+                    help='Start of the sandbox names - the worker id is added to it (defaults to pytest-)')
+    group.addoption('--tdc-discard-failed', action='store_true', default=False,
+                    help='Delete the sandboxes of failing tests too, rather than keeping them')
+    group.addoption('--tdc-workers', type=int, default=4,
+                    help='Threads deleting sandboxes at the end of the session (defaults to 4)')
+
+
+def pytest_configure(config):
+    root = config.getoption('tdc_root') or tempfile.gettempdir()
+    config.stash[_manager_key] = SandboxManager(root, config.getoption('tdc_prefix'), worker_id(config),
+                                                keep_failed=not config.getoption('tdc_discard_failed'),
+                                                workers=config.getoption('tdc_workers'))
+
+
+def pytest_sessionfinish(session):
+    manager = session.config.stash.get(_manager_key, None)
+    if manager is not None:
+        manager.close()
+
+
+@pytest.hookimpl(hookwrapper=True)
+def pytest_runtest_makereport(item, call):
+    # The outcome of each phase, so the fixture knows at teardown whether the test failed
+    outcome = yield
+    report = outcome.get_result()
+    item.stash.setdefault(_reports_key, {})[report.when] = report
+
+
+@pytest.fixture
+def temp_directory(request):
+    """An empty directory for this test - kept if the test fails, otherwise deleted at the end of the session"""
+    manager = request.config.stash[_manager_key]
+    path = manager.create()
+    yield path
+
+    reports = request.node.stash.get(_reports_key, {})
+    failed = any(report.failed for report in reports.values())
+    kept = manager.finish(request.node.nodeid, path, failed)
+    if kept is not None:
+        request.node.add_report_section('teardown', 'temp_directory', 'sandbox kept at {}'.format(kept))
@@ -0,0 +1,117 @@
+#!/usr/bin/env python
+"""
+# TempDirectoryContext : Benchmark of contention on one key
+
+Summary :
+    Measures enter/exit throughput when many threads, or many processes, use context managers with the
+    same prefix, suffix and root at once.
+
+Use Case :
+    As a developer I want to see how throughput scales with concurrency so that lock contention
+    regressions are caught
+
+Usage :
+    python benchmarks/bench_contention.py [--threads 1,4,16] [--processes 1,4] [--iterations 200]
+"""
+
+import argparse
+import multiprocessing
+import os
+import os.path
+import queue
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from TempDirectoryContext import TempDirectoryContext  # noqa: E402
+from bench_lifecycle import forget  # noqa: E402
+
+__author__ = 'Tony Flury : anthony.flury@btinternet.com'
+__created__ = '16 Oct 2026'
+
+
+def cycles(root, iterations, options, go, results):
+    """Enter and exit `iterations` context managers for the same key, once every worker is ready - the time taken is
+    put on results"""
+    go.wait()
+    start = time.perf_counter()
+    for i in range(iterations):
+        with TempDirectoryContext(root=root, **options):
+            pass
+    results.put(time.perf_counter() - start)
+
+
+def run_workers(make_worker, results, count):
+    """Start the workers (which wait for each other) - returns the elapsed time of the slowest"""
+    workers = [make_worker() for i in range(count)]
+    for worker in workers:
+        worker.start()
+    elapsed = [results.get() for worker in workers]
+    for worker in workers:
+        worker.join()
+    return max(elapsed)
+
+
+def run_threads(root, threads, iterations, options):
+    """Run the cycles on `threads` threads - returns the elapsed time"""
+    go, results = threading.Barrier(threads), queue.Queue()
+    return run_workers(lambda: threading.Thread(target=cycles, args=(root, iterations, options, go, results)),
+                       results, threads)
+
+
+def run_processes(root, processes, iterations, options):
+    """Run the cycles in `processes` processes - returns the elapsed time (excluding process start up)"""
+    context = multiprocessing.get_context('spawn')
+    go, results = context.Barrier(processes), context.Queue()
+    return run_workers(lambda: context.Process(target=cycles, args=(root, iterations, options, go, results)),
+                       results, processes)
+
+
+def measure(run, count, iterations, options):
+    """Throughput for `count` threads or processes"""
+    root = tempfile.mkdtemp()
+    try:
+        elapsed = run(root, count, iterations, options)
+    finally:
+        forget(root)
+        shutil.rmtree(root, ignore_errors=True)
+    return {'elapsed_s': elapsed, 'ops_per_s': count * iterations / elapsed}
+
+
+def bench(thread_counts, process_counts, iterations):
+    """Measure throughput for each level of concurrency - returns a list of result dicts"""
+    results = []
+    for threads in thread_counts:
+        result = {'mode': 'threads', 'workers': threads, 'iterations': iterations}
+        result.update(measure(run_threads, threads, iterations, {}))
+        results.append(result)
+    # Processes only share retention (and so a key) with shared=True
+    for processes in process_counts:
+        result = {'mode': 'processes (shared)', 'workers': processes, 'iterations': iterations}
+        result.update(measure(run_processes, processes, iterations, {'shared': True}))
+        results.append(result)
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--threads', default='1,4,16', help='Comma separated list of thread counts')
+    parser.add_argument('--processes', default='1,4', help='Comma separated list of process counts')
+    parser.add_argument('--iterations', type=int, default=200, help='Enter/exit cycles for each thread or process')
+    args = parser.parse_args(argv)
+
+    thread_counts = [int(count) for count in args.threads.split(',') if count]
+    process_counts = [int(count) for count in args.processes.split(',') if count]
+
+    print('{:>20} {:>8} {:>12} {:>12}'.format('mode', 'workers', 'elapsed ms', 'ops/s'))
+    for result in bench(thread_counts, process_counts, args.iterations):
+        print('{:>20} {:>8} {:>12.1f} {:>12.0f}'.format(result['mode'], result['workers'],
+                                                        result['elapsed_s'] * 1000, result['ops_per_s']))
+
+
+if __name__ == '__main__':
+    main()
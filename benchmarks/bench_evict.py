@@ -0,0 +1,101 @@
+#!/usr/bin/env python
+"""
+# TempDirectoryContext : Benchmark of eviction
+
+Summary :
+    Times the context manager exit which evicts an historic tree, for trees with increasing numbers of
+    files and increasing file sizes, with each delete engine and with background deletion.
+
+Use Case :
+    As a developer I want to see how the cost of an exit grows with the tree it evicts so that I can
+    choose eviction settings and spot regressions
+
+Usage :
+    python benchmarks/bench_evict.py [--files 100,10000] [--bytes 0,65536] [--repeat 3]
+"""
+
+import argparse
+import os
+import os.path
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from TempDirectoryContext import TempDirectoryContext  # noqa: E402
+from bench_lifecycle import forget  # noqa: E402
+
+__author__ = 'Tony Flury : anthony.flury@btinternet.com'
+__created__ = '16 Oct 2026'
+
+VARIANTS = {
+    'shutil': {},
+    'parallel': {'delete_engine': 'parallel'},
+    'async_delete': {'async_delete': True},
+    'trash': {'evict': 'trash'},
+}
+
+
+def fill(top, files, size, per_dir=100):
+    """Fill a directory with `files` files of `size` bytes, `per_dir` files to a sub-directory"""
+    data = b'x' * size
+    for i in range(files):
+        directory = os.path.join(top, 'd{}'.format(i // per_dir))
+        if i % per_dir == 0:
+            os.mkdir(directory)
+        with open(os.path.join(directory, 'f{}'.format(i)), 'wb') as fd:
+            fd.write(data)
+
+
+def time_evict(options, files, size, repeat):
+    """The best time for an exit which evicts a tree of `files` files of `size` bytes"""
+    best = None
+    for i in range(repeat):
+        root = tempfile.mkdtemp()
+        try:
+            context = TempDirectoryContext(root=root, keep_max=0, **options)
+            tmp = context.__enter__()
+            fill(tmp, files, size)
+            start = time.perf_counter()
+            context.__exit__(None, None, None)
+            elapsed = time.perf_counter() - start
+            TempDirectoryContext.flush()
+        finally:
+            forget(root)
+            shutil.rmtree(root, ignore_errors=True)
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def bench(file_counts, sizes, repeat, variants=tuple(VARIANTS)):
+    """Time the evicting exit for each tree shape - returns a list of result dicts"""
+    results = []
+    for files in file_counts:
+        for size in sizes:
+            result = {'files': files, 'file_bytes': size}
+            for variant in variants:
+                result['{}_s'.format(variant)] = time_evict(VARIANTS[variant], files, size, repeat)
+            results.append(result)
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--files', default='100,10000', help='Comma separated list of tree sizes (files)')
+    parser.add_argument('--bytes', default='0,65536', help='Comma separated list of file sizes (bytes)')
+    parser.add_argument('--repeat', type=int, default=3, help='Number of timings (the best is reported)')
+    args = parser.parse_args(argv)
+
+    file_counts = [int(count) for count in args.files.split(',')]
+    sizes = [int(size) for size in args.bytes.split(',')]
+
+    print('{:>8} {:>10}'.format('files', 'bytes') + ''.join(' {:>15}'.format(variant + ' ms') for variant in VARIANTS))
+    for result in bench(file_counts, sizes, args.repeat):
+        print('{:>8} {:>10}'.format(result['files'], result['file_bytes']) +
+              ''.join(' {:>15.2f}'.format(result['{}_s'.format(variant)] * 1000) for variant in VARIANTS))
+
+
+if __name__ == '__main__':
+    main()
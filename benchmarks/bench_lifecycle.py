@@ -0,0 +1,135 @@
+#!/usr/bin/env python
+"""
+# TempDirectoryContext : Benchmark of the context manager life cycle
+
+Summary :
+    Times the constructor (which finds the historic directories) for root directories of increasing
+    size, and compares the latency of entering and exiting a TempDirectoryContext with
+    tempfile.TemporaryDirectory.
+
+Use Case :
+    As a developer I want to see what a context manager costs compared with the standard library so
+    that I can spot regressions in the common path
+
+Usage :
+    python benchmarks/bench_lifecycle.py [--sizes 1000,10000,100000] [--iterations 500] [--repeat 5]
+"""
+
+import argparse
+import os
+import os.path
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from TempDirectoryContext import TempDirectoryContext  # noqa: E402
+
+__author__ = 'Tony Flury : anthony.flury@btinternet.com'
+__created__ = '16 Oct 2026'
+
+
+def forget(root):
+    """Drop the in-process delete queues for a root - so the next constructor finds the historic directories again"""
+    registry = TempDirectoryContext._registry
+    for key in [key for key in registry.keys() if key[0] == root]:
+        registry.discard(key)
+
+
+def populate(root, entries, matching=10):
+    """Fill root with `entries` unrelated files plus `matching` historic directories"""
+    for i in range(entries):
+        open(os.path.join(root, 'unrelated{:07d}'.format(i)), 'w').close()
+    for i in range(matching):
+        os.mkdir(os.path.join(root, 'tmp{:07d}TempDirCont'.format(i)))
+
+
+def summarise(timings):
+    """Best, median and 99th percentile of a list of timings (seconds)"""
+    timings = sorted(timings)
+    return {'best_s': timings[0], 'median_s': timings[len(timings) // 2],
+            'p99_s': timings[min(int(len(timings) * 0.99), len(timings) - 1)]}
+
+
+def bench_constructor(sizes, repeat):
+    """Time the constructor, as in a new process, for each root size - returns a list of result dicts"""
+    results = []
+    for size in sizes:
+        root = tempfile.mkdtemp()
+        try:
+            populate(root, size)
+            timings = []
+            for i in range(repeat):
+                forget(root)
+                start = time.perf_counter()
+                TempDirectoryContext(root=root)
+                timings.append(time.perf_counter() - start)
+        finally:
+            forget(root)
+            shutil.rmtree(root)
+        result = {'entries': size}
+        result.update(summarise(timings))
+        results.append(result)
+    return results
+
+
+def time_cycles(factory, iterations):
+    """Time `iterations` enter/exit cycles of the context managers made by factory()"""
+    timings = []
+    for i in range(iterations):
+        start = time.perf_counter()
+        with factory():
+            pass
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def bench_enter_exit(iterations):
+    """Compare enter/exit latency with tempfile.TemporaryDirectory - returns a list of result dicts"""
+    variants = [
+        ('TemporaryDirectory', lambda root: tempfile.TemporaryDirectory(dir=root)),
+        ('keep_max=0', lambda root: TempDirectoryContext(root=root, keep_max=0)),
+        ('keep_max=3', lambda root: TempDirectoryContext(root=root, keep_max=3)),
+        ('async_delete', lambda root: TempDirectoryContext(root=root, keep_max=0, async_delete=True)),
+        ('recycle', lambda root: TempDirectoryContext(root=root, keep_max=0, recycle=True)),
+    ]
+    results = []
+    for name, factory in variants:
+        root = tempfile.mkdtemp()
+        try:
+            timings = time_cycles(lambda: factory(root), iterations)
+            TempDirectoryContext.flush()
+        finally:
+            forget(root)
+            shutil.rmtree(root)
+        result = {'variant': name, 'iterations': iterations}
+        result.update(summarise(timings))
+        results.append(result)
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', default='1000,10000,100000',
+                        help='Comma separated list of root directory sizes')
+    parser.add_argument('--iterations', type=int, default=500, help='Number of enter/exit cycles timed')
+    parser.add_argument('--repeat', type=int, default=5, help='Number of constructor timings')
+    args = parser.parse_args(argv)
+
+    sizes = [int(size) for size in args.sizes.split(',')]
+    print('{:>10} {:>12} {:>12}'.format('entries', 'best ms', 'median ms'))
+    for result in bench_constructor(sizes, args.repeat):
+        print('{:>10} {:>12.2f} {:>12.2f}'.format(result['entries'], result['best_s'] * 1000,
+                                                  result['median_s'] * 1000))
+
+    print()
+    print('{:>20} {:>12} {:>12} {:>12}'.format('enter/exit', 'best us', 'median us', 'p99 us'))
+    for result in bench_enter_exit(args.iterations):
+        print('{:>20} {:>12.1f} {:>12.1f} {:>12.1f}'.format(result['variant'], result['best_s'] * 1e6,
+                                                            result['median_s'] * 1e6, result['p99_s'] * 1e6))
+
+
+if __name__ == '__main__':
+    main()
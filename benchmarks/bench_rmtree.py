@@ -0,0 +1,100 @@
+#!/usr/bin/env python
+"""
+# TempDirectoryContext : Benchmark of tree deletion
+
+Summary :
+    Compares shutil.rmtree with the parallel, file descriptor relative delete engine, for trees with
+    increasing numbers of small files.
+
+Use Case :
+    As a developer I want to see how quickly large historic trees are deleted so that I can choose a
+    delete engine and spot regressions
+
+Usage :
+    python benchmarks/bench_rmtree.py [--files 10000,100000] [--workers 1,4,8] [--repeat 3]
+"""
+
+import argparse
+import os
+import os.path
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from TempDirectoryContext._rmtree import parallel_rmtree  # noqa: E402
+
+__author__ = 'Tony Flury : anthony.flury@btinternet.com'
+__created__ = '16 Oct 2026'
+
+
+def build_tree(top, files, per_dir=100, fanout=10):
+    """Build a tree of `files` small files, `per_dir` files to a directory, `fanout` directories to a level"""
+    directories = [top]
+    created = 0
+    index = 0
+    while created < files:
+        directory = directories[index]
+        index += 1
+        for i in range(min(per_dir, files - created)):
+            with open(os.path.join(directory, 'f{}'.format(i)), 'w') as fd:
+                fd.write('x')
+            created += 1
+        for i in range(fanout):
+            sub = os.path.join(directory, 'd{}'.format(i))
+            os.mkdir(sub)
+            directories.append(sub)
+
+
+def time_delete(delete, files, repeat):
+    """The best time for `delete` to remove a freshly built tree of `files` files"""
+    best = None
+    for i in range(repeat):
+        root = tempfile.mkdtemp()
+        tree = os.path.join(root, 'tree')
+        os.mkdir(tree)
+        try:
+            build_tree(tree, files)
+            start = time.perf_counter()
+            delete(tree)
+            elapsed = time.perf_counter() - start
+        finally:
+            shutil.rmtree(root, ignore_errors=True)
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def bench(file_counts, worker_counts, repeat):
+    """Time each engine for each tree size - returns a list of result dicts"""
+    results = []
+    for files in file_counts:
+        result = {'files': files, 'shutil_s': time_delete(shutil.rmtree, files, repeat)}
+        for workers in worker_counts:
+            result['parallel_{}_s'.format(workers)] = time_delete(
+                lambda tree: parallel_rmtree(tree, workers=workers), files, repeat)
+        results.append(result)
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--files', default='10000,100000', help='Comma separated list of tree sizes (files)')
+    parser.add_argument('--workers', default='1,4,8', help='Comma separated list of worker counts')
+    parser.add_argument('--repeat', type=int, default=3, help='Number of timings (the best is reported)')
+    args = parser.parse_args(argv)
+
+    file_counts = [int(count) for count in args.files.split(',')]
+    worker_counts = [int(count) for count in args.workers.split(',')]
+
+    print('{:>10} {:>12}'.format('files', 'shutil ms') +
+          ''.join(' {:>14}'.format('parallel/{} ms'.format(workers)) for workers in worker_counts))
+    for result in bench(file_counts, worker_counts, args.repeat):
+        print('{:>10} {:>12.1f}'.format(result['files'], result['shutil_s'] * 1000) +
+              ''.join(' {:>14.1f}'.format(result['parallel_{}_s'.format(workers)] * 1000)
+                      for workers in worker_counts))
+
+
+if __name__ == '__main__':
+    main()
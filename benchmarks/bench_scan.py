@@ -0,0 +1,88 @@
+#!/usr/bin/env python
+"""
+# TempDirectoryContext : Benchmark of the historic directory scan
+
+Summary :
+    Compares the original listdir + stat historic scan with the scandir based scanner, for root
+    directories of increasing size - with a few historic directories (the cost of reading the root),
+    and with many (the cost of ordering them too).
+
+Use Case :
+    As a developer I want to see how the constructor scan scales with the size of the root directory
+    so that I can spot regressions
+
+Usage :
+    python benchmarks/bench_scan.py [--sizes 1000,10000,100000] [--matching 10,10000] [--repeat 5]
+"""
+
+import argparse
+import os
+import os.path
+import shutil
+import sys
+import tempfile
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from TempDirectoryContext._scan import scan_historic  # noqa: E402
+
+__author__ = 'Tony Flury : anthony.flury@btinternet.com'
+__created__ = '16 Oct 2026'
+
+
+def legacy_scan(root, prefix, suffix):
+    """The historic scan as originally implemented in TempDirectoryContext.__init__"""
+    return sorted([os.path.join(root, path) for path in os.listdir(root)
+                   if (os.path.split(path)[1].startswith(prefix)) and
+                   (os.path.split(path)[1].endswith(suffix))],
+                  key=lambda x: os.stat(x).st_ctime,
+                  reverse=False)
+
+
+def populate(root, entries, matching=10):
+    """Fill root with `entries` unrelated files plus `matching` historic directories"""
+    for i in range(entries):
+        open(os.path.join(root, 'unrelated{:07d}'.format(i)), 'w').close()
+    for i in range(matching):
+        os.mkdir(os.path.join(root, 'tmp{:07d}TempDirCont'.format(i)))
+
+
+def bench(sizes, repeat, matching=(10, 10000)):
+    """Time both scanners for each root size and number of historic directories - returns a list of result dicts"""
+    results = []
+    for size in sizes:
+        for count in matching:
+            root = tempfile.mkdtemp()
+            try:
+                populate(root, size, count)
+                legacy = min(timeit.repeat(lambda: legacy_scan(root, 'tmp', 'TempDirCont'),
+                                           number=1, repeat=repeat))
+                scandir = min(timeit.repeat(lambda: scan_historic(root, 'tmp', 'TempDirCont'),
+                                            number=1, repeat=repeat))
+            finally:
+                shutil.rmtree(root)
+            results.append({'entries': size, 'matching': count, 'legacy_s': legacy, 'scandir_s': scandir})
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', default='1000,10000,100000',
+                        help='Comma separated list of root directory sizes')
+    parser.add_argument('--matching', default='10,10000',
+                        help='Comma separated list of the numbers of historic directories added to each root')
+    parser.add_argument('--repeat', type=int, default=5, help='Number of timings (the best is reported)')
+    args = parser.parse_args(argv)
+
+    sizes = [int(size) for size in args.sizes.split(',')]
+    matching = [int(count) for count in args.matching.split(',')]
+    print('{:>10} {:>10} {:>12} {:>12} {:>8}'.format('entries', 'matching', 'legacy ms', 'scandir ms', 'speedup'))
+    for result in bench(sizes, args.repeat, matching):
+        print('{entries:>10} {matching:>10} {legacy:>12.2f} {scandir:>12.2f} {speedup:>7.1f}x'.format(
+            entries=result['entries'], matching=result['matching'], legacy=result['legacy_s'] * 1000,
+            scandir=result['scandir_s'] * 1000, speedup=result['legacy_s'] / result['scandir_s']))
+
+
+if __name__ == '__main__':
+    main()
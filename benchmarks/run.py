@@ -0,0 +1,117 @@
+#!/usr/bin/env python
+"""
+# TempDirectoryContext : Benchmark suite
+
+Summary :
+    Runs every benchmark - the historic scan, the constructor, enter/exit against
+    tempfile.TemporaryDirectory, eviction, tree deletion and contention - and writes the results,
+    with a description of the machine they were run on, as a single JSON document.
+
+Use Case :
+    As a developer I want machine readable results from a fixed set of benchmarks so that
+    performance can be tracked from one version to the next
+
+Usage :
+    python benchmarks/run.py [--quick] [--only scan,lifecycle,...] [--output results.json]
+
+    Only the standard library is used, and nothing is fetched over the network.
+"""
+
+import argparse
+import datetime
+import json
+import os
+import os.path
+import platform
+import subprocess
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import bench_contention  # noqa: E402
+import bench_evict  # noqa: E402
+import bench_lifecycle  # noqa: E402
+import bench_rmtree  # noqa: E402
+import bench_scan  # noqa: E402
+from TempDirectoryContext.TempDirectoryContext import __version__  # noqa: E402
+
+__author__ = 'Tony Flury : anthony.flury@btinternet.com'
+__created__ = '16 Oct 2026'
+
+# The parameters for each benchmark - fixed, so results are comparable from run to run
+FULL = {
+    'scan': lambda: bench_scan.bench([1000, 10000, 100000], repeat=5, matching=[10, 10000]),
+    'constructor': lambda: bench_lifecycle.bench_constructor([1000, 10000, 100000], repeat=5),
+    'enter_exit': lambda: bench_lifecycle.bench_enter_exit(iterations=500),
+    'evict': lambda: bench_evict.bench([100, 10000], [0, 65536], repeat=3),
+    'rmtree': lambda: bench_rmtree.bench([10000, 100000], [1, 4, 8], repeat=3),
+    'contention': lambda: bench_contention.bench([1, 4, 16], [1, 4], iterations=200),
+}
+
+QUICK = {
+    'scan': lambda: bench_scan.bench([1000, 10000], repeat=3, matching=[10, 1000]),
+    'constructor': lambda: bench_lifecycle.bench_constructor([1000, 10000], repeat=3),
+    'enter_exit': lambda: bench_lifecycle.bench_enter_exit(iterations=100),
+    'evict': lambda: bench_evict.bench([100, 1000], [0, 4096], repeat=1),
+    'rmtree': lambda: bench_rmtree.bench([1000, 10000], [1, 4], repeat=1),
+    'contention': lambda: bench_contention.bench([1, 4], [2], iterations=50),
+}
+
+
+def git_revision():
+    """The git commit of the working tree - None if it isn't a git checkout"""
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'], cwd=os.path.dirname(os.path.abspath(__file__)),
+                                       stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def environment():
+    """A description of the machine and software the benchmarks ran on"""
+    return {
+        'timestamp': datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        'version': __version__,
+        'revision': git_revision(),
+        'python': platform.python_version(),
+        'implementation': platform.python_implementation(),
+        'platform': platform.platform(),
+        'machine': platform.machine(),
+        'cpus': os.cpu_count(),
+    }
+
+
+def run(only=None, quick=False):
+    """Run the benchmarks - returns the JSON document as a dictionary"""
+    suite = QUICK if quick else FULL
+    names = list(suite) if not only else only
+    unknown = [name for name in names if name not in suite]
+    if unknown:
+        raise ValueError('Unknown benchmarks : {}'.format(', '.join(unknown)))
+
+    results = {}
+    for name in names:
+        sys.stderr.write('Running {} ...\n'.format(name))
+        results[name] = suite[name]()
+    return {'environment': environment(), 'quick': quick, 'results': results}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--quick', action='store_true', help='Smaller sizes and fewer repeats - a smoke test')
+    parser.add_argument('--only', default='', help='Comma separated list of benchmarks : ' + ', '.join(FULL))
+    parser.add_argument('--output', default=None, help='File the JSON is written to - defaults to standard output')
+    args = parser.parse_args(argv)
+
+    only = [name for name in args.only.split(',') if name]
+    document = run(only=only, quick=args.quick)
+    text = json.dumps(document, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, 'w') as fd:
+            fd.write(text + '\n')
+    else:
+        print(text)
+
+
+if __name__ == '__main__':
+    main()
@@ -34,7 +34,7 @@ setup(
         # Versions should comply with PEP440.  For a discussion on single-sourcing
         # the version across setup.py and the project code, see
         # https://packaging.python.org/en/latest/single_source_version.html
-        version="1.0.1",
+        version="2.0.0",
 
         description='A context manager around the creation of temporary directories',
         long_description=long_description,
@@ -65,14 +65,15 @@ setup(
 
             # Specify the Python versions you support here. In particular, ensure
             # that you indicate whether you support Python 2, Python 3 or both.
-            #        'Programming Language :: Python :: 2',
-            #        'Programming Language :: Python :: 2.6',
-            'Programming Language :: Python :: 2.7',
-            #        'Programming Language :: Python :: 3',
-            #        'Programming Language :: Python :: 3.2',
-            #        'Programming Language :: Python :: 3.3',
-            #        'Programming Language :: Python :: 3.4',
-            'Programming Language :: Python :: 3.5',
+            'Programming Language :: Python :: 3',
+            'Programming Language :: Python :: 3 :: Only',
+            'Programming Language :: Python :: 3.6',
+            'Programming Language :: Python :: 3.7',
+            'Programming Language :: Python :: 3.8',
+            'Programming Language :: Python :: 3.9',
+            'Programming Language :: Python :: 3.10',
+            'Programming Language :: Python :: 3.11',
+            'Programming Language :: Python :: 3.12',
             'Topic :: Software Development :: Testing'
         ],
 
@@ -83,6 +84,9 @@ setup(
         # simple. Or you can use find_packages().
         packages=find_packages(exclude=['test*']),
 
+        # concurrent.futures, os.scandir as a context manager and os.PathLike need Python 3.6
+        python_requires='>=3.6',
+
         # List run-time dependencies here.  These will be installed by pip when
         # your project is installed. For an analysis of "install_requires" vs pip's
         # requirements files see:
@@ -96,6 +100,8 @@ setup(
         extras_require={
             'dev': ['check-manifest'],
             'test': ['coverage'],
+            # The temp_directory fixture - enabled with -p TempDirectoryContext.pytest_plugin
+            'pytest': ['pytest>=7.0'],
         },
 
         # If there are data files included in your packages that need to be
@@ -111,11 +117,6 @@ setup(
         # In this case, 'data_file' will be installed into '<sys.prefix>/my_data'
         data_files=[],
 
-        # To provide executable scripts, use entry points in preference to the
-        # "scripts" keyword. Entry points provide cross-platform support and allow
-        # pip to create the appropriate form of executable for the target platform.
-        entry_points={
-        },
         test_suite='test',
         tests_require=['flake8']
 )
\ No newline at end of file
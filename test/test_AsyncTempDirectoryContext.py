@@ -0,0 +1,176 @@
+#!/usr/bin/env python
+"""
+# TempDirectoryContext : Test Suite for test_AsyncTempDirectoryContext.py
+
+Summary :
+    Testing the asyncio version of TempDirectoryContext
+Use Case :
+    As an asyncio application I want to create and tear down temporary directories so that I can keep
+    the environment clean without blocking my event loop
+
+Testable Statements :
+    Can I create a temp file area with async with
+    Is the event loop kept running while historic directories are deleted
+    Is a directory created by a cancelled entry cleaned up
+    Is retention shared with TempDirectoryContext
+"""
+
+import asyncio
+import unittest
+import os.path
+import shutil
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+
+import TempDirectoryContext as TempDirCont
+
+# The module itself - before Python 3.8 mock resolves "TempDirectoryContext.TempDirectoryContext" to the class of the
+# same name which the package exports, so the module's globals are patched through this instead
+TDC_MODULE = sys.modules["TempDirectoryContext.TempDirectoryContext"]
+
+__version__ = "0.1"
+__author__ = 'Tony Flury : anthony.flury@btinternet.com'
+__created__ = '16 Oct 2026'
+
+
+def run(coroutine):
+    """Run a coroutine on a new event loop"""
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(coroutine)
+    finally:
+        loop.close()
+
+
+class Test00Async(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    def historic(self):
+        return [name for name in os.listdir(self.root) if name.startswith("tmp") and name.endswith("TempDirCont")]
+
+    def test_00_001_create(self):
+        """Async - the directory is created, and deleted with keep_max=0"""
+        async def body():
+            async with TempDirCont.AsyncTempDirectoryContext(root=self.root, keep_max=0) as tmp:
+                self.assertEqual(os.path.isdir(tmp), True)
+                self.assertEqual(os.path.basename(tmp).startswith("tmp"), True)
+                self.assertEqual(os.path.basename(tmp).endswith("TempDirCont"), True)
+            return tmp
+
+        tmp = run(body())
+        self.assertEqual(os.path.exists(tmp), False)
+
+    def test_00_002_shared_retention(self):
+        """Async - retention is shared with TempDirectoryContext"""
+        td = []
+        for i in range(2):
+            with TempDirCont.TempDirectoryContext(root=self.root, keep_max=2) as tmp:
+                td.append(tmp)
+
+        async def body():
+            async with TempDirCont.AsyncTempDirectoryContext(root=self.root, keep_max=2) as tmp:
+                td.append(tmp)
+
+        run(body())
+        self.assertEqual(list(map(os.path.exists, td)), [False, True, True])
+
+    def test_00_003_executor(self):
+        """Async - file system operations run in the given executor"""
+        executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="tdc-test")
+        names = []
+        real_make = TempDirCont.TempDirectoryContext._make_directory
+
+        def make(ctx):
+            import threading
+            names.append(threading.current_thread().name)
+            return real_make(ctx)
+
+        async def body():
+            async with TempDirCont.AsyncTempDirectoryContext(root=self.root, keep_max=0, executor=executor):
+                pass
+
+        with mock.patch.object(TempDirCont.TempDirectoryContext, "_make_directory", make):
+            run(body())
+        executor.shutdown()
+        self.assertEqual(names[0].startswith("tdc-test"), True)
+
+    def test_00_010_loop_responsive(self):
+        """Async - the event loop keeps running while a large historic tree is deleted"""
+        real_remove = TempDirCont._reclaim.remove_tree
+
+        def slow_remove(path, **kwargs):
+            time.sleep(0.3)
+            real_remove(path, **kwargs)
+
+        async def ticker(ticks, stop):
+            while not stop.is_set():
+                ticks.append(time.time())
+                await asyncio.sleep(0.01)
+
+        async def body():
+            ticks, stop = [], asyncio.Event()
+            task = asyncio.ensure_future(ticker(ticks, stop))
+            async with TempDirCont.AsyncTempDirectoryContext(root=self.root, keep_max=0) as tmp:
+                for i in range(200):
+                    with open(os.path.join(tmp, "file{}.txt".format(i)), "w") as fd:
+                        fd.write("This is a testing file")
+                start = len(ticks)
+            stop.set()
+            await task
+            return len(ticks) - start
+
+        with mock.patch.object(TDC_MODULE, "remove_tree", side_effect=slow_remove):
+            ticks = run(body())
+        self.assertGreater(ticks, 5)
+        self.assertEqual(self.historic(), [])
+
+    def test_00_020_cancelled_enter(self):
+        """Async - a directory created by a cancelled entry is not leaked"""
+        real_make = TempDirCont.TempDirectoryContext._make_directory
+
+        def slow_make(ctx):
+            time.sleep(0.2)
+            return real_make(ctx)
+
+        async def enter():
+            async with TempDirCont.AsyncTempDirectoryContext(root=self.root):
+                self.fail("Entry should have been cancelled")
+
+        async def body():
+            task = asyncio.ensure_future(enter())
+            await asyncio.sleep(0.05)
+            task.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await task
+            # Let the executor finish creating (and then discarding) the directory
+            await asyncio.sleep(0.5)
+
+        with mock.patch.object(TempDirCont.TempDirectoryContext, "_make_directory", slow_make):
+            run(body())
+        self.assertEqual(self.historic(), [])
+
+
+# noinspection PyUnusedLocal
+def load_tests(loader, tests=None, pattern=None):
+    """Test loading - load test cases from each Class"""
+    classes = [Test00Async]
+    suite = unittest.TestSuite()
+    for test_class in classes:
+        tests = loader.loadTestsFromTestCase(test_class)
+        suite.addTests(tests)
+    return suite
+
+
+if __name__ == '__main__':
+    ldr = unittest.TestLoader()
+
+    test_suite = load_tests(ldr)
+
+    unittest.TextTestRunner(verbosity=2).run(test_suite)
@@ -0,0 +1,118 @@
+#!/usr/bin/env python
+"""
+# TempDirectoryContext : Test Suite for test_TempDirectoryPool.py
+
+Summary :
+    Testing a warm pool of pre-created temporary directories
+Use Case :
+    As an application which runs thousands of short tasks I want each temporary directory to be ready
+    immediately so that directory creation isn't on my critical path
+
+Testable Statements :
+    Can I create a pool of directories
+    Does a context manager from the pool use a pre-created directory
+    Are pooled directories named, and retained, as TempDirectoryContext directories are
+    Are unused directories removed when the pool is closed
+"""
+
+import unittest
+import os.path
+import shutil
+import tempfile
+import time
+
+import TempDirectoryContext as TempDirCont
+
+__version__ = "0.1"
+__author__ = 'Tony Flury : anthony.flury@btinternet.com'
+__created__ = '16 Oct 2026'
+
+
+def wait_for(condition, timeout=5):
+    """Poll until condition() is True - the pool is refilled in the background"""
+    deadline = time.time() + timeout
+    while not condition() and time.time() < deadline:
+        time.sleep(0.01)
+    return condition()
+
+
+class Test00Pool(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    def historic(self):
+        return sorted(os.path.join(self.root, name) for name in os.listdir(self.root)
+                      if name.startswith("tmp") and name.endswith("TempDirCont"))
+
+    def test_00_001_prefilled(self):
+        """Pool - the pool is filled in the background, without creating historic directories"""
+        with TempDirCont.TempDirectoryPool(size=4, root=self.root) as pool:
+            self.assertEqual(wait_for(lambda: pool.available == 4), True)
+            self.assertEqual(self.historic(), [])
+
+    def test_00_002_context_uses_pool(self):
+        """Pool - a context manager takes a directory from the pool, named as TempDirectoryContext names them"""
+        with TempDirCont.TempDirectoryPool(size=2, root=self.root) as pool:
+            wait_for(lambda: pool.available == 2)
+            with pool.context() as tmp:
+                self.assertEqual(os.path.isdir(tmp), True)
+                self.assertEqual(os.path.dirname(tmp), self.root)
+                self.assertEqual(os.path.basename(tmp).startswith("tmp"), True)
+                self.assertEqual(os.path.basename(tmp).endswith("TempDirCont"), True)
+                self.assertEqual(os.listdir(tmp), [])
+            self.assertEqual(wait_for(lambda: pool.available == 2), True)
+
+    def test_00_003_retention(self):
+        """Pool - directories from the pool are retained as with TempDirectoryContext"""
+        td = []
+        with TempDirCont.TempDirectoryPool(size=2, root=self.root, keep_max=2) as pool:
+            for i in range(4):
+                with pool.context() as tmp:
+                    td.append(tmp)
+        self.assertEqual(list(map(os.path.exists, td)), [False, False, True, True])
+
+    def test_00_004_empty_pool(self):
+        """Pool - an exhausted pool falls back to creating the directory"""
+        with TempDirCont.TempDirectoryPool(size=0, root=self.root, keep_max=0) as pool:
+            with pool.context() as tmp:
+                self.assertEqual(os.path.isdir(tmp), True)
+
+    def test_00_005_spares_not_historic(self):
+        """Pool - spare directories are never evicted as historic directories"""
+        with TempDirCont.TempDirectoryPool(size=2, root=self.root) as pool:
+            wait_for(lambda: pool.available == 2)
+            with TempDirCont.TempDirectoryContext(root=self.root, keep_max=0):
+                pass
+            with pool.context() as tmp:
+                self.assertEqual(os.path.isdir(tmp), True)
+
+    def test_00_010_close(self):
+        """Pool - closing the pool removes unused directories"""
+        pool = TempDirCont.TempDirectoryPool(size=3, root=self.root)
+        wait_for(lambda: pool.available == 3)
+        pool.close()
+        self.assertEqual(os.listdir(self.root), [])
+        with self.assertRaises(ValueError):
+            pool.acquire()
+
+
+# noinspection PyUnusedLocal
+def load_tests(loader, tests=None, pattern=None):
+    """Test loading - load test cases from each Class"""
+    classes = [Test00Pool]
+    suite = unittest.TestSuite()
+    for test_class in classes:
+        tests = loader.loadTestsFromTestCase(test_class)
+        suite.addTests(tests)
+    return suite
+
+
+if __name__ == '__main__':
+    ldr = unittest.TestLoader()
+
+    test_suite = load_tests(ldr)
+
+    unittest.TextTestRunner(verbosity=2).run(test_suite)
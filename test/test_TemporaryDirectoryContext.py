@@ -13,10 +13,32 @@ Testable Statements :
 """
 
 import unittest
+import errno
+import gc
+import multiprocessing
+import threading
 import os.path
+import shutil
+import socket
+import subprocess
+import sys
 import tempfile
+import time
+import weakref
+from unittest import mock
+
 import TempDirectoryContext as TempDirCont
 
+# The module itself - before Python 3.8 mock resolves "TempDirectoryContext.TempDirectoryContext" to the class of the
+# same name which the package exports, so the module's globals are patched through this instead
+TDC_MODULE = sys.modules["TempDirectoryContext.TempDirectoryContext"]
+
+try:
+    from TempDirectoryContext import pytest_plugin
+except ImportError:
+    # pytest isn't installed
+    pytest_plugin = None
+
 __version__ = "0.1"
 __author__ = 'Tony Flury : anthony.flury@btinternet.com'
 __created__ = '25 Aug 2015'
@@ -177,10 +199,1657 @@ class Test02Concurrent(unittest.TestCase):
         self.assertEqual(os.path.exists(outer), False)
 
 
+class Test03AsyncDelete(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+
+    def tearDown(self):
+        TempDirCont.TempDirectoryContext.flush()
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    def test_03_001_async_delete(self):
+        """Asynchronous deletion - historic directory is gone once the queue is flushed"""
+        with TempDirCont.TempDirectoryContext(root=self.root, keep_max=0, async_delete=True) as tmp:
+            with open(os.path.join(tmp, "testing.txt"), "w") as fd:
+                fd.write("This is a testing file")
+
+        self.assertEqual(TempDirCont.TempDirectoryContext.flush(), [])
+        self.assertEqual(os.path.exists(tmp), False)
+
+    def test_03_002_async_keep_max(self):
+        """Asynchronous deletion - retention is the same as synchronous deletion"""
+        td = []
+        for i in range(4):
+            with TempDirCont.TempDirectoryContext(root=self.root, async_delete=True) as tmp:
+                td.append(tmp)
+
+        TempDirCont.TempDirectoryContext.wait()
+        self.assertEqual(list(map(os.path.exists, td)), [False, True, True, True])
+
+    def test_03_010_async_failure_reported(self):
+        """Asynchronous deletion - failures are passed to on_error and returned by flush"""
+        errors = []
+        failure = OSError(errno.EACCES, "Permission denied")
+        with mock.patch("TempDirectoryContext._reclaim.remove_tree", side_effect=failure):
+            with TempDirCont.TempDirectoryContext(root=self.root, keep_max=0, async_delete=True,
+                                                  on_error=lambda path, exc: errors.append((path, exc))) as tmp:
+                pass
+            failures = TempDirCont.TempDirectoryContext.flush()
+
+        self.assertEqual(failures, [(tmp, failure)])
+        self.assertEqual(errors, [(tmp, failure)])
+
+    def test_03_011_sync_failure_reported(self):
+        """Synchronous deletion - a failure is reported and later directories are still deleted"""
+        errors = []
+        td = []
+        for i in range(2):
+            with TempDirCont.TempDirectoryContext(root=self.root, delete_historic=False) as tmp:
+                td.append(tmp)
+
+        real_remove = TempDirCont._reclaim.remove_tree
+
+        def remove(path, **kwargs):
+            if path == td[0]:
+                raise OSError(errno.EACCES, "Permission denied")
+            real_remove(path, **kwargs)
+
+        with mock.patch.object(TDC_MODULE, "remove_tree", side_effect=remove):
+            with TempDirCont.TempDirectoryContext(root=self.root, keep_max=0,
+                                                  on_error=lambda path, exc: errors.append(path)) as tmp:
+                td.append(tmp)
+
+        self.assertEqual(errors, [td[0]])
+        self.assertEqual(list(map(os.path.exists, td)), [True, False, False])
+
+
+class Test04TrashEviction(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.trash = os.path.join(self.root, TempDirCont.TRASH_NAME)
+
+    def tearDown(self):
+        TempDirCont.TempDirectoryContext.flush()
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    def test_04_001_trash_eviction(self):
+        """Trash eviction - the evicted directory is renamed out of the way and then purged"""
+        with TempDirCont.TempDirectoryContext(root=self.root, keep_max=0, evict="trash") as tmp:
+            os.makedirs(os.path.join(tmp, "a", "b"))
+
+        self.assertEqual(os.path.exists(tmp), False)
+        self.assertEqual(TempDirCont.TempDirectoryContext.flush(), [])
+        self.assertEqual(os.listdir(self.trash), [])
+
+    def test_04_002_trash_keep_max(self):
+        """Trash eviction - retention is the same as synchronous deletion"""
+        td = []
+        for i in range(4):
+            with TempDirCont.TempDirectoryContext(root=self.root, evict="trash") as tmp:
+                td.append(tmp)
+        self.assertEqual(list(map(os.path.exists, td)), [False, True, True, True])
+
+    def test_04_003_trash_not_historic(self):
+        """Trash eviction - the trash directory is never treated as an historic directory"""
+        os.mkdir(self.trash)
+        with TempDirCont.TempDirectoryContext(root=self.root, prefix="", suffix="", keep_max=0):
+            pass
+        self.assertEqual(os.path.exists(self.trash), True)
+
+    def test_04_010_explicit_purge(self):
+        """Explicit purge - trash entries are deleted in batches"""
+        os.mkdir(self.trash)
+        for i in range(5):
+            os.makedirs(os.path.join(self.trash, "entry{}".format(i), "sub"))
+
+        self.assertEqual(TempDirCont.TempDirectoryContext.purge(root=self.root, batch=2), 2)
+        self.assertEqual(len(os.listdir(self.trash)), 3)
+        self.assertEqual(TempDirCont.TempDirectoryContext.purge(root=self.root), 3)
+        self.assertEqual(os.listdir(self.trash), [])
+
+    def test_04_020_invalid_evict(self):
+        """Invalid eviction strategy is rejected"""
+        with self.assertRaises(ValueError):
+            TempDirCont.TempDirectoryContext(root=self.root, evict="shred")
+
+
+class Test05HistoricScan(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    def test_05_001_only_matching_directories(self):
+        """Historic scan - only directories with a matching name are found"""
+        wanted = os.path.join(self.root, "tmpAAATempDirCont")
+        os.mkdir(wanted)
+        os.mkdir(os.path.join(self.root, "otherTempDirCont"))
+        open(os.path.join(self.root, "tmpFileTempDirCont"), "w").close()
+        os.symlink(wanted, os.path.join(self.root, "tmpLinkTempDirCont"))
+
+        self.assertEqual(TempDirCont._scan.scan_historic(self.root, "tmp", "TempDirCont"), [wanted])
+
+    def test_05_002_oldest_first(self):
+        """Historic scan - directories are returned oldest first"""
+        paths = []
+        for i in range(6):
+            path = os.path.join(self.root, "tmp{}TempDirCont".format(i))
+            os.mkdir(path)
+            paths.append(path)
+        # Force distinct creation times (ctime ordering) in a known order
+        entries = [(float(i), path) for i, path in enumerate(reversed(paths))]
+
+        with mock.patch("TempDirectoryContext._scan.iter_historic", return_value=entries):
+            self.assertEqual(TempDirCont._scan.scan_historic(self.root, "tmp", "TempDirCont"), list(reversed(paths)))
+
+    def test_05_010_constructor_uses_scan(self):
+        """Historic scan - historic directories are evicted oldest first"""
+        old = os.path.join(self.root, "tmpOldTempDirCont")
+        os.mkdir(old)
+        with TempDirCont.TempDirectoryContext(root=self.root, keep_max=1) as tmp:
+            pass
+        self.assertEqual(os.path.exists(old), False)
+        self.assertEqual(os.path.exists(tmp), True)
+
+    def test_05_011_scan_queued_first(self):
+        """Historic scan - directories found by a later scan are evicted before those this process released"""
+        old = []
+        for i in range(3):
+            old.append(os.path.join(self.root, "tmpOld{}TempDirCont".format(i)))
+            os.mkdir(old[-1])
+            time.sleep(0.01)
+        with TempDirCont.TempDirectoryContext(root=self.root, delete_historic=False) as released:
+            pass
+        with TempDirCont.TempDirectoryContext(root=self.root, keep_max=3) as tmp:
+            pass
+        self.assertEqual(list(map(os.path.exists, old + [released, tmp])), [False, False, True, True, True])
+
+
+def forget(root):
+    """Drop the in-process delete queues for a root - as if this is a new process"""
+    registry = TempDirCont.TempDirectoryContext._registry
+    # A sharded key's root is its namespace, within the root
+    for key in [key for key in registry.keys() if root in (key[0], os.path.dirname(key[0]))]:
+        registry.discard(key)
+
+
+class Test06Manifest(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.manifest = TempDirCont._manifest.manifest_path(self.root, "tmp", "TempDirCont")
+
+    def tearDown(self):
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    def test_06_001_manifest_written(self):
+        """Manifest - written after the first scan, and records creation and deletion"""
+        td = []
+        for i in range(2):
+            with TempDirCont.TempDirectoryContext(root=self.root, keep_max=1, manifest=True) as tmp:
+                td.append(tmp)
+
+        self.assertEqual(os.path.isfile(self.manifest), True)
+        self.assertEqual(TempDirCont._manifest.Manifest(self.root, "tmp", "TempDirCont").load(), td[1:])
+
+    def test_06_002_manifest_avoids_scan(self):
+        """Manifest - a new process loads the delete queue from the manifest rather than scanning"""
+        td = []
+        for i in range(3):
+            with TempDirCont.TempDirectoryContext(root=self.root, manifest=True) as tmp:
+                td.append(tmp)
+        forget(self.root)
+
+        with mock.patch.object(TDC_MODULE, "scan_historic") as scan:
+            with TempDirCont.TempDirectoryContext(root=self.root, manifest=True) as tmp:
+                td.append(tmp)
+        self.assertEqual(scan.called, False)
+        self.assertEqual(list(map(os.path.exists, td)), [False, True, True, True])
+
+    def test_06_003_stale_manifest_rescan(self):
+        """Manifest - a directory removed behind the manifest's back forces a rescan"""
+        td = []
+        for i in range(3):
+            with TempDirCont.TempDirectoryContext(root=self.root, manifest=True) as tmp:
+                td.append(tmp)
+        forget(self.root)
+        shutil.rmtree(td[0])
+        other = os.path.join(self.root, "tmpUnrecordedTempDirCont")
+        os.mkdir(other)
+
+        with TempDirCont.TempDirectoryContext(root=self.root, keep_max=0, manifest=True) as tmp:
+            pass
+        self.assertEqual(list(map(os.path.exists, td + [other, tmp])), [False] * 5)
+
+    def test_06_004_damaged_manifest(self):
+        """Manifest - a damaged manifest is ignored"""
+        with open(self.manifest, "w") as fd:
+            fd.write("Not a manifest")
+        self.assertEqual(TempDirCont._manifest.Manifest(self.root, "tmp", "TempDirCont").load(), None)
+
+    def test_06_005_lock_excludes_threads(self):
+        """Manifest - the lock is re-entrant for the thread holding it, but excludes other threads"""
+        manifest = TempDirCont._manifest.Manifest(self.root, "tmp", "TempDirCont")
+        entered = threading.Event()
+
+        def other():
+            with manifest.lock():
+                entered.set()
+
+        with manifest.lock():
+            with manifest.lock():
+                pass
+            worker = threading.Thread(target=other)
+            worker.start()
+            self.assertEqual(entered.wait(0.2), False)
+        worker.join(5)
+        self.assertEqual(entered.is_set(), True)
+
+    def test_06_006_foreign_names(self):
+        """Manifest - a manifest naming a path, or a directory without the prefix and suffix, is stale"""
+        victim = tempfile.mkdtemp(suffix="TempDirCont")
+        self.addCleanup(shutil.rmtree, victim, ignore_errors=True)
+        name = os.path.relpath(victim, self.root)
+        with open(TempDirCont._manifest.manifest_path(self.root, "", "TempDirCont"), "w") as fd:
+            fd.write("{}C 0.0 {}\nR {}\n".format(TempDirCont._manifest.HEADER, name, name))
+        with TempDirCont.TempDirectoryContext(root=self.root, prefix="", keep_max=0, manifest=True):
+            pass
+        self.assertEqual(os.path.isdir(victim), True)
+
+        os.mkdir(os.path.join(self.root, "otherTempDirCont"))
+        with open(self.manifest, "w") as fd:
+            fd.write("{}C 0.0 otherTempDirCont\n".format(TempDirCont._manifest.HEADER))
+        self.assertEqual(TempDirCont._manifest.Manifest(self.root, "tmp", "TempDirCont").load(), None)
+
+    @unittest.skipUnless(hasattr(os, "O_NOFOLLOW"), "Requires POSIX permissions")
+    def test_06_007_not_private(self):
+        """Manifest - a manifest or lock file writable by others, or reached through a symbolic link, is refused"""
+        manifest = TempDirCont._manifest.Manifest(self.root, "tmp", "TempDirCont")
+        manifest.rewrite([])
+        self.assertEqual(manifest.load(), [])
+        os.chmod(self.manifest, 0o666)
+        self.assertEqual(manifest.load(), None)
+        with self.assertRaises(OSError):
+            manifest.deleted("tmpgoneTempDirCont")
+
+        os.unlink(self.manifest)
+        target = os.path.join(self.root, "target")
+        manifest.rewrite([])
+        os.rename(self.manifest, target)
+        os.symlink(target, self.manifest)
+        self.assertEqual(manifest.load(), None)
+
+        os.symlink(target, self.manifest + ".lock")
+        with self.assertRaises(OSError):
+            with manifest.lock():
+                pass
+
+    def test_06_008_written_on_first_use(self):
+        """Manifest - written before the first directory is created, even when historic directories aren't loaded"""
+        with TempDirCont.TempDirectoryContext(root=self.root, delete_historic=False, manifest=True) as tmp:
+            pass
+        self.assertEqual(TempDirCont._manifest.Manifest(self.root, "tmp", "TempDirCont").load(), [tmp])
+
+
+def shared_worker(root, count):
+    """Process body for the shared retention tests - create and release count directories"""
+    for i in range(count):
+        with TempDirCont.TempDirectoryContext(root=root, keep_max=2, shared=True) as tmp:
+            with open(os.path.join(tmp, "testing.txt"), "w") as fd:
+                fd.write("This is a testing file")
+
+
+class Test07SharedRetention(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.manifest = TempDirCont._manifest.manifest_path(self.root, "tmp", "TempDirCont")
+
+    def tearDown(self):
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    def historic(self):
+        return [name for name in os.listdir(self.root) if name.startswith("tmp") and name.endswith("TempDirCont")]
+
+    def test_07_001_shared_keep_max(self):
+        """Shared retention - keep_max applies across the process"""
+        td = []
+        for i in range(4):
+            with TempDirCont.TempDirectoryContext(root=self.root, keep_max=2, shared=True) as tmp:
+                td.append(tmp)
+        self.assertEqual(list(map(os.path.exists, td)), [False, False, True, True])
+
+    def test_07_002_in_use_not_evicted(self):
+        """Shared retention - a directory in use by another context manager is never evicted"""
+        with TempDirCont.TempDirectoryContext(root=self.root, keep_max=0, shared=True) as outer:
+            with TempDirCont.TempDirectoryContext(root=self.root, keep_max=0, shared=True) as inner:
+                pass
+            self.assertEqual(os.path.exists(inner), False)
+            self.assertEqual(os.path.exists(outer), True)
+        self.assertEqual(os.path.exists(outer), False)
+
+    def test_07_010_shared_across_processes(self):
+        """Shared retention - keep_max holds across processes, and each directory is deleted once"""
+        workers = [multiprocessing.Process(target=shared_worker, args=(self.root, 10)) for i in range(4)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        self.assertEqual([worker.exitcode for worker in workers], [0] * 4)
+
+        self.assertEqual(len(self.historic()), 2)
+        with open(self.manifest) as fd:
+            deleted = [line.split()[1] for line in fd if line.startswith("D ")]
+        self.assertEqual(len(deleted), len(set(deleted)))
+
+    def test_07_020_no_locking(self):
+        """Shared retention - rejected without file locking"""
+        with mock.patch.object(TDC_MODULE, "fcntl", None):
+            with self.assertRaises(RuntimeError):
+                TempDirCont.TempDirectoryContext(root=self.root, shared=True)
+
+
+class Test08ThreadSafety(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.errors = []
+
+    def tearDown(self):
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    def hammer(self, barrier, prefix, count):
+        barrier.wait()
+        for i in range(count):
+            with TempDirCont.TempDirectoryContext(root=self.root, prefix=prefix, keep_max=3,
+                                                  on_error=lambda path, exc: self.errors.append(path)) as tmp:
+                with open(os.path.join(tmp, "testing.txt"), "w") as fd:
+                    fd.write("This is a testing file")
+
+    def run_threads(self, prefixes, threads=16, count=25):
+        barrier = threading.Barrier(threads)
+        workers = [threading.Thread(target=self.hammer, args=(barrier, prefixes[i % len(prefixes)], count))
+                   for i in range(threads)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+
+    def historic(self, prefix):
+        return [name for name in os.listdir(self.root) if name.startswith(prefix) and name.endswith("TempDirCont")]
+
+    def test_08_001_one_key(self):
+        """Thread safety - many threads on one key keep exactly keep_max directories"""
+        self.run_threads(["tmp"])
+        self.assertEqual(self.errors, [])
+        self.assertEqual(len(self.historic("tmp")), 3)
+        self.assertEqual(len(TempDirCont.TempDirectoryContext._registry.queue((self.root, "TempDirCont", "tmp"))), 3)
+
+    def test_08_002_many_keys(self):
+        """Thread safety - many threads across several keys keep exactly keep_max directories per key"""
+        prefixes = ["a", "b", "c", "d"]
+        self.run_threads(prefixes)
+        self.assertEqual(self.errors, [])
+        self.assertEqual([len(self.historic(prefix)) for prefix in prefixes], [3] * 4)
+
+    def test_08_003_single_scan(self):
+        """Thread safety - threads racing to create the first context manager for a key scan once"""
+        os.mkdir(os.path.join(self.root, "tmpOldTempDirCont"))
+        scans = []
+        real_scan = TempDirCont._scan.scan_historic
+
+        def scan(*args, **kwargs):
+            scans.append(args)
+            return real_scan(*args, **kwargs)
+
+        barrier = threading.Barrier(8)
+
+        def create():
+            barrier.wait()
+            TempDirCont.TempDirectoryContext(root=self.root)
+
+        with mock.patch.object(TDC_MODULE, "scan_historic", side_effect=scan):
+            workers = [threading.Thread(target=create) for i in range(8)]
+            for worker in workers:
+                worker.start()
+            for worker in workers:
+                worker.join()
+        self.assertEqual(len(scans), 1)
+
+    def test_08_004_load_under_manifest_lock(self):
+        """Thread safety - a scan waiting for the manifest lock doesn't block a context manager holding it"""
+        # Written up front, so the holder doesn't scan before creating its directory
+        TempDirCont._manifest.Manifest(self.root, "tmp", "TempDirCont").rewrite([])
+        holder = TempDirCont.TempDirectoryContext(root=self.root, manifest=True, delete_historic=False)
+        locked, loading = threading.Event(), threading.Event()
+        real_find = TempDirCont.TempDirectoryContext._find_historic
+        real_acquire = holder._acquire
+
+        def find(ctx, released_only=False):
+            # Scan once the manifest is locked - the scan has to wait for the lock
+            locked.wait(5)
+            loading.set()
+            return real_find(ctx, released_only)
+
+        def acquire():
+            # The manifest is locked - wait for the other thread's scan to start before touching the registry
+            locked.set()
+            loading.wait(5)
+            return real_acquire()
+
+        def use_holder():
+            with holder:
+                pass
+
+        def create():
+            TempDirCont.TempDirectoryContext(root=self.root, manifest=True)
+
+        with mock.patch.object(TempDirCont.TempDirectoryContext, "_find_historic", find), \
+                mock.patch.object(holder, "_acquire", acquire):
+            workers = [threading.Thread(target=use_holder), threading.Thread(target=create)]
+            for worker in workers:
+                worker.daemon = True
+                worker.start()
+            for worker in workers:
+                worker.join(10)
+        self.assertFalse(any(worker.is_alive() for worker in workers))
+
+
+class Test09Recycle(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    def test_09_001_recycled(self):
+        """Recycling - the directory is emptied and reused by the next context manager"""
+        with TempDirCont.TempDirectoryContext(root=self.root, recycle=True) as first:
+            os.makedirs(os.path.join(first, "a", "b"))
+            with open(os.path.join(first, "testing.txt"), "w") as fd:
+                fd.write("This is a testing file")
+
+        self.assertEqual(os.listdir(first), [])
+
+        with TempDirCont.TempDirectoryContext(root=self.root, recycle=True) as second:
+            self.assertEqual(second, first)
+
+    def test_09_002_skeleton(self):
+        """Recycling - skeleton sub-directories are kept, but emptied"""
+        with TempDirCont.TempDirectoryContext(root=self.root, recycle=True, skeleton=["src", "build/obj"]) as tmp:
+            os.makedirs(os.path.join(tmp, "src", "pkg"))
+            os.makedirs(os.path.join(tmp, "build", "obj"))
+            os.makedirs(os.path.join(tmp, "other"))
+            open(os.path.join(tmp, "build", "obj", "main.o"), "w").close()
+
+        found = sorted(os.path.relpath(os.path.join(path, name), tmp)
+                       for path, dirs, files in os.walk(tmp) for name in dirs + files)
+        self.assertEqual(found, ["build", os.path.join("build", "obj"), "src"])
+
+        with TempDirCont.TempDirectoryContext(root=self.root, recycle=True, skeleton=["src", "build/obj"]) as again:
+            self.assertEqual(again, tmp)
+
+    def test_09_003_tampered(self):
+        """Recycling - a recycled directory which has been changed is never reused"""
+        with TempDirCont.TempDirectoryContext(root=self.root, recycle=True) as first:
+            pass
+        open(os.path.join(first, "intruder.txt"), "w").close()
+
+        with TempDirCont.TempDirectoryContext(root=self.root, recycle=True) as second:
+            self.assertNotEqual(second, first)
+            self.assertEqual(os.listdir(second), [])
+        self.assertEqual(os.path.exists(first), False)
+
+    def test_09_004_not_retained(self):
+        """Recycling - a recycled directory doesn't count towards keep_max"""
+        with TempDirCont.TempDirectoryContext(root=self.root, keep_max=0) as old:
+            pass
+        with TempDirCont.TempDirectoryContext(root=self.root, keep_max=1, delete_historic=False) as kept:
+            pass
+        with TempDirCont.TempDirectoryContext(root=self.root, keep_max=1, recycle=True) as tmp:
+            pass
+        self.assertEqual(list(map(os.path.exists, [old, kept, tmp])), [False, True, True])
+
+    def test_09_010_invalid_skeleton(self):
+        """Recycling - skeleton paths must stay within the directory"""
+        for path in ["/etc", "../escape"]:
+            with self.assertRaises(ValueError):
+                TempDirCont.TempDirectoryContext(root=self.root, recycle=True, skeleton=[path])
+
+
+class Test10ParallelDelete(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.outside = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.root, ignore_errors=True)
+        shutil.rmtree(self.outside, ignore_errors=True)
+
+    def populate(self, top, width=3, depth=3, files=4):
+        for i in range(files):
+            with open(os.path.join(top, "file{}.txt".format(i)), "w") as fd:
+                fd.write("This is a testing file")
+        if depth:
+            for i in range(width):
+                sub = os.path.join(top, "dir{}".format(i))
+                os.mkdir(sub)
+                self.populate(sub, width, depth - 1, files)
+
+    def test_10_001_deletes_tree(self):
+        """Parallel delete - the whole tree is deleted, for any number of workers"""
+        for workers in (1, 2, 4, 64):
+            tree = os.path.join(self.root, "tree{}".format(workers))
+            os.mkdir(tree)
+            self.populate(tree)
+            TempDirCont._rmtree.parallel_rmtree(tree, workers=workers)
+            self.assertEqual(os.path.exists(tree), False)
+
+    def test_10_002_symlinks_not_followed(self):
+        """Parallel delete - symbolic links in the tree are removed, never followed"""
+        precious = os.path.join(self.outside, "precious.txt")
+        open(precious, "w").close()
+        tree = os.path.join(self.root, "tree")
+        os.mkdir(tree)
+        self.populate(tree, depth=2)
+        os.symlink(self.outside, os.path.join(tree, "dir0", "link"))
+        os.symlink(precious, os.path.join(tree, "file_link"))
+
+        TempDirCont._rmtree.parallel_rmtree(tree, workers=4)
+        self.assertEqual(os.path.exists(tree), False)
+        self.assertEqual(os.path.exists(precious), True)
+
+    def test_10_003_symlink_root(self):
+        """Parallel delete - as shutil.rmtree, a symbolic link can't be deleted as a tree"""
+        link = os.path.join(self.root, "link")
+        os.symlink(self.outside, link)
+        with self.assertRaises(OSError):
+            TempDirCont._rmtree.parallel_rmtree(link)
+        self.assertEqual(os.path.isdir(self.outside), True)
+
+    def test_10_004_missing(self):
+        """Parallel delete - as shutil.rmtree, a missing tree raises FileNotFoundError, or calls onerror"""
+        missing = os.path.join(self.root, "missing")
+        with self.assertRaises(OSError) as cm:
+            TempDirCont._rmtree.parallel_rmtree(missing)
+        self.assertEqual(cm.exception.errno, errno.ENOENT)
+
+        errors = []
+        TempDirCont._rmtree.parallel_rmtree(missing, onerror=lambda func, path, exc_info: errors.append(path))
+        self.assertEqual(errors, [missing])
+
+    def test_10_010_context_engine(self):
+        """Parallel delete - used by the context manager to delete historic directories"""
+        with TempDirCont.TempDirectoryContext(root=self.root, keep_max=0, delete_engine="parallel") as tmp:
+            self.populate(tmp)
+        self.assertEqual(os.path.exists(tmp), False)
+
+        with self.assertRaises(ValueError):
+            TempDirCont.TempDirectoryContext(root=self.root, delete_engine="shred")
+
+
+class Test11RetentionPolicies(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    def fill(self, path, size):
+        with open(os.path.join(path, "data.bin"), "wb") as fd:
+            fd.write(b"x" * size)
+
+    def test_11_001_max_total_bytes(self):
+        """Retention - the oldest directories are evicted until the total size is within the limit"""
+        made = []
+        for size in (64 * 1024, 64 * 1024, 256 * 1024):
+            with TempDirCont.TempDirectoryContext(root=self.root, keep_max=10, max_total_bytes=300 * 1024) as tmp:
+                self.fill(tmp, size)
+            made.append(tmp)
+        self.assertEqual([os.path.exists(path) for path in made], [False, False, True])
+
+    def test_11_002_max_age(self):
+        """Retention - directories released more than max_age seconds ago are evicted"""
+        with mock.patch.object(TDC_MODULE.time, "time", return_value=1000.0):
+            with TempDirCont.TempDirectoryContext(root=self.root, keep_max=10, max_age=60) as old:
+                pass
+        with TempDirCont.TempDirectoryContext(root=self.root, keep_max=10, max_age=60) as new:
+            pass
+        self.assertEqual(os.path.exists(old), False)
+        self.assertEqual(os.path.exists(new), True)
+
+    def test_11_003_lru(self):
+        """Retention - with order="lru" the least recently used directory is evicted, not the oldest"""
+        made = []
+        for i in range(3):
+            with TempDirCont.TempDirectoryContext(root=self.root, keep_max=3, order="lru") as tmp:
+                pass
+            os.utime(tmp, (1000.0 * (i + 1), 1000.0 * (i + 1)))
+            made.append(tmp)
+
+        # Use the oldest directory again - the second is now least recently used
+        os.utime(made[0], None)
+        with TempDirCont.TempDirectoryContext(root=self.root, keep_max=3, order="lru") as tmp:
+            pass
+        self.assertEqual([os.path.exists(path) for path in made + [tmp]], [True, False, True, True])
+
+        with self.assertRaises(ValueError):
+            TempDirCont.TempDirectoryContext(root=self.root, order="random")
+
+    def test_11_004_custom_policy(self):
+        """Retention - any RetentionPolicy can be added, and applies alongside keep_max"""
+        class KeepMarked(TempDirCont.RetentionPolicy):
+            def victims(self, entries, now):
+                return [entry for entry in entries if not os.path.exists(os.path.join(entry.path, "keep"))]
+
+        made = []
+        for keep in (False, True, False):
+            with TempDirCont.TempDirectoryContext(root=self.root, keep_max=2, retention=[KeepMarked()]) as tmp:
+                if keep:
+                    open(os.path.join(tmp, "keep"), "w").close()
+            made.append(tmp)
+        self.assertEqual([os.path.exists(path) for path in made], [False, True, False])
+
+        # keep_max still applies to the directories the custom policy would keep
+        for i in range(3):
+            with TempDirCont.TempDirectoryContext(root=self.root, keep_max=1, retention=[KeepMarked()]) as tmp:
+                open(os.path.join(tmp, "keep"), "w").close()
+        self.assertEqual(len([name for name in os.listdir(self.root) if name.endswith("TempDirCont")]), 1)
+
+
+class Test12Janitor(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        # The janitor sweeps every key - so start without the queues left by other tests
+        registry = TempDirCont.TempDirectoryContext._registry
+        for key in registry.keys():
+            registry.discard(key)
+
+    def tearDown(self):
+        TempDirCont.TempDirectoryContext.stop_janitor()
+        forget(self.root)
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    def test_12_001_sweep_expires(self):
+        """Janitor - directories past the ttl are evicted without another context manager exit"""
+        with TempDirCont.TempDirectoryContext(root=self.root, keep_max=10) as tmp:
+            pass
+        janitor = TempDirCont.TempDirectoryContext._janitor
+        self.assertEqual(janitor.sweep(ttl=60), 0)
+        self.assertEqual(os.path.exists(tmp), True)
+
+        self.assertEqual(janitor.sweep(ttl=60, now=time.time() + 120), 1)
+        self.assertEqual(os.path.exists(tmp), False)
+
+    def test_12_002_max_age_and_batch(self):
+        """Janitor - without a ttl each key's max_age is used, and a sweep evicts at most batch directories"""
+        made = []
+        for i in range(3):
+            with TempDirCont.TempDirectoryContext(root=self.root, keep_max=10, max_age=60) as tmp:
+                made.append(tmp)
+        with TempDirCont.TempDirectoryContext(root=self.root, prefix="other", keep_max=10) as other:
+            pass
+
+        janitor = TempDirCont.TempDirectoryContext._janitor
+        later = time.time() + 120
+        self.assertEqual(janitor.sweep(batch=2, now=later), 2)
+        self.assertEqual(janitor.sweep(batch=2, now=later), 1)
+        self.assertEqual([os.path.exists(path) for path in made], [False, False, False])
+        self.assertEqual(os.path.exists(other), True)
+
+    def test_12_003_thread(self):
+        """Janitor - the background thread sweeps on its schedule, and can be stopped and restarted"""
+        with TempDirCont.TempDirectoryContext(root=self.root, keep_max=10) as tmp:
+            pass
+        TempDirCont.TempDirectoryContext.start_janitor(interval=0.05, ttl=0)
+        self.assertEqual(TempDirCont.TempDirectoryContext._janitor.running, True)
+        deadline = time.time() + 5
+        while os.path.exists(tmp) and time.time() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(os.path.exists(tmp), False)
+
+        TempDirCont.TempDirectoryContext.stop_janitor()
+        self.assertEqual(TempDirCont.TempDirectoryContext._janitor.running, False)
+        TempDirCont.TempDirectoryContext.start_janitor(interval=0.05, ttl=0)
+        self.assertEqual(TempDirCont.TempDirectoryContext._janitor.running, True)
+
+    @unittest.skipUnless(hasattr(os, "fork"), "Requires os.fork")
+    def test_12_004_fork(self):
+        """Janitor - the janitor isn't running in a forked child, and can be started and stopped there"""
+        TempDirCont.TempDirectoryContext.start_janitor(interval=60)
+        pid = os.fork()
+        if pid == 0:
+            try:
+                janitor = TempDirCont.TempDirectoryContext._janitor
+                ok = not janitor.running
+                TempDirCont.TempDirectoryContext.start_janitor(interval=60)
+                ok = ok and janitor.running
+                TempDirCont.TempDirectoryContext.stop_janitor(timeout=5)
+                ok = ok and not janitor.running
+            finally:
+                os._exit(0 if ok else 1)
+        self.assertEqual(os.waitpid(pid, 0)[1], 0)
+        self.assertEqual(TempDirCont.TempDirectoryContext._janitor.running, True)
+
+    def test_12_005_registry_keeps_settings(self):
+        """Janitor - the registry keeps a copy of the settings, not the context manager (or its pool)"""
+        pool = TempDirCont.TempDirectoryPool(size=1, root=self.root)
+        ctx = pool.context(keep_max=10, max_bytes=2 ** 20)
+        with ctx as tmp:
+            pass
+        pool.close()
+        refs = [weakref.ref(ctx), weakref.ref(pool)]
+        del ctx, pool
+        gc.collect()
+        self.assertEqual([ref() for ref in refs], [None, None])
+
+        self.assertEqual(TempDirCont.TempDirectoryContext._janitor.sweep(ttl=60, now=time.time() + 120), 1)
+        self.assertEqual(os.path.exists(tmp), False)
+
+
+class Test13Template(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.template = tempfile.mkdtemp()
+        os.makedirs(os.path.join(self.template, "data", "nested"))
+        with open(os.path.join(self.template, "data", "nested", "fixture.txt"), "w") as fd:
+            fd.write("This is a fixture")
+        self.readonly = os.path.join(self.template, "readonly.txt")
+        with open(self.readonly, "w") as fd:
+            fd.write("This is a read only fixture")
+        os.chmod(self.readonly, 0o444)
+        os.symlink("data", os.path.join(self.template, "link"))
+
+    def tearDown(self):
+        shutil.rmtree(self.root, ignore_errors=True)
+        shutil.rmtree(self.template, ignore_errors=True)
+
+    def check_seeded(self, tmp):
+        with open(os.path.join(tmp, "data", "nested", "fixture.txt")) as fd:
+            self.assertEqual(fd.read(), "This is a fixture")
+        with open(os.path.join(tmp, "readonly.txt")) as fd:
+            self.assertEqual(fd.read(), "This is a read only fixture")
+        self.assertEqual(os.readlink(os.path.join(tmp, "link")), "data")
+
+    def test_13_001_copy(self):
+        """Template - with template_method="copy" every file is copied"""
+        ctx = TempDirCont.TempDirectoryContext(root=self.root, template=self.template, template_method="copy")
+        with ctx as tmp:
+            self.check_seeded(tmp)
+            self.assertEqual(ctx.seed_method, "copy")
+            self.assertNotEqual(os.stat(os.path.join(tmp, "readonly.txt")).st_ino, os.stat(self.readonly).st_ino)
+
+    def test_13_002_hardlink(self):
+        """Template - with template_method="hardlink" files are hard linked to the template"""
+        ctx = TempDirCont.TempDirectoryContext(root=self.root, template=self.template, template_method="hardlink")
+        with ctx as tmp:
+            self.check_seeded(tmp)
+            self.assertEqual(ctx.seed_method, "hardlink")
+            self.assertEqual(os.stat(os.path.join(tmp, "readonly.txt")).st_ino, os.stat(self.readonly).st_ino)
+
+    def test_13_003_auto(self):
+        """Template - by default files are copied where cloning isn't supported - never hard linked"""
+        def unsupported(fd, request, arg):
+            raise OSError(errno.EOPNOTSUPP, "Operation not supported")
+
+        with mock.patch("TempDirectoryContext._template.fcntl.ioctl", side_effect=unsupported):
+            ctx = TempDirCont.TempDirectoryContext(root=self.root, template=self.template)
+            with ctx as tmp:
+                self.check_seeded(tmp)
+                self.assertEqual(ctx.seed_method, "copy")
+                self.assertNotEqual(os.stat(os.path.join(tmp, "readonly.txt")).st_ino, os.stat(self.readonly).st_ino)
+
+    def test_13_004_reflink(self):
+        """Template - files are cloned with FICLONE where the file system supports it"""
+        requests = []
+
+        def clone(fd, request, source_fd):
+            requests.append(request)
+            os.lseek(source_fd, 0, os.SEEK_SET)
+            os.write(fd, os.read(source_fd, 1024))
+
+        with mock.patch("TempDirectoryContext._template.fcntl.ioctl", side_effect=clone):
+            ctx = TempDirCont.TempDirectoryContext(root=self.root, template=self.template)
+            with ctx as tmp:
+                self.check_seeded(tmp)
+                self.assertEqual(ctx.seed_method, "reflink")
+        self.assertEqual(set(requests), {TempDirCont._template.FICLONE})
+
+    def test_13_005_invalid(self):
+        """Template - the template must be a directory, and the method must be known"""
+        with self.assertRaises(ValueError):
+            TempDirCont.TempDirectoryContext(root=self.root, template=os.path.join(self.root, "missing"))
+        with self.assertRaises(ValueError):
+            TempDirCont.TempDirectoryContext(root=self.root, template=self.template, template_method="rsync")
+
+    def test_13_006_auto_clones_first(self):
+        """Template - by default read only files are cloned too, where cloning is supported"""
+        def clone(fd, request, source_fd):
+            os.lseek(source_fd, 0, os.SEEK_SET)
+            os.write(fd, os.read(source_fd, 1024))
+
+        with mock.patch("TempDirectoryContext._template.fcntl.ioctl", side_effect=clone):
+            for method in ("auto", "auto-hardlink"):
+                ctx = TempDirCont.TempDirectoryContext(root=self.root, template=self.template, template_method=method)
+                with ctx as tmp:
+                    self.check_seeded(tmp)
+                    self.assertEqual(ctx.seed_method, "reflink")
+                    self.assertEqual(os.stat(self.readonly).st_nlink, 1)
+
+    def test_13_007_auto_hardlink(self):
+        """Template - with template_method="auto-hardlink" read only files are hard linked where cloning isn't
+        supported, and the rest copied"""
+        def unsupported(fd, request, arg):
+            raise OSError(errno.EOPNOTSUPP, "Operation not supported")
+
+        with mock.patch("TempDirectoryContext._template.fcntl.ioctl", side_effect=unsupported):
+            ctx = TempDirCont.TempDirectoryContext(root=self.root, template=self.template,
+                                                   template_method="auto-hardlink")
+            with ctx as tmp:
+                self.check_seeded(tmp)
+                self.assertEqual(ctx.seed_method, "mixed")
+                fixture = os.path.join(tmp, "data", "nested", "fixture.txt")
+                self.assertEqual(os.stat(fixture).st_nlink, 1)
+                self.assertEqual(os.stat(os.path.join(tmp, "readonly.txt")).st_ino, os.stat(self.readonly).st_ino)
+
+
+class Test14Metrics(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.events = []
+        TempDirCont.metrics.reset()
+        TempDirCont.metrics.subscribe(self.events.append)
+
+    def tearDown(self):
+        TempDirCont.metrics.disable()
+        TempDirCont.metrics.unsubscribe(self.events.append)
+        TempDirCont.metrics.reset()
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    def test_14_001_disabled(self):
+        """Metrics - nothing is recorded unless metrics are enabled"""
+        with TempDirCont.TempDirectoryContext(root=self.root, keep_max=0):
+            pass
+        self.assertEqual(TempDirCont.metrics.counters(), {})
+        self.assertEqual(self.events, [])
+
+    def test_14_002_counters(self):
+        """Metrics - directories created and evicted, and bytes reclaimed, are counted for each key"""
+        TempDirCont.metrics.enable(measure=True)
+        for i in range(3):
+            with TempDirCont.TempDirectoryContext(root=self.root, keep_max=1) as tmp:
+                with open(os.path.join(tmp, "testing.txt"), "wb") as fd:
+                    fd.write(b"x" * 8192)
+
+        key = (self.root, "TempDirCont", "tmp")
+        counters = TempDirCont.metrics.counters(key)
+        self.assertEqual(counters["created"], 3)
+        self.assertEqual(counters["evicted"], 2)
+        self.assertEqual(counters["failed_deletes"], 0)
+        self.assertGreaterEqual(counters["bytes_reclaimed"], 2 * 8192)
+
+        self.assertEqual(TempDirCont.metrics.histogram("create").count, 3)
+        self.assertEqual(TempDirCont.metrics.histogram("evict").count, 2)
+        self.assertEqual(TempDirCont.metrics.histogram("scan").count, 1)
+
+    def test_14_003_events(self):
+        """Metrics - subscribers are given an event for each phase"""
+        TempDirCont.metrics.enable()
+        with TempDirCont.TempDirectoryContext(root=self.root, keep_max=0) as tmp:
+            pass
+        self.assertEqual([event.phase for event in self.events], ["scan", "create", "evict"])
+        self.assertEqual(self.events[-1].path, tmp)
+        self.assertEqual(all(event.duration >= 0 for event in self.events), True)
+
+    def test_14_004_failed_deletes(self):
+        """Metrics - failed deletes are counted, and still reported to on_error"""
+        def fail(path, **kwargs):
+            raise OSError(errno.EACCES, "Permission denied", path)
+
+        TempDirCont.metrics.enable()
+        errors = []
+        with mock.patch.object(TDC_MODULE, "remove_tree", side_effect=fail):
+            with TempDirCont.TempDirectoryContext(root=self.root, keep_max=0,
+                                                  on_error=lambda path, exc: errors.append(path)) as tmp:
+                pass
+        self.assertEqual(errors, [tmp])
+        key = (self.root, "TempDirCont", "tmp")
+        counters = TempDirCont.metrics.counters(key)
+        self.assertEqual(counters["failed_deletes"], 1)
+        self.assertEqual(counters["evicted"], 0)
+        self.assertEqual(counters["bytes_reclaimed"], 0)
+        failed = [event for event in self.events if event.phase == "delete_failed"]
+        self.assertEqual([event.path for event in failed], [tmp])
+        self.assertEqual([event for event in self.events if event.phase == "evict"], [])
+
+    def test_14_005_histogram(self):
+        """Metrics - the histogram buckets durations in powers of two"""
+        histogram = TempDirCont.Histogram()
+        for duration in (0.000001, 0.001, 0.001, 0.5):
+            histogram.add(duration)
+        self.assertEqual(histogram.count, 4)
+        self.assertEqual(sum(count for bound, count in histogram.buckets()), 4)
+        self.assertGreaterEqual(histogram.percentile(50), 0.001)
+        self.assertLess(histogram.percentile(50), 0.002)
+        self.assertGreaterEqual(histogram.percentile(100), 0.5)
+
+    def test_14_006_background_evictions(self):
+        """Metrics - background evictions are counted once the delete has completed, and only if it succeeds"""
+        TempDirCont.metrics.enable(measure=True)
+        key = (self.root, "TempDirCont", "tmp")
+        release = threading.Event()
+        real_remove = TempDirCont._reclaim.remove_tree
+
+        def remove(path, rmtree=None):
+            release.wait(5)
+            if "fail" in path:
+                raise OSError(errno.EACCES, "Permission denied", path)
+            return real_remove(path, rmtree=rmtree)
+
+        with mock.patch("TempDirectoryContext._reclaim.remove_tree", side_effect=remove):
+            for options in ({"async_delete": True}, {"evict": "trash"}):
+                for prefix in ("tmp", "tmp-fail"):
+                    with TempDirCont.TempDirectoryContext(root=self.root, prefix=prefix, keep_max=0, on_error=None,
+                                                          **options) as tmp:
+                        with open(os.path.join(tmp, "testing.txt"), "wb") as fd:
+                            fd.write(b"x" * 8192)
+            self.assertEqual(TempDirCont.metrics.counters(key)["evicted"], 0)
+            release.set()
+            TempDirCont.TempDirectoryContext.flush()
+
+        counters = TempDirCont.metrics.counters(key)
+        self.assertEqual(counters["evicted"], 2)
+        self.assertGreaterEqual(counters["bytes_reclaimed"], 2 * 8192)
+        failed = TempDirCont.metrics.counters((self.root, "TempDirCont", "tmp-fail"))
+        self.assertEqual((failed["evicted"], failed["bytes_reclaimed"], failed["failed_deletes"]), (0, 0, 2))
+
+
+class Test15Archive(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+
+    def tearDown(self):
+        TempDirCont.TempDirectoryContext.flush()
+        forget(self.root)
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    def make(self, count, **kwargs):
+        made = []
+        for i in range(count):
+            with TempDirCont.TempDirectoryContext(root=self.root, archive_historic=True, **kwargs) as tmp:
+                os.mkdir(os.path.join(tmp, "logs"))
+                with open(os.path.join(tmp, "logs", "run.log"), "w") as fd:
+                    fd.write("run {}".format(i))
+            made.append(tmp)
+        TempDirCont.TempDirectoryContext.flush()
+        return made
+
+    def test_15_001_archived(self):
+        """Archive - directories outside the live window are replaced by compressed archives"""
+        made = self.make(3, keep_max=3, archive_live=1)
+        self.assertEqual([os.path.exists(path) for path in made], [False, False, True])
+        self.assertEqual([os.path.isfile(path + ".tar.gz") for path in made], [True, True, False])
+
+    def test_15_002_retention(self):
+        """Archive - archives count against keep_max, and are evicted as the directories would be"""
+        made = self.make(5, keep_max=3, archive_live=1)
+        self.assertEqual([os.path.exists(path) or os.path.exists(path + ".tar.gz") for path in made],
+                         [False, False, True, True, True])
+        self.assertEqual(os.path.exists(made[-1]), True)
+
+    def test_15_003_extract(self):
+        """Archive - an archive can be extracted, restoring the directory"""
+        made = self.make(2, keep_max=3, archive_live=1)
+        restored = TempDirCont.extract_archive(made[0] + ".tar.gz")
+        self.assertEqual(restored, made[0])
+        with open(os.path.join(restored, "logs", "run.log")) as fd:
+            self.assertEqual(fd.read(), "run 0")
+
+        elsewhere = tempfile.mkdtemp()
+        try:
+            restored = TempDirCont.extract_archive(made[0] + ".tar.gz", destination=elsewhere)
+            self.assertEqual(restored, os.path.join(elsewhere, os.path.basename(made[0])))
+            self.assertEqual(os.path.isfile(os.path.join(restored, "logs", "run.log")), True)
+        finally:
+            shutil.rmtree(elsewhere)
+
+    def test_15_004_scanned(self):
+        """Archive - a new process finds archives in the directories' places, and evicts them"""
+        made = self.make(3, keep_max=3, archive_live=1)
+        forget(self.root)
+        historic = TempDirCont._scan.scan_historic(self.root, "tmp", "TempDirCont")
+        self.assertEqual(historic, [made[0] + ".tar.gz", made[1] + ".tar.gz", made[2]])
+
+        with TempDirCont.TempDirectoryContext(root=self.root, keep_max=1):
+            pass
+        self.assertEqual([os.path.exists(path + ".tar.gz") for path in made[:2]], [False, False])
+        self.assertEqual(os.path.exists(made[2]), False)
+
+    def test_15_005_manifest(self):
+        """Archive - can't be used with a manifest"""
+        with self.assertRaises(ValueError):
+            TempDirCont.TempDirectoryContext(root=self.root, archive_historic=True, manifest=True)
+
+
+class Test16Lazy(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+
+    def tearDown(self):
+        forget(self.root)
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    def test_16_001_never_used(self):
+        """Lazy - a directory which is never used is never created, and nothing is queued"""
+        ctx = TempDirCont.TempDirectoryContext(root=self.root, lazy=True)
+        with ctx as tmp:
+            self.assertEqual(tmp.materialised, False)
+            self.assertEqual(os.listdir(self.root), [])
+        self.assertEqual(os.listdir(self.root), [])
+        self.assertEqual(len(ctx._delete_queue), 0)
+
+        with self.assertRaises(ValueError):
+            os.fspath(tmp)
+
+    def test_16_002_fspath(self):
+        """Lazy - the directory is created when it is first used as a path, and retained as normal"""
+        ctx = TempDirCont.TempDirectoryContext(root=self.root, lazy=True)
+        with ctx as tmp:
+            path = os.path.join(tmp, "testing.txt")
+            self.assertEqual(tmp.materialised, True)
+            with open(path, "w") as fd:
+                fd.write("This is a testing file")
+            self.assertEqual(os.fspath(tmp), os.path.dirname(path))
+            self.assertEqual(str(tmp), os.path.dirname(path))
+            self.assertEqual(os.path.basename(str(tmp)).startswith("tmp"), True)
+            self.assertEqual(str(tmp).endswith("TempDirCont"), True)
+        self.assertEqual(os.path.isfile(path), True)
+        self.assertEqual(list(ctx._delete_queue), [os.path.dirname(path)])
+
+    def test_16_003_open_and_mkdir(self):
+        """Lazy - open, mkdir and the / operator create the directory"""
+        with TempDirCont.TempDirectoryContext(root=self.root, lazy=True) as tmp:
+            with tmp.open("testing.txt", "w") as fd:
+                fd.write("This is a testing file")
+            self.assertEqual(os.path.isfile(os.path.join(str(tmp), "testing.txt")), True)
+
+        with TempDirCont.TempDirectoryContext(root=self.root, lazy=True) as tmp:
+            sub = tmp.mkdir("a/b")
+            self.assertEqual(os.path.isdir(sub), True)
+
+        with TempDirCont.TempDirectoryContext(root=self.root, lazy=True) as tmp:
+            path = tmp / "testing.txt"
+            self.assertEqual(tmp.materialised, True)
+            path.write_text("This is a testing file")
+
+    def test_16_004_retention(self):
+        """Lazy - unused directories don't count against keep_max"""
+        with TempDirCont.TempDirectoryContext(root=self.root, keep_max=1, lazy=True) as tmp:
+            used = os.fspath(tmp)
+        for i in range(3):
+            with TempDirCont.TempDirectoryContext(root=self.root, keep_max=1, lazy=True):
+                pass
+        self.assertEqual(os.path.isdir(used), True)
+
+
+class Test17Many(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+
+    def tearDown(self):
+        forget(self.root)
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    def test_17_001_batch(self):
+        """Many - a batch of distinct directories is created at once, and retained together"""
+        with TempDirCont.TempDirectoryContext.many(5, root=self.root, keep_max=5) as paths:
+            self.assertEqual(len(set(paths)), 5)
+            self.assertEqual(all(os.path.isdir(path) for path in paths), True)
+        self.assertEqual(all(os.path.isdir(path) for path in paths), True)
+
+    def test_17_002_retention_once(self):
+        """Many - retention is applied once, so a batch larger than keep_max keeps its newest directories"""
+        with TempDirCont.TempDirectoryContext(root=self.root, keep_max=3) as old:
+            pass
+        with TempDirCont.TempDirectoryContext.many(4, root=self.root, keep_max=3) as paths:
+            pass
+        self.assertEqual(os.path.exists(old), False)
+        self.assertEqual([os.path.exists(path) for path in paths], [False, True, True, True])
+
+    def test_17_003_parallel_evict(self):
+        """Many - the evicted directories are deleted in parallel"""
+        threads = set()
+
+        def fake_remove(path, **kwargs):
+            threads.add(threading.current_thread().name)
+            time.sleep(0.05)
+            shutil.rmtree(path)
+
+        with TempDirCont.TempDirectoryContext.many(4, root=self.root, keep_max=4) as first:
+            pass
+        with mock.patch.object(TDC_MODULE, "remove_tree", side_effect=fake_remove):
+            with TempDirCont.TempDirectoryContext.many(4, root=self.root, keep_max=4, delete_workers=4):
+                pass
+        self.assertEqual([os.path.exists(path) for path in first], [False] * 4)
+        self.assertGreater(len(threads), 1)
+
+    def test_17_004_failure(self):
+        """Many - if the batch can't be created, the directories already created are removed"""
+        real_mkdtemp = tempfile.mkdtemp
+        calls = []
+
+        def flaky_mkdtemp(*args, **kwargs):
+            calls.append(1)
+            if len(calls) == 3:
+                raise OSError(errno.ENOSPC, "No space left on device")
+            return real_mkdtemp(*args, **kwargs)
+
+        with mock.patch("tempfile.mkdtemp", side_effect=flaky_mkdtemp):
+            with self.assertRaises(OSError):
+                with TempDirCont.TempDirectoryContext.many(5, root=self.root):
+                    pass
+        self.assertEqual(os.listdir(self.root), [])
+
+        with self.assertRaises(ValueError):
+            TempDirCont.TempDirectoryContext.many(2, root=self.root, lazy=True)
+
+
+def dead_pid():
+    """The pid of a process which has exited"""
+    process = multiprocessing.get_context("spawn").Process(target=int)
+    process.start()
+    process.join()
+    return process.pid
+
+
+class Test18OwnerStamp(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+
+    def tearDown(self):
+        forget(self.root)
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    def orphan(self, name, pid, start="-", host=None):
+        path = os.path.join(self.root, name)
+        os.mkdir(path)
+        os.makedirs(os.path.join(self.root, TempDirCont.OWNERS_NAME), mode=0o700, exist_ok=True)
+        with open(os.path.join(self.root, TempDirCont.OWNERS_NAME, name), "w") as fd:
+            fd.write("{} {} {}\n".format(pid, start, host or socket.gethostname()))
+        return path
+
+    def test_18_001_stamped(self):
+        """Owner stamps - a directory is stamped with its owner while in use"""
+        with TempDirCont.TempDirectoryContext(root=self.root, owner_stamp=True) as tmp:
+            stamp = os.path.join(self.root, TempDirCont.OWNERS_NAME, os.path.basename(tmp))
+            pid, start, host = TempDirCont._owner.read_stamp(stamp)
+            self.assertEqual((pid, host), (os.getpid(), socket.gethostname()))
+            self.assertEqual(os.listdir(tmp), [])
+        self.assertEqual(os.path.exists(stamp), False)
+
+    def test_18_002_orphan_reaped(self):
+        """Owner stamps - a directory whose owner has died is reclaimed, even without delete_historic"""
+        orphan = self.orphan("tmporphanTempDirCont", dead_pid())
+        TempDirCont.TempDirectoryContext(root=self.root, owner_stamp=True, delete_historic=False)
+        self.assertEqual(os.path.exists(orphan), False)
+        self.assertEqual(os.listdir(os.path.join(self.root, TempDirCont.OWNERS_NAME)), [])
+
+    def test_18_003_live_owner_kept(self):
+        """Owner stamps - a directory in use by a live process is never evicted, or reaped"""
+        live = self.orphan("tmpliveTempDirCont", os.getpid(), start=TempDirCont._owner.identity()[1] or "-")
+        remote = self.orphan("tmpremoteTempDirCont", dead_pid(), host="elsewhere.example.com")
+        with TempDirCont.TempDirectoryContext(root=self.root, keep_max=0, owner_stamp=True) as tmp:
+            pass
+        self.assertEqual(os.path.exists(tmp), False)
+        self.assertEqual(os.path.exists(live), True)
+        self.assertEqual(os.path.exists(remote), True)
+        self.assertEqual(TempDirCont.TempDirectoryContext.reap(self.root), [])
+
+    @unittest.skipUnless(os.path.exists("/proc/self/stat"), "Requires /proc")
+    def test_18_004_pid_reused(self):
+        """Owner stamps - a live process with the owner's pid but a different start time isn't the owner"""
+        start = TempDirCont._owner.identity()[1]
+        reused = self.orphan("tmpreusedTempDirCont", os.getpid(), start=start + 1)
+        self.assertEqual(TempDirCont.TempDirectoryContext.reap(self.root), [reused])
+        self.assertEqual(os.path.exists(reused), False)
+
+    def test_18_005_prefix_suffix(self):
+        """Owner stamps - only orphans with the prefix and suffix are reaped, so a stamp can't name another path"""
+        victim = self.orphan("victim", dead_pid())
+        other = self.orphan("otherorphanTempDirCont", dead_pid())
+        self.assertEqual(TempDirCont.TempDirectoryContext.reap(self.root), [])
+        self.assertEqual(os.path.isdir(victim), True)
+        self.assertEqual(TempDirCont.TempDirectoryContext.reap(self.root, prefix="other"), [other])
+
+    @unittest.skipUnless(hasattr(os, "geteuid"), "Requires POSIX permissions")
+    def test_18_006_owners_not_private(self):
+        """Owner stamps - an owners directory open to others is never trusted, or stamped into"""
+        orphan = self.orphan("tmporphanTempDirCont", dead_pid())
+        os.chmod(os.path.join(self.root, TempDirCont.OWNERS_NAME), 0o777)
+        self.assertEqual(TempDirCont.TempDirectoryContext.reap(self.root), [])
+        self.assertEqual(os.path.isdir(orphan), True)
+        with self.assertRaises(OSError):
+            with TempDirCont.TempDirectoryContext(root=self.root, owner_stamp=True, delete_historic=False):
+                pass
+
+
+class Test19Layout(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.namespace = TempDirCont._layout.namespace_path(self.root, "tmp", "TempDirCont")
+
+    def tearDown(self):
+        forget(self.root)
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    def test_19_001_namespace(self):
+        """Sharded layout - directories are created in a hidden namespace in the root, with the usual names"""
+        with TempDirCont.TempDirectoryContext(root=self.root, layout="sharded") as tmp:
+            self.assertEqual(os.path.dirname(tmp), self.namespace)
+            self.assertEqual(os.path.basename(tmp).startswith("tmp"), True)
+            self.assertEqual(tmp.endswith("TempDirCont"), True)
+            self.assertEqual(os.listdir(self.root), [os.path.basename(self.namespace)])
+        self.assertEqual(os.path.isdir(tmp), True)
+
+    def test_19_002_retention(self):
+        """Sharded layout - historic directories are found in the namespace, and those in the root are left alone"""
+        flat = os.path.join(self.root, "tmpflatTempDirCont")
+        os.mkdir(flat)
+        paths = []
+        for i in range(4):
+            forget(self.root)
+            with TempDirCont.TempDirectoryContext(root=self.root, layout="sharded", keep_max=2) as tmp:
+                paths.append(tmp)
+            time.sleep(0.01)
+        self.assertEqual([os.path.exists(path) for path in paths], [False, False, True, True])
+        self.assertEqual(os.path.isdir(flat), True)
+
+    def test_19_003_buckets(self):
+        """Sharded layout - with buckets each directory is in the bucket given by its name, and retention spans them"""
+        paths = []
+        for i in range(12):
+            forget(self.root)
+            with TempDirCont.TempDirectoryContext(root=self.root, layout="sharded", buckets=4, keep_max=3) as tmp:
+                paths.append(tmp)
+            time.sleep(0.01)
+            bucket = TempDirCont._layout.bucket_name(os.path.basename(tmp), 4)
+            self.assertEqual(os.path.dirname(tmp), os.path.join(self.namespace, bucket))
+        self.assertEqual([os.path.exists(path) for path in paths], [False] * 9 + [True] * 3)
+        self.assertEqual(len(TempDirCont._layout.bucket_paths(self.namespace, 256)[-1]) - len(self.namespace), 3)
+
+    def test_19_004_lazy(self):
+        """Sharded layout - a lazy directory is created in its bucket, and the namespace only when it is needed"""
+        with TempDirCont.TempDirectoryContext(root=self.root, layout="sharded", buckets=4, lazy=True) as tmp:
+            self.assertEqual(os.listdir(self.root), [])
+            path = os.fspath(tmp)
+        self.assertEqual(os.path.dirname(os.path.dirname(path)), self.namespace)
+        self.assertEqual(os.path.isdir(path), True)
+
+    def test_19_005_flat_ignores_namespace(self):
+        """Sharded layout - a flat context manager never mistakes a namespace for an historic directory"""
+        with TempDirCont.TempDirectoryContext(root=self.root, layout="sharded", prefix="", suffix=""):
+            pass
+        namespace = TempDirCont._layout.namespace_path(self.root, "", "")
+        forget(self.root)
+        with TempDirCont.TempDirectoryContext(root=self.root, prefix="", suffix="", keep_max=0):
+            pass
+        self.assertEqual(os.listdir(self.root), [os.path.basename(namespace)])
+
+    def test_19_006_owner_stamp(self):
+        """Sharded layout - stamps are kept beside the directories, and orphans in every bucket are reaped"""
+        ctx = TempDirCont.TempDirectoryContext(root=self.root, layout="sharded", buckets=2, owner_stamp=True,
+                                               delete_historic=False)
+        with ctx as tmp:
+            owners = os.path.join(os.path.dirname(tmp), TempDirCont.OWNERS_NAME)
+            self.assertEqual(os.listdir(owners), [os.path.basename(tmp)])
+            with open(os.path.join(owners, os.path.basename(tmp)), "w") as fd:
+                fd.write("{} - {}\n".format(dead_pid(), socket.gethostname()))
+            self.assertEqual(ctx._reap(), [tmp])
+        self.assertEqual(os.path.exists(tmp), False)
+
+    def test_19_007_arguments(self):
+        """Sharded layout - invalid combinations of arguments are rejected"""
+        with self.assertRaises(ValueError):
+            TempDirCont.TempDirectoryContext(root=self.root, layout="nested")
+        with self.assertRaises(ValueError):
+            TempDirCont.TempDirectoryContext(root=self.root, buckets=4)
+        with self.assertRaises(ValueError):
+            TempDirCont.TempDirectoryContext(root=self.root, layout="sharded", buckets=4, manifest=True)
+        with TempDirCont.TempDirectoryPool(size=1, root=self.root) as pool:
+            with self.assertRaises(ValueError):
+                pool.context(layout="sharded")
+
+    def test_19_008_manifest(self):
+        """Sharded layout - the manifest is kept in the namespace"""
+        with TempDirCont.TempDirectoryContext(root=self.root, layout="sharded", manifest=True) as tmp:
+            pass
+        manifest = TempDirCont._manifest.manifest_path(self.namespace, "tmp", "TempDirCont")
+        self.assertEqual(os.path.exists(manifest), True)
+        self.assertEqual(os.path.dirname(tmp), self.namespace)
+
+    def test_19_009_purge(self):
+        """Sharded layout - an explicit purge of the root empties the trash in the namespace too"""
+        trash = TempDirCont._reclaim.trash_path(self.namespace)
+        for i in range(3):
+            os.makedirs(os.path.join(trash, "entry{}".format(i), "sub"))
+        os.makedirs(os.path.join(TempDirCont._reclaim.trash_path(self.root), "entry", "sub"))
+
+        self.assertEqual(TempDirCont.TempDirectoryContext.purge(root=self.root, batch=2), 2)
+        self.assertEqual(TempDirCont.TempDirectoryContext.purge(root=self.root), 2)
+        self.assertEqual(os.listdir(trash), [])
+
+
+class Test20Storage(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.memory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        forget(self.root)
+        forget(self.memory)
+        shutil.rmtree(self.root, ignore_errors=True)
+        shutil.rmtree(self.memory, ignore_errors=True)
+
+    def test_20_001_memory(self):
+        """Storage - a memory backed directory is created on the memory file system, not in the root"""
+        storage = TempDirCont.MemoryStorage(path=self.memory, min_free=0)
+        with TempDirCont.TempDirectoryContext(root=self.root, storage=storage) as tmp:
+            self.assertEqual(os.path.dirname(tmp), self.memory)
+        self.assertEqual(os.listdir(self.root), [])
+        self.assertEqual(os.path.isdir(tmp), True)
+
+    def test_20_002_fallback(self):
+        """Storage - the disk root is used if the memory file system hasn't enough space, or doesn't exist"""
+        full = TempDirCont.MemoryStorage(path=self.memory, min_free=2 ** 62)
+        with TempDirCont.TempDirectoryContext(root=self.root, storage=full) as tmp:
+            self.assertEqual(os.path.dirname(tmp), self.root)
+
+        missing = TempDirCont.MemoryStorage(path=os.path.join(self.memory, "missing"))
+        with TempDirCont.TempDirectoryContext(root=self.root, storage=missing) as tmp:
+            self.assertEqual(os.path.dirname(tmp), self.root)
+        self.assertEqual(os.listdir(self.memory), [])
+
+    def test_20_003_size_limit(self):
+        """Storage - max_bytes is a hard quota - a larger directory raises QuotaExceeded, and is deleted on exit"""
+        storage = TempDirCont.MemoryStorage(path=self.memory, min_free=0, max_bytes=64 * 1024)
+        with TempDirCont.TempDirectoryContext(root=self.root, storage=storage) as small:
+            with open(os.path.join(small, "small.txt"), "w") as fd:
+                fd.write("x" * 1024)
+        with self.assertLogs("TempDirectoryContext", level="WARNING"):
+            with self.assertRaises(TempDirCont.QuotaExceeded) as raised:
+                with TempDirCont.TempDirectoryContext(root=self.root, storage=storage) as large:
+                    with open(os.path.join(large, "large.txt"), "w") as fd:
+                        fd.write("x" * 256 * 1024)
+        self.assertEqual(raised.exception.limit, 64 * 1024)
+        self.assertEqual(os.path.exists(small), True)
+        self.assertEqual(os.path.exists(large), False)
+
+    def test_20_004_disk(self):
+        """Storage - the disk backend uses the root as given, with no size limit"""
+        with TempDirCont.TempDirectoryContext(root=self.root, storage="disk") as tmp:
+            with open(os.path.join(tmp, "large.txt"), "w") as fd:
+                fd.write("x" * 256 * 1024)
+            self.assertEqual(os.path.dirname(tmp), self.root)
+        self.assertEqual(os.path.exists(tmp), True)
+
+    @unittest.skipUnless(os.path.isdir(TempDirCont._storage.MEMORY_ROOT), "No memory backed file system")
+    def test_20_005_dev_shm(self):
+        """Storage - "memory" uses /dev/shm where it exists"""
+        ctx = TempDirCont.TempDirectoryContext(root=self.root, storage="memory", prefix="test_20_005_",
+                                               delete_historic=False)
+        try:
+            with ctx as tmp:
+                self.assertEqual(os.path.dirname(tmp), TempDirCont._storage.MEMORY_ROOT)
+        finally:
+            forget(TempDirCont._storage.MEMORY_ROOT)
+            shutil.rmtree(tmp, ignore_errors=True)
+
+    def test_20_006_arguments(self):
+        """Storage - unknown backends are rejected, and pooled directories can't use memory storage"""
+        with self.assertRaises(ValueError):
+            TempDirCont.TempDirectoryContext(root=self.root, storage="tape")
+        with TempDirCont.TempDirectoryPool(size=1, root=self.root) as pool:
+            with self.assertRaises(ValueError):
+                pool.context(storage="memory")
+
+    def test_20_007_limit_in_use(self):
+        """Storage - max_bytes is enforced while the directory is in use, not just on exit"""
+        breaches = []
+        storage = TempDirCont.MemoryStorage(path=self.memory, min_free=0, max_bytes=64 * 1024)
+        ctx = TempDirCont.TempDirectoryContext(root=self.root, storage=storage, quota_interval=0.01,
+                                               on_quota=lambda *args: breaches.append(args))
+        with self.assertRaises(TempDirCont.QuotaExceeded):
+            with ctx as tmp:
+                with open(os.path.join(tmp, "large.txt"), "w") as fd:
+                    fd.write("x" * 256 * 1024)
+                deadline = time.time() + 5
+                while not breaches and time.time() < deadline:
+                    time.sleep(0.01)
+                self.assertEqual([(path, limit) for path, usage, limit in breaches], [(tmp, 64 * 1024)])
+                with self.assertRaises(TempDirCont.QuotaExceeded):
+                    ctx.check_quota()
+
+    def test_20_008_space_rechecked(self):
+        """Storage - the free space is checked again on entry - no directory is created without room for it"""
+        storage = TempDirCont.MemoryStorage(path=self.memory, min_free=0)
+        ctx = TempDirCont.TempDirectoryContext(root=self.root, storage=storage)
+        with mock.patch.object(storage, "free_space", return_value=1024):
+            with self.assertRaises(OSError) as raised:
+                with ctx:
+                    pass
+        self.assertEqual(raised.exception.errno, errno.ENOSPC)
+        self.assertEqual(os.listdir(self.memory), [])
+
+
+class Test21Quota(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+
+    def tearDown(self):
+        forget(self.root)
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    @staticmethod
+    def fill(path, size, name="data.bin"):
+        with open(os.path.join(path, name), "wb") as fd:
+            fd.write(b"x" * size)
+
+    def test_21_001_soft_callback(self):
+        """Quota - the background thread reports a directory over a soft quota, which is still retained"""
+        breaches = []
+        ctx = TempDirCont.TempDirectoryContext(root=self.root, max_bytes=64 * 1024, quota_interval=0.01,
+                                               on_quota=lambda *args: breaches.append(args))
+        with ctx as tmp:
+            self.fill(tmp, 256 * 1024)
+            deadline = time.time() + 5
+            while not breaches and time.time() < deadline:
+                time.sleep(0.01)
+            self.assertEqual(len(breaches), 1)
+            self.assertEqual(breaches[0][0], tmp)
+            self.assertGreater(breaches[0][1], 64 * 1024)
+            self.assertEqual(breaches[0][2], 64 * 1024)
+        self.assertEqual(os.path.isdir(tmp), True)
+        self.assertEqual(len(breaches), 1)
+
+    def test_21_002_hard_check(self):
+        """Quota - check_quota raises QuotaExceeded for a directory over a hard quota"""
+        ctx = TempDirCont.TempDirectoryContext(root=self.root, max_bytes=64 * 1024, quota="hard",
+                                               on_quota=lambda *args: None, quota_interval=0)
+        with self.assertRaises(TempDirCont.QuotaExceeded) as raised:
+            with ctx as tmp:
+                self.assertLess(ctx.check_quota(), 64 * 1024)
+                self.fill(tmp, 256 * 1024)
+                ctx.check_quota()
+        self.assertEqual(raised.exception.errno, errno.EDQUOT)
+        self.assertEqual(raised.exception.filename, tmp)
+        self.assertEqual(raised.exception.limit, 64 * 1024)
+        self.assertEqual(os.path.exists(tmp), False)
+
+    def test_21_003_hard_exit(self):
+        """Quota - a directory over a hard quota on exit is deleted and QuotaExceeded raised, unless the block raised"""
+        ctx = TempDirCont.TempDirectoryContext(root=self.root, max_bytes=64 * 1024, quota="hard",
+                                               on_quota=lambda *args: None, quota_interval=60)
+        with self.assertRaises(TempDirCont.QuotaExceeded):
+            with ctx as tmp:
+                self.fill(tmp, 256 * 1024)
+        self.assertEqual(os.path.exists(tmp), False)
+
+        with self.assertRaises(KeyError):
+            with ctx as tmp:
+                self.fill(tmp, 256 * 1024)
+                raise KeyError("original")
+        self.assertEqual(os.path.exists(tmp), False)
+
+    def test_21_004_rate_limited(self):
+        """Quota - usage is measured at most once per quota_interval, and again on exit for retention"""
+        ctx = TempDirCont.TempDirectoryContext(root=self.root, max_bytes=2 ** 30, quota_interval=60)
+        with ctx as tmp:
+            before = ctx.usage()
+            self.fill(tmp, 256 * 1024)
+            self.assertEqual(ctx.usage(), before)
+        entry = ctx._registry.entry(ctx._key, tmp)
+        self.assertGreaterEqual(entry.known_size, 256 * 1024)
+
+    def test_21_005_no_quota(self):
+        """Quota - without max_bytes usage is measured on demand, and check_quota never raises"""
+        ctx = TempDirCont.TempDirectoryContext(root=self.root)
+        self.assertEqual(ctx.usage(), 0)
+        with ctx as tmp:
+            self.fill(tmp, 256 * 1024)
+            self.assertGreaterEqual(ctx.usage(), 256 * 1024)
+            self.assertGreaterEqual(ctx.check_quota(), 256 * 1024)
+        self.assertEqual(os.path.isdir(tmp), True)
+
+    def test_21_006_batch(self):
+        """Quota - in a batch only the directories over a hard quota are deleted"""
+        with self.assertRaises(TempDirCont.QuotaExceeded) as raised:
+            with TempDirCont.TempDirectoryContext.many(2, root=self.root, max_bytes=64 * 1024, quota="hard",
+                                                       on_quota=lambda *args: None, quota_interval=60) as paths:
+                self.fill(paths[0], 256 * 1024)
+        self.assertEqual(raised.exception.filename, paths[0])
+        self.assertEqual([os.path.exists(path) for path in paths], [False, True])
+
+    def test_21_007_arguments(self):
+        """Quota - an unknown quota mode is rejected"""
+        with self.assertRaises(ValueError):
+            TempDirCont.TempDirectoryContext(root=self.root, max_bytes=1024, quota="strict")
+
+
+PLUGIN_TESTS = """
+import os
+
+
+def test_pass(temp_directory):
+    assert os.listdir(temp_directory) == []
+    with open(os.path.join(temp_directory, "passed.txt"), "w") as fd:
+        fd.write("passed")
+
+
+def test_fail(temp_directory):
+    with open(os.path.join(temp_directory, "failed.txt"), "w") as fd:
+        fd.write("failed")
+    assert not os.environ.get("TDC_FAIL")
+"""
+
+
+@unittest.skipIf(pytest_plugin is None, "pytest is not installed")
+class Test22PytestPlugin(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.project = tempfile.mkdtemp()
+        with open(os.path.join(self.project, "test_plugin_demo.py"), "w") as fd:
+            fd.write(PLUGIN_TESTS)
+
+    def tearDown(self):
+        shutil.rmtree(self.root, ignore_errors=True)
+        shutil.rmtree(self.project, ignore_errors=True)
+
+    def run_pytest(self, *args, **env):
+        package = os.path.dirname(os.path.dirname(os.path.abspath(TempDirCont.__file__)))
+        environ = dict(os.environ, PYTHONPATH=package, PYTEST_DISABLE_PLUGIN_AUTOLOAD="1", **env)
+        return subprocess.run([sys.executable, "-m", "pytest", "-p", "TempDirectoryContext.pytest_plugin",
+                               "-p", "no:cacheprovider", "--rootdir", self.project, "--tdc-root", self.root] +
+                              list(args),
+                              cwd=self.project, env=environ, stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                              universal_newlines=True)
+
+    def sandboxes(self):
+        """Every file left in the root, relative to it"""
+        return sorted(os.path.relpath(os.path.join(path, name), self.root)
+                      for path, dirs, files in os.walk(self.root) for name in files
+                      if TempDirCont.OWNERS_NAME not in path)
+
+    def failed_root(self):
+        return TempDirCont._layout.namespace_path(self.root, "pytest-", "failed")
+
+    def test_22_001_failed_kept(self):
+        """pytest plugin - a failing test's sandbox is kept (and reported), a passing test's is deleted"""
+        result = self.run_pytest(TDC_FAIL="1")
+        self.assertEqual(result.returncode, 1, result.stdout)
+        self.assertIn("sandbox kept at", result.stdout)
+        kept = pytest_plugin.node_name("test_plugin_demo.py::test_fail")
+        self.assertEqual(self.sandboxes(), [os.path.join(os.path.basename(self.failed_root()), kept, "failed.txt")])
+
+    def test_22_002_passing_reclaims(self):
+        """pytest plugin - when a test which failed passes again, its kept sandbox is deleted"""
+        self.run_pytest(TDC_FAIL="1")
+        result = self.run_pytest()
+        self.assertEqual(result.returncode, 0, result.stdout)
+        self.assertEqual(self.sandboxes(), [])
+
+    def test_22_003_discard_failed(self):
+        """pytest plugin - with --tdc-discard-failed nothing is kept"""
+        result = self.run_pytest("--tdc-discard-failed", TDC_FAIL="1")
+        self.assertEqual(result.returncode, 1, result.stdout)
+        self.assertEqual(self.sandboxes(), [])
+
+    def test_22_004_workers(self):
+        """pytest plugin - each worker has a namespace of its own, and the kept sandboxes are shared"""
+        manager = pytest_plugin.SandboxManager
+        first, second = manager(self.root, "pytest-", "gw0"), manager(self.root, "pytest-", "gw1")
+        try:
+            paths = [first.create(), second.create()]
+            self.assertNotEqual(os.path.dirname(paths[0]), os.path.dirname(paths[1]))
+            self.assertEqual(first.failed_root, second.failed_root)
+            self.assertEqual(os.path.basename(paths[1]).startswith("pytest-gw1-"), True)
+            first.finish("test_a.py::test_a", paths[0], failed=False)
+            second.finish("test_b.py::test_b", paths[1], failed=False)
+            # Deferred until the session finishes
+            self.assertEqual([os.path.isdir(path) for path in paths], [True, True])
+            first.close()
+            second.close()
+            self.assertEqual([os.path.exists(path) for path in paths], [False, False])
+        finally:
+            forget(self.root)
+
+    def test_22_005_node_name(self):
+        """pytest plugin - kept sandboxes are named after the test node, uniquely however long the node id"""
+        name = pytest_plugin.node_name
+        self.assertEqual(name("test_a.py::test_x[1/2]").startswith("test_a.py_test_x_1_2_-"), True)
+        long_ids = ["test_a.py::test_x[" + "a" * 200 + suffix + "]" for suffix in ("1", "2")]
+        self.assertNotEqual(name(long_ids[0]), name(long_ids[1]))
+        self.assertLess(len(name(long_ids[0])), 128)
+
+    def test_22_006_old_pytest(self):
+        """pytest plugin - an older pytest is refused with a clear error, rather than failing part way through"""
+        result = subprocess.run([sys.executable, "-c",
+                                 "import pytest; pytest.version_tuple = (6, 2, 5); "
+                                 "import TempDirectoryContext.pytest_plugin"],
+                                env=dict(os.environ, PYTHONPATH=os.path.dirname(os.path.dirname(
+                                    os.path.abspath(TempDirCont.__file__)))),
+                                stdout=subprocess.PIPE, stderr=subprocess.STDOUT, universal_newlines=True)
+        self.assertNotEqual(result.returncode, 0)
+        self.assertIn("requires pytest 7.0 or later", result.stdout)
+
+
 # noinspection PyUnusedLocal
 def load_tests(loader, tests=None, pattern=None):
     """Test loading - load test cases from each Class"""
-    classes = [Test00Parameters, Test01Functionality, Test02Concurrent]
+    classes = [Test00Parameters, Test01Functionality, Test02Concurrent, Test03AsyncDelete,
+               Test04TrashEviction, Test05HistoricScan, Test06Manifest,
+               Test07SharedRetention, Test08ThreadSafety, Test09Recycle,
+               Test10ParallelDelete, Test11RetentionPolicies,
+               Test12Janitor, Test13Template, Test14Metrics, Test15Archive,
+               Test16Lazy, Test17Many, Test18OwnerStamp, Test19Layout,
+               Test20Storage, Test21Quota, Test22PytestPlugin]
     suite = unittest.TestSuite()
     for test_class in classes:
         tests = loader.loadTestsFromTestCase(test_class)